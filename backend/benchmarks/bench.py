@@ -0,0 +1,447 @@
+#!/usr/bin/env python
+"""Performance benchmarks for the LeadGenius backend
+
+Run the suite and write the results as JSON:
+
+    python benchmarks/bench.py run --output results.json
+
+Compare a run against a stored baseline, exiting with status 1 when a
+benchmark got slower (or bigger) by more than the threshold:
+
+    python benchmarks/bench.py compare benchmarks/baseline.json results.json
+
+Every section runs in its own process, so its peak RSS is its own and
+one section's imports (torch, for instance) don't affect another's
+timings. Models, caches and the registry live in a temporary work
+directory. Nothing is downloaded, and only the CPU is used.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(BACKEND_DIR, 'src')
+sys.path.insert(0, SRC_DIR)
+
+# Format of the results file; compare refuses files with another version
+RESULTS_VERSION = 1
+SECTIONS = ('data', 'train', 'predict', 'save_load', 'startup')
+BATCH_SIZES = (1, 8, 64, 256, 1024)
+# Change beyond which compare reports a regression
+DEFAULT_THRESHOLD = 0.10
+# Files LeadScoringModel.train writes into backend/data; the train section restores them
+TRAINING_OUTPUTS = ('lead_scoring_feature_importance.csv', 'lead_scoring_model_metrics.json')
+# Payload of the /score requests timed by the startup benchmark
+SCORE_PAYLOAD = {"dataset_type": "lead_scoring", "website_visits": 3, "time_spent": 120}
+
+def _stats(durations):
+    """Summary of call durations in seconds, in milliseconds"""
+    ordered = sorted(durations)
+    return {
+        'p50_ms': ordered[len(ordered) // 2] * 1000,
+        'p95_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        'mean_ms': sum(ordered) / len(ordered) * 1000,
+        'min_ms': ordered[0] * 1000,
+        'n': len(ordered)
+    }
+
+def _time_calls(fn, min_seconds, min_calls=5, max_calls=10000):
+    """Time fn() after one untimed call, until min_seconds and min_calls are reached"""
+    fn()
+    durations = []
+    started = time.perf_counter()
+    while len(durations) < max_calls and (len(durations) < min_calls or time.perf_counter() - started < min_seconds):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return _stats(durations)
+
+def _result(value, unit, **details):
+    """One benchmark result; compare looks at value, where lower is better"""
+    return {'value': value, 'unit': unit, **details}
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _dir_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+def _test_records(limit=None):
+    """Leads of the test split as dicts with the training column names"""
+    from ml.data_processor import DataProcessor
+    processor = DataProcessor(dataset_type='lead_scoring')
+    _, test_df, _, _ = processor.load_and_prepare_data()
+    records = test_df.drop('target', axis=1).astype(object).to_dict('records')
+    return records[:limit] if limit else records
+
+def _set_threads(threads):
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+
+def bench_data(settings):
+    """DataProcessor.load_and_prepare_data: CSV parsing, cache build and cache hit"""
+    import ml.data_processor as data_processor
+    from ml.dataset_cache import DATASET_CACHE_DIR
+
+    def load():
+        data_processor.DataProcessor(dataset_type='lead_scoring').load_and_prepare_data()
+
+    def build():
+        shutil.rmtree(DATASET_CACHE_DIR, ignore_errors=True)
+        load()
+
+    seconds = settings['min_seconds']
+    results = {}
+    data_processor.USE_DATASET_CACHE = False
+    results['data.load_and_prepare.parse_csv'] = _result(unit='ms', **_with_value(_time_calls(load, seconds, 3)))
+    data_processor.USE_DATASET_CACHE = True
+    results['data.load_and_prepare.cache_build'] = _result(unit='ms', **_with_value(_time_calls(build, seconds, 3)))
+    results['data.load_and_prepare.cache_hit'] = _result(unit='ms', **_with_value(_time_calls(load, seconds, 5)))
+    return results
+
+def bench_train(settings):
+    """Training time of both models; saves them to the work directory for later sections"""
+    from ml.lead_model import LeadScoringModel
+    _test_records()  # Build the dataset cache outside the timed runs
+
+    results = {}
+    outputs = {}
+    for name in TRAINING_OUTPUTS:
+        path = os.path.join(BACKEND_DIR, 'data', name)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                outputs[path] = f.read()
+    try:
+        start = time.perf_counter()
+        model = LeadScoringModel('lead_scoring').train()
+        results['train.random_forest'] = _result(time.perf_counter() - start, 's', roc_auc=model.metrics['roc_auc'])
+    finally:
+        for path, content in outputs.items():
+            with open(path, 'wb') as f:
+                f.write(content)
+    model.save_model(os.path.join(settings['work_dir'], 'random_forest.pkl'))
+
+    if not settings['skip_tabnet']:
+        from ml.tabnet_model import TabNetLeadScoringModel
+        _set_threads(settings['threads'])
+        start = time.perf_counter()
+        model = TabNetLeadScoringModel()
+        model.train(max_epochs=settings['tabnet_epochs'])
+        results['train.transformer'] = _result(time.perf_counter() - start, 's', epochs=settings['tabnet_epochs'],
+                                               roc_auc=float(model.metrics['roc_auc']))
+        model.save_model(os.path.join(settings['work_dir'], 'transformer.zip'))
+    return results
+
+def _load_models(settings):
+    from ml.lead_model import LeadScoringModel
+    models = {'random_forest': LeadScoringModel('lead_scoring').load_model(
+        os.path.join(settings['work_dir'], 'random_forest.pkl'))}
+    if not settings['skip_tabnet']:
+        from ml.tabnet_model import TabNetLeadScoringModel
+        _set_threads(settings['threads'])
+        models['transformer'] = TabNetLeadScoringModel().load_model(os.path.join(settings['work_dir'], 'transformer.zip'))
+    return models
+
+def bench_predict(settings):
+    """predict() on single leads and predict_batch() at several batch sizes, per model"""
+    records = _test_records()
+    results = {}
+    for model_type, model in _load_models(settings).items():
+        single = _time_calls(lambda: model.predict(records[0]), settings['min_seconds'], 20)
+        results[f'predict.{model_type}.single'] = _result(unit='ms', **_with_value(single))
+        for batch_size in settings['batch_sizes']:
+            batch = (records * (batch_size // len(records) + 1))[:batch_size]
+            stats = _time_calls(lambda: model.predict_batch(batch), settings['min_seconds'], 5)
+            results[f'predict.{model_type}.batch_{batch_size}'] = _result(
+                unit='ms', rows_per_second=batch_size / (stats['p50_ms'] / 1000), **_with_value(stats))
+    return results
+
+def bench_save_load(settings):
+    """save_model() and load_model() of both models, and their artifact sizes"""
+    from ml.lead_model import LeadScoringModel, _arrays_dir
+    results = {}
+    models = _load_models(settings)
+    target_dir = tempfile.mkdtemp(dir=settings['work_dir'])
+    for model_type, model in models.items():
+        if model_type == 'random_forest':
+            path = os.path.join(target_dir, 'model.pkl')
+            model.model  # Unpickle the pipeline outside the timed saves
+            load = lambda: LeadScoringModel('lead_scoring').load_model(path)
+            size = lambda: _dir_size(path) + _dir_size(_arrays_dir(path))
+        else:
+            from ml.tabnet_model import TabNetLeadScoringModel
+            path = os.path.join(target_dir, 'model.zip')
+            load = lambda: TabNetLeadScoringModel().load_model(path)
+            size = lambda: _dir_size(path)
+        save = _time_calls(lambda: model.save_model(path), settings['min_seconds'], 3, 50)
+        results[f'save_load.{model_type}.save'] = _result(unit='ms', **_with_value(save))
+        results[f'save_load.{model_type}.load'] = _result(unit='ms', **_with_value(
+            _time_calls(load, settings['min_seconds'], 3, 50)))
+        results[f'save_load.{model_type}.artifact_size'] = _result(size() / 1024 / 1024, 'MB')
+    return results
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def _request(url, payload=None, timeout=5):
+    data = json.dumps(payload).encode() if payload is not None else None
+    request = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+def _server_peak_rss_mb(pid):
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+    return None
+
+def bench_startup(settings):
+    """Server start to the first model-backed /score, /ready time and server peak RSS"""
+    from services.model_registry import model_registry
+    from initialize_models import register_models, LEAD_MODEL_LABEL
+    register_models()
+    if model_registry.latest_version(LEAD_MODEL_LABEL) is None:
+        model = _load_models(dict(settings, skip_tabnet=True))['random_forest']
+        model_registry.publish(LEAD_MODEL_LABEL, model, source="import", activate=False)
+
+    env = dict(os.environ, STARTUP_MODELS=LEAD_MODEL_LABEL, MODEL_WATCH_INTERVAL_SECONDS='0')
+    first_score, ready, peak_rss = [], [], []
+    for _ in range(settings['startup_runs']):
+        port = _free_port()
+        base_url = f'http://127.0.0.1:{port}'
+        start = time.perf_counter()
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1', '--port', str(port)],
+            cwd=SRC_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            while True:
+                if server.poll() is not None:
+                    raise RuntimeError(f"Server exited with code {server.returncode}")
+                if time.perf_counter() - start > settings['startup_timeout']:
+                    raise RuntimeError("Server did not score a lead in time")
+                try:
+                    if _request(f'{base_url}/api/ml-scoring/score', SCORE_PAYLOAD).get('error') is None:
+                        break
+                except OSError:
+                    pass
+                time.sleep(0.01)
+            first_score.append(time.perf_counter() - start)
+            while True:
+                try:
+                    ready.append(_request(f'{base_url}/ready')['startup_seconds']['ready'])
+                    break
+                except OSError:
+                    time.sleep(0.05)
+            peak_rss.append(_server_peak_rss_mb(server.pid))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    median = lambda values: sorted(values)[len(values) // 2]
+    return {
+        'startup.first_score': _result(median(first_score), 's', runs=first_score),
+        'startup.ready': _result(median(ready), 's', runs=ready),
+        'memory.server_peak_rss': _result(median(peak_rss), 'MB', runs=peak_rss)
+    }
+
+def _with_value(stats):
+    """Timing stats with the median as the compared value"""
+    return dict(stats, value=stats['p50_ms'])
+
+BENCHMARKS = {
+    'data': bench_data,
+    'train': bench_train,
+    'predict': bench_predict,
+    'save_load': bench_save_load,
+    'startup': bench_startup
+}
+
+def _run_section(section, settings):
+    """Entry point of a section process"""
+    results = BENCHMARKS[section](settings)
+    results[f'memory.peak_rss.{section}'] = _result(_peak_rss_mb(), 'MB')
+    return results
+
+def _package_versions():
+    from importlib import metadata
+    versions = {}
+    for package in ('numpy', 'pandas', 'scikit-learn', 'torch', 'pytorch-tabnet', 'fastapi', 'uvicorn'):
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return versions
+
+def _cpu_model():
+    try:
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                if line.startswith('model name'):
+                    return line.split(':', 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or None
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def environment(settings):
+    """Metadata describing where the results were measured"""
+    try:
+        memory_mb = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / 1024 / 1024
+    except (ValueError, OSError, AttributeError):
+        memory_mb = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_model': _cpu_model(),
+        'cpu_count': os.cpu_count(),
+        'memory_mb': memory_mb,
+        'threads': settings['threads'],
+        'packages': _package_versions(),
+        'git_commit': _git_commit()
+    }
+
+def run(args):
+    settings = {
+        'min_seconds': 0.2 if args.quick else 1.0,
+        'batch_sizes': list(args.batch_sizes),
+        'tabnet_epochs': args.tabnet_epochs,
+        'skip_tabnet': args.skip_tabnet,
+        'startup_runs': 1 if args.quick else args.startup_runs,
+        'startup_timeout': 120,
+        'threads': args.threads
+    }
+    sections = args.sections or list(SECTIONS)
+    work_dir = tempfile.mkdtemp(prefix='leadgen-bench-')
+    settings['work_dir'] = work_dir
+    # Set before any section imports the backend, which reads them at import
+    os.environ.update({
+        'MODEL_REGISTRY_DIR': os.path.join(work_dir, 'models'),
+        'DATASET_CACHE_DIR': os.path.join(work_dir, 'cache'),
+        'LEAD_STORE_PATH': os.path.join(work_dir, 'leads.db'),
+        'LOG_LEVEL': 'WARNING'
+    })
+    if args.threads:
+        for name in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+            os.environ[name] = str(args.threads)
+
+    results = {}
+    try:
+        # Later sections use the models the train section saves
+        if any(section in sections for section in ('predict', 'save_load', 'startup')) and 'train' not in sections:
+            sections = ['train'] + sections
+        for section in SECTIONS:
+            if section not in sections:
+                continue
+            print(f"Running {section} benchmarks...")
+            started = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+                section_results = pool.submit(_run_section, section, settings).result()
+            results.update(section_results)
+            for name, result in section_results.items():
+                print(f"  {name:45s} {result['value']:12.3f} {result['unit']}")
+            print(f"  ({time.perf_counter() - started:.1f}s)")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'format_version': RESULTS_VERSION,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'environment': environment(settings),
+        'settings': {name: value for name, value in settings.items() if name != 'work_dir'},
+        'benchmarks': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    return 0
+
+def compare(args):
+    reports = []
+    for path in (args.baseline, args.current):
+        with open(path) as f:
+            report = json.load(f)
+        if report.get('format_version') != RESULTS_VERSION:
+            print(f"{path} has results format {report.get('format_version')}, expected {RESULTS_VERSION}")
+            return 2
+        reports.append(report)
+    baseline, current = reports
+
+    for key in ('cpu_model', 'cpu_count', 'python', 'threads', 'packages'):
+        if baseline['environment'].get(key) != current['environment'].get(key):
+            print(f"Warning: {key} differs: {baseline['environment'].get(key)} -> {current['environment'].get(key)}")
+
+    regressions = []
+    print(f"{'benchmark':45s} {'baseline':>12s} {'current':>12s} {'change':>8s}")
+    for name in sorted(set(baseline['benchmarks']) | set(current['benchmarks'])):
+        before = baseline['benchmarks'].get(name)
+        after = current['benchmarks'].get(name)
+        if before is None or after is None:
+            print(f"{name:45s} {'only in ' + ('current' if before is None else 'baseline'):>34s}")
+            continue
+        change = (after['value'] - before['value']) / before['value'] if before['value'] else 0.0
+        flag = ''
+        if change > args.threshold:
+            flag = 'REGRESSION'
+            regressions.append(name)
+        elif change < -args.threshold:
+            flag = 'improved'
+        print(f"{name:45s} {before['value']:12.3f} {after['value']:12.3f} {change:+8.1%} {after['unit']} {flag}")
+
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    print(f"No regressions beyond {args.threshold:.0%}")
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Run the benchmarks and write the results as JSON')
+    run_parser.add_argument('--output', default='benchmark_results.json', help='Results file')
+    run_parser.add_argument('--sections', nargs='+', choices=SECTIONS, help='Sections to run, all by default')
+    run_parser.add_argument('--batch-sizes', nargs='+', type=int, default=BATCH_SIZES, help='predict_batch sizes')
+    run_parser.add_argument('--tabnet-epochs', type=int, default=5, help='Epochs of the timed TabNet training')
+    run_parser.add_argument('--skip-tabnet', action='store_true', help='Leave out the transformer model')
+    run_parser.add_argument('--startup-runs', type=int, default=3, help='Server starts timed, the median is kept')
+    run_parser.add_argument('--threads', type=int, default=1,
+                            help='BLAS and torch threads, 0 keeps the libraries\' defaults')
+    run_parser.add_argument('--quick', action='store_true', help='Shorter timing loops and a single server start')
+
+    compare_parser = commands.add_parser('compare', help='Flag regressions of a run against a baseline')
+    compare_parser.add_argument('baseline', help='Baseline results file')
+    compare_parser.add_argument('current', help='Results file to check')
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                                help='Relative slowdown reported as a regression')
+
+    args = parser.parse_args()
+    return run(args) if args.command == 'run' else compare(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
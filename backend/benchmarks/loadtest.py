@@ -0,0 +1,397 @@
+#!/usr/bin/env python
+"""Open-loop load generator for the scoring API
+
+Replays leads from data/Lead Scoring.csv against /score, /score-batch
+and /compare-models at increasing arrival rates, and reports throughput,
+latency percentiles and error/fallback rates per rate. The app runs
+in-process by default. Pass --url to drive a running server instead,
+which needs httpx:
+
+    python benchmarks/loadtest.py run --rates 25 50 100 200 --duration 10 --output load.json
+    python benchmarks/loadtest.py run --url http://127.0.0.1:8000 --rates 50 100
+    python benchmarks/loadtest.py compare load_before.json load_after.json
+
+Requests are sent on a schedule that doesn't wait for responses (open
+loop), and latency is measured from the moment a request was due. A
+server that falls behind shows up as growing latency instead of a
+silently lower request rate.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARKS_DIR)
+SRC_DIR = os.path.join(BACKEND_DIR, 'src')
+sys.path.insert(0, SRC_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from bench import environment
+
+# Format of the results file; compare refuses files with another version
+RESULTS_VERSION = 1
+CSV_PATH = os.path.join(BACKEND_DIR, 'data', 'Lead Scoring.csv')
+ENDPOINTS = {
+    'score': '/api/ml-scoring/score',
+    'score-batch': '/api/ml-scoring/score-batch',
+    'compare-models': '/api/ml-scoring/compare-models'
+}
+DEFAULT_MIX = 'score=0.8,score-batch=0.1,compare-models=0.1'
+
+def _value(row, column, convert=str):
+    value = row.get(column)
+    if value is None or value == '':
+        return None
+    try:
+        return convert(value)
+    except ValueError:
+        return None
+
+def load_leads(path=CSV_PATH, transformer_share=0.0, seed=42):
+    """Payloads built from the lead scoring CSV
+
+    Returns:
+        Tuple of (LeadData payloads for /score, raw CSV rows for /compare-models)
+    """
+    rng = random.Random(seed)
+    payloads, rows = [], []
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            number = row.get('Lead Number')
+            payloads.append({
+                'name': f"Lead {number}",
+                'email': f"lead{number}@example.com",
+                'company': row.get('Specialization') or None,
+                'source': row.get('Lead Source') or None,
+                'website_visits': _value(row, 'TotalVisits', lambda v: int(float(v))),
+                'time_spent': _value(row, 'Total Time Spent on Website', float),
+                'engagement_level': _value(row, 'Page Views Per Visit', float),
+                'content_downloaded': 1 if row.get('A free copy of Mastering The Interview') == 'Yes' else 0,
+                'dataset_type': 'lead_scoring',
+                'model_type': 'transformer' if rng.random() < transformer_share else 'random_forest'
+            })
+            rows.append({key: value for key, value in row.items() if value != '' and key != 'Converted'})
+    return payloads, rows
+
+class InProcessClient:
+    """Calls the ASGI app directly, after running its startup"""
+
+    def __init__(self):
+        self.app = None
+        self._lifespan = None
+        self._lifespan_queue = None
+
+    async def start(self, ready_timeout):
+        from main import app
+        from services.startup import startup_tracker
+        self.app = app
+        self._lifespan_queue = asyncio.Queue()
+        started = asyncio.get_running_loop().create_future()
+
+        async def receive():
+            return await self._lifespan_queue.get()
+
+        async def send(message):
+            if message['type'] == 'lifespan.startup.complete' and not started.done():
+                started.set_result(None)
+
+        self._lifespan = asyncio.create_task(app({'type': 'lifespan', 'asgi': {'version': '3.0'}}, receive, send))
+        await self._lifespan_queue.put({'type': 'lifespan.startup'})
+        await started
+        deadline = time.perf_counter() + ready_timeout
+        while not startup_tracker.ready:
+            if startup_tracker.error is not None:
+                raise RuntimeError(f"The app failed to load its models: {startup_tracker.error}")
+            if time.perf_counter() > deadline:
+                raise RuntimeError("The app did not become ready in time")
+            await asyncio.sleep(0.05)
+
+    async def post(self, path, payload):
+        body = json.dumps(payload).encode()
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'POST',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+            'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())],
+            'client': ('127.0.0.1', 0), 'server': ('127.0.0.1', 80)
+        }
+        response = {'status': None, 'body': []}
+        delivered = False
+        finished = asyncio.Event()
+
+        async def receive():
+            nonlocal delivered
+            if not delivered:
+                delivered = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            await finished.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+            elif message['type'] == 'http.response.body':
+                response['body'].append(message.get('body', b''))
+                if not message.get('more_body', False):
+                    finished.set()
+
+        await self.app(scope, receive, send)
+        return response['status'], json.loads(b''.join(response['body']) or b'null')
+
+    async def close(self):
+        if self._lifespan is not None:
+            await self._lifespan_queue.put({'type': 'lifespan.shutdown'})
+            try:
+                await asyncio.wait_for(self._lifespan, timeout=30)
+            except asyncio.TimeoutError:
+                self._lifespan.cancel()
+
+class HttpClient:
+    """Sends requests to a running server over HTTP"""
+
+    def __init__(self, url, timeout):
+        try:
+            import httpx
+        except ImportError:
+            raise SystemExit("Load testing a running server needs httpx: pip install httpx")
+        self._client = httpx.AsyncClient(base_url=url, timeout=timeout,
+                                         limits=httpx.Limits(max_connections=None, max_keepalive_connections=None))
+
+    async def start(self, ready_timeout):
+        deadline = time.perf_counter() + ready_timeout
+        while True:
+            try:
+                if (await self._client.get('/ready')).status_code == 200:
+                    return
+            except Exception:
+                pass
+            if time.perf_counter() > deadline:
+                raise RuntimeError("The server did not become ready in time")
+            await asyncio.sleep(0.2)
+
+    async def post(self, path, payload):
+        response = await self._client.post(path, json=payload)
+        return response.status_code, response.json()
+
+    async def close(self):
+        await self._client.aclose()
+
+def _fallbacks(endpoint, body):
+    """Results in a response that are default scores instead of model predictions"""
+    if endpoint == 'score':
+        return 1 if body.get('error') else 0
+    if endpoint == 'score-batch':
+        return sum(1 for result in body if result.get('error'))
+    return sum(1 for key, result in body.items() if key.endswith('_model') and 'error' in result)
+
+def _results_per_request(endpoint, settings):
+    return settings['batch_size'] if endpoint == 'score-batch' else (2 if endpoint == 'compare-models' else 1)
+
+def _summarize(records, elapsed, settings):
+    latencies = np.array([r['latency'] for r in records if r['ok']]) * 1000
+    results = sum(r['results'] for r in records)
+    summary = {
+        'requests': len(records),
+        'ok': int(sum(r['ok'] for r in records)),
+        'error_rate': (sum(not r['ok'] for r in records) / len(records)) if records else 0.0,
+        'fallback_rate': (sum(r['fallbacks'] for r in records) / results) if results else 0.0,
+        'throughput_rps': sum(r['ok'] for r in records) / elapsed if elapsed else 0.0
+    }
+    for name, q in (('p50_ms', 50), ('p95_ms', 95), ('p99_ms', 99), ('max_ms', 100)):
+        summary[name] = float(np.percentile(latencies, q)) if len(latencies) else None
+    return summary
+
+async def run_stage(client, rate, duration, payloads, rows, mix, settings, seed):
+    """Offer rate requests per second for duration seconds
+
+    Returns:
+        Dict with the overall and per-endpoint summary of the stage
+    """
+    rng = random.Random(seed)
+    endpoints, weights = zip(*mix.items())
+    loop = asyncio.get_running_loop()
+    records = []
+    dropped = 0
+    in_flight = 0
+
+    async def send(endpoint, due):
+        nonlocal in_flight
+        if endpoint == 'score':
+            payload = rng.choice(payloads)
+        elif endpoint == 'score-batch':
+            payload = rng.sample(payloads, settings['batch_size'])
+        else:
+            payload = dict(rng.choice(rows))
+        record = {'endpoint': endpoint, 'ok': False, 'fallbacks': 0,
+                  'results': _results_per_request(endpoint, settings), 'latency': None}
+        try:
+            status, body = await asyncio.wait_for(client.post(ENDPOINTS[endpoint], payload), settings['timeout'])
+            record['ok'] = status == 200
+            if record['ok']:
+                record['fallbacks'] = _fallbacks(endpoint, body)
+        except Exception:
+            pass
+        record['latency'] = loop.time() - due
+        records.append(record)
+        in_flight -= 1
+
+    start = loop.time()
+    due = start
+    tasks = []
+    while due - start < duration:
+        delay = due - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if in_flight >= settings['max_in_flight']:
+            dropped += 1
+        else:
+            in_flight += 1
+            tasks.append(asyncio.create_task(send(rng.choices(endpoints, weights)[0], due)))
+        due += rng.expovariate(rate) if settings['arrivals'] == 'poisson' else 1.0 / rate
+    await asyncio.gather(*tasks)
+    elapsed = loop.time() - start
+
+    # Poisson arrivals only average the offered rate; judge throughput against what was sent
+    stage = {'offered_rps': rate, 'sent_rps': (len(records) + dropped) / duration, 'duration_s': elapsed,
+             'dropped': dropped, **_summarize(records, elapsed, settings)}
+    stage['endpoints'] = {
+        endpoint: _summarize([r for r in records if r['endpoint'] == endpoint], elapsed, settings)
+        for endpoint in endpoints
+    }
+    return stage
+
+def _sustainable(stage, settings):
+    """Whether a stage kept up with its rate within the latency target"""
+    return (stage['p99_ms'] is not None and stage['p99_ms'] <= settings['p99_target_ms']
+            and stage['error_rate'] <= 0.01 and stage['dropped'] == 0
+            and stage['throughput_rps'] >= 0.95 * stage['sent_rps'])
+
+def _parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in ENDPOINTS:
+            raise SystemExit(f"Unknown endpoint in --mix: {name} (one of {', '.join(ENDPOINTS)})")
+        mix[name.strip()] = float(weight or 1)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+async def _run(args):
+    settings = {
+        'batch_size': args.batch_size,
+        'timeout': args.timeout,
+        'max_in_flight': args.max_in_flight,
+        'arrivals': args.arrivals,
+        'p99_target_ms': args.p99_target_ms
+    }
+    mix = _parse_mix(args.mix)
+    payloads, rows = load_leads(transformer_share=args.transformer_share)
+
+    if args.url:
+        client = HttpClient(args.url, args.timeout)
+    else:
+        # Keep load test leads out of the real lead store
+        os.environ.setdefault('LEAD_STORE_PATH', os.path.join(tempfile.mkdtemp(prefix='leadgen-load-'), 'leads.db'))
+        client = InProcessClient()
+    await client.start(args.ready_timeout)
+
+    stages = []
+    try:
+        if args.warmup > 0:
+            print(f"Warming up for {args.warmup:g}s at {args.rates[0]:g} req/s")
+            await run_stage(client, args.rates[0], args.warmup, payloads, rows, mix, settings, seed=0)
+        for i, rate in enumerate(args.rates):
+            stage = await run_stage(client, rate, args.duration, payloads, rows, mix, settings, seed=i + 1)
+            stage['sustainable'] = _sustainable(stage, settings)
+            stages.append(stage)
+            print(f"{rate:8g} req/s offered  {stage['throughput_rps']:8.1f} req/s done  "
+                  f"p50 {stage['p50_ms'] or 0:7.1f}  p95 {stage['p95_ms'] or 0:7.1f}  p99 {stage['p99_ms'] or 0:7.1f}  "
+                  f"max {stage['max_ms'] or 0:7.1f} ms  errors {stage['error_rate']:.1%}  "
+                  f"fallbacks {stage['fallback_rate']:.1%}  dropped {stage['dropped']}")
+    finally:
+        await client.close()
+
+    sustainable = [stage['offered_rps'] for stage in stages if stage['sustainable']]
+    max_rate = max(sustainable) if sustainable else None
+    print(f"Highest rate meeting p99 <= {args.p99_target_ms:g} ms: "
+          f"{f'{max_rate:g} req/s' if max_rate is not None else 'none of the tested rates'}")
+    return {
+        'format_version': RESULTS_VERSION,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'environment': environment({'threads': None}),
+        'target': args.url or 'in-process',
+        'settings': dict(settings, mix=mix, rates=args.rates, duration_s=args.duration,
+                         transformer_share=args.transformer_share),
+        'max_sustainable_rps': max_rate,
+        'stages': stages
+    }
+
+def run(args):
+    report = asyncio.run(_run(args))
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    return 0
+
+def compare(args):
+    reports = []
+    for path in (args.baseline, args.current):
+        with open(path) as f:
+            report = json.load(f)
+        if report.get('format_version') != RESULTS_VERSION:
+            print(f"{path} has results format {report.get('format_version')}, expected {RESULTS_VERSION}")
+            return 2
+        reports.append(report)
+    baseline, current = reports
+    if baseline['settings'].get('mix') != current['settings'].get('mix'):
+        print(f"Warning: endpoint mix differs: {baseline['settings'].get('mix')} -> {current['settings'].get('mix')}")
+
+    before = {stage['offered_rps']: stage for stage in baseline['stages']}
+    print(f"{'rate':>8s} {'throughput':>22s} {'p50 ms':>20s} {'p99 ms':>20s}")
+    for stage in current['stages']:
+        old = before.get(stage['offered_rps'])
+        if old is None:
+            continue
+        cells = [f"{old[key] or 0:8.1f} -> {stage[key] or 0:8.1f}" for key in ('throughput_rps', 'p50_ms', 'p99_ms')]
+        print(f"{stage['offered_rps']:8g} {cells[0]:>22s} {cells[1]:>20s} {cells[2]:>20s}")
+    print(f"Highest sustainable rate: {baseline['max_sustainable_rps']} -> {current['max_sustainable_rps']} req/s")
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Run a load test and write the results as JSON')
+    run_parser.add_argument('--url', help='Server to load, e.g. http://127.0.0.1:8000; in-process by default')
+    run_parser.add_argument('--rates', nargs='+', type=float, default=[10, 25, 50, 100, 200],
+                            help='Arrival rates in requests per second, one stage each')
+    run_parser.add_argument('--duration', type=float, default=10, help='Seconds per stage')
+    run_parser.add_argument('--warmup', type=float, default=3, help='Seconds of unrecorded load before the stages')
+    run_parser.add_argument('--mix', default=DEFAULT_MIX, help='Endpoint weights, e.g. score=0.9,score-batch=0.1')
+    run_parser.add_argument('--batch-size', type=int, default=16, help='Leads per /score-batch request')
+    run_parser.add_argument('--transformer-share', type=float, default=0.0,
+                            help='Fraction of /score leads sent to the transformer model')
+    run_parser.add_argument('--arrivals', choices=('uniform', 'poisson'), default='poisson',
+                            help='Evenly spaced or Poisson arrivals')
+    run_parser.add_argument('--p99-target-ms', type=float, default=50, help='Latency target of the summary')
+    run_parser.add_argument('--max-in-flight', type=int, default=2000,
+                            help='Outstanding requests beyond which new ones are dropped and counted')
+    run_parser.add_argument('--timeout', type=float, default=30, help='Seconds before a request counts as failed')
+    run_parser.add_argument('--ready-timeout', type=float, default=300, help='Seconds to wait for the app to be ready')
+    run_parser.add_argument('--output', default='loadtest_results.json', help='Results file')
+
+    compare_parser = commands.add_parser('compare', help='Show how two load test runs differ per rate')
+    compare_parser.add_argument('baseline', help='Earlier results file')
+    compare_parser.add_argument('current', help='Later results file')
+
+    args = parser.parse_args()
+    return run(args) if args.command == 'run' else compare(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
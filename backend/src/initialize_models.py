@@ -1,6 +1,32 @@
 import os
+import threading
 from ml.lead_model import LeadScoringModel
-from ml.tabnet_model import TabNetLeadScoringModel
+from ml.training import (
+    train_lead_scoring_model, train_tabnet_model, search_hyperparameters, compact_lead_scoring_model,
+    fit_calibrator
+)
+from services.model_registry import model_registry
+from services.training_jobs import training_jobs
+
+# torch and pytorch_tabnet are imported by the TabNet loader and trainer only,
+# so starting without the transformer model doesn't pay for them
+
+LEAD_MODEL_LABEL = "lead_scoring:random_forest"
+BANK_MODEL_LABEL = "bank:random_forest"
+TABNET_MODEL_LABEL = "lead_scoring:transformer"
+
+# Models loaded (or trained) before the server reports ready; others are
+# loaded when first requested
+STARTUP_MODELS = [label.strip() for label in os.getenv("STARTUP_MODELS", LEAD_MODEL_LABEL).split(",") if label.strip()]
+
+# Single-file artifacts written before the model registry existed. They are
+# imported as the first registry version of their model.
+LEGACY_ARTIFACTS = {
+    LEAD_MODEL_LABEL: 'lead_scoring_custom_model.pkl',
+    BANK_MODEL_LABEL: 'lead_scoring_model.pkl',
+    # ml.tabnet_model.TABNET_MODEL_FILENAME
+    TABNET_MODEL_LABEL: 'lead_scoring_tabnet_model.zip'
+}
 
 # Global model instances
 lead_scoring_model = None
@@ -15,39 +41,294 @@ def ensure_data_directory():
         os.makedirs(data_dir)
     return data_dir
 
-def initialize_models():
-    """Initialize and train all models"""
+def load_lead_scoring_model(model_path):
+    model = LeadScoringModel('lead_scoring')
+    model.load_model(model_path)
+    return model
+
+def load_bank_model(model_path):
+    model = LeadScoringModel()
+    model.load_model(model_path)
+    return model
+
+def load_tabnet_model(model_path):
+    from ml.tabnet_model import TabNetLeadScoringModel
+    model = TabNetLeadScoringModel()
+    model.load_model(model_path)
+    return model
+
+MODEL_LOADERS = {
+    LEAD_MODEL_LABEL: load_lead_scoring_model,
+    BANK_MODEL_LABEL: load_bank_model,
+    TABNET_MODEL_LABEL: load_tabnet_model
+}
+
+# Training entry point and arguments for each model label
+MODEL_TRAINERS = {
+    LEAD_MODEL_LABEL: (train_lead_scoring_model, ('lead_scoring',)),
+    BANK_MODEL_LABEL: (train_lead_scoring_model, ('bank',)),
+    TABNET_MODEL_LABEL: (train_tabnet_model, ())
+}
+
+def register_models():
+    """Tell the model registry how each model is stored and loaded"""
+    for label, loader in MODEL_LOADERS.items():
+        model_registry.register(label, LEGACY_ARTIFACTS[label], loader)
+
+def import_legacy_artifact(label):
+    """Publish a pre-registry artifact as the first version of its model
+
+    Returns:
+        True if an artifact was imported, which also activates it
+    """
+    legacy_path = os.path.join(ensure_data_directory(), LEGACY_ARTIFACTS[label])
+    if model_registry.latest_version(label) is not None or not os.path.exists(legacy_path):
+        return False
+    print(f"Importing {legacy_path} into the model registry")
+    model_registry.publish(label, MODEL_LOADERS[label](legacy_path), source="import")
+    return True
+
+def load_registered_models(labels=None):
+    """Activate the latest registry version of the given models, all by default
+
+    Legacy artifacts in the data directory are imported into the registry
+    first for models that have no registry versions yet.
+    """
+    register_models()
+    labels = labels or list(MODEL_LOADERS)
+    for label in labels:
+        try:
+            import_legacy_artifact(label)
+        except Exception as e:
+            print(f"Error importing the legacy {label} artifact: {str(e)}")
+    model_registry.load_active(labels)
+
+# Models that can be updated incrementally with newly labeled leads
+UPDATABLE_MODELS = (LEAD_MODEL_LABEL, BANK_MODEL_LABEL)
+# Random forest models that can be compacted
+COMPACTABLE_MODELS = (LEAD_MODEL_LABEL, BANK_MODEL_LABEL)
+# Largest holdout ROC-AUC loss a compacted version may have and still be published
+MAX_COMPACTION_ROC_AUC_DROP = 0.005
+
+# Models whose calibrated probabilities the "ensemble" model type averages, per dataset type
+ENSEMBLE_MEMBERS = {
+    "lead_scoring": (LEAD_MODEL_LABEL, TABNET_MODEL_LABEL),
+    "bank": (BANK_MODEL_LABEL,)
+}
+# Time compare-models and the ensemble wait for each model before leaving it out
+MODEL_FANOUT_TIMEOUT_MS = float(os.getenv("MODEL_FANOUT_TIMEOUT_MS", "2000"))
+
+# Model label -> (model, calibrator) of the version calibrated last
+_calibrators = {}
+_calibration_locks = {label: threading.Lock() for label in LEGACY_ARTIFACTS}
+
+def get_calibrator(label, model):
+    """Probability calibrator of a model, fitted on the holdout split the first time it is needed
+
+    Blocks while fitting, so call it on the inference pool. Each new version
+    of a model gets its own calibrator.
+    """
+    cached = _calibrators.get(label)
+    if cached is None or cached[0] is not model:
+        with _calibration_locks[label]:
+            cached = _calibrators.get(label)
+            if cached is None or cached[0] is not model:
+                calibrator = fit_calibrator(model, label.split(":", 1)[0])
+                print(f"Calibrated {label} probabilities: {calibrator.to_dict()}")
+                cached = (model, calibrator)
+                _calibrators[label] = cached
+    return cached[1]
+
+def _activate_trained_version(label, result, source="train"):
+    """Swap in the version a training job published; runs in the job monitor thread"""
+    model_registry.activate(label, result["version"], source=source)
+    return result
+
+def submit_training(label):
+    """Queue a training job for a model, reusing one that is already queued or running
+
+    The job publishes a new version, which is activated when the job succeeds.
+    """
+    job = training_jobs.active_job(label)
+    if job is None:
+        job = training_jobs.submit(
+            label, train_and_publish, (label,),
+            on_success=lambda result: _activate_trained_version(label, result)
+        )
+    return job
+
+def train_and_publish(label, progress=None):
+    """Train a model and publish it to the registry without activating it
+
+    Runs in a training job process; the server activates the returned version.
+
+    Args:
+        label: Model label to train
+        progress: Optional progress function passed to the model's train()
+
+    Returns:
+        Dict with the published version and the model's metrics
+    """
+    register_models()
+    train, args = MODEL_TRAINERS[label]
+    model = train(*args, progress=progress)
+    if progress is not None:
+        progress(stage="publishing")
+    version = model_registry.publish(label, model, source="train", activate=False)
+    return {"version": version, "metrics": model.metrics}
+
+def submit_update(label, records):
+    """Queue an incremental update of a model with newly labeled leads
+
+    Updates run as training jobs named "<label>:update". Each one starts
+    from the latest published version, so queued updates build on each
+    other. The new version is activated when the job succeeds.
+
+    Args:
+        label: One of UPDATABLE_MODELS
+        records: Labeled lead dicts, see LeadScoringModel.split_labels
+    """
+    if label not in UPDATABLE_MODELS:
+        raise ValueError(f"{label} can't be updated incrementally")
+    return training_jobs.submit(
+        f"{label}:update", update_and_publish, (label, records),
+        on_success=lambda result: _activate_trained_version(label, result, source="incremental")
+    )
+
+def submit_search(label, options=None):
+    """Queue a hyperparameter search for a model as a training job named "<label>:search"
+
+    The job's result is the search report; it doesn't publish a model.
+
+    Args:
+        label: Model label whose dataset and model type are searched
+        options: Optional dict of HyperparameterSearch keyword arguments
+    """
+    dataset_type, model_type = label.split(":", 1)
+    return training_jobs.submit(f"{label}:search", search_hyperparameters, (dataset_type, model_type, options))
+
+def update_and_publish(label, records, progress=None):
+    """Update the latest version of a model with labeled leads and publish it
+
+    Runs in a training job process; the server activates the returned version.
+
+    Args:
+        label: One of UPDATABLE_MODELS
+        records: Labeled lead dicts
+        progress: Optional progress function passed to the model's update()
+
+    Returns:
+        Dict with the published and the base version and the update statistics
+    """
+    register_models()
+    base_version = model_registry.latest_version(label)
+    if base_version is None:
+        raise FileNotFoundError(f"No published versions for {label}")
+    if progress is not None:
+        progress(stage="loading_model", base_version=base_version)
+    model, _ = model_registry.load(label, base_version)
+    updated = model.update(records, progress=progress)
+    if progress is not None:
+        progress(stage="publishing")
+    version = model_registry.publish(label, updated, source="incremental", activate=False)
+    return {"version": version, "base_version": base_version, "update": updated.update_info}
+
+def _activate_compacted_version(label, result):
+    """Swap in the version a compaction job published, if it published one"""
+    if result.get("version") is None:
+        return result
+    return _activate_trained_version(label, result, source="compaction")
+
+def submit_compaction(label, options=None, max_roc_auc_drop=MAX_COMPACTION_ROC_AUC_DROP):
+    """Queue a compaction of a random forest model as a training job named "<label>:compact"
+
+    The job compacts the latest published version. The compacted model is
+    published as a new version and activated only if its holdout ROC-AUC
+    is at most max_roc_auc_drop below the original's. The job's result
+    holds the report comparing both either way.
+
+    Args:
+        label: One of COMPACTABLE_MODELS
+        options: Optional dict of LeadScoringModel.compact keyword arguments
+        max_roc_auc_drop: Largest accepted ROC-AUC loss
+    """
+    if label not in COMPACTABLE_MODELS:
+        raise ValueError(f"{label} can't be compacted")
+    return training_jobs.submit(
+        f"{label}:compact", compact_and_publish, (label, options, max_roc_auc_drop),
+        on_success=lambda result: _activate_compacted_version(label, result)
+    )
+
+def compact_and_publish(label, options=None, max_roc_auc_drop=MAX_COMPACTION_ROC_AUC_DROP, progress=None):
+    """Compact the latest version of a model and publish it if it's accurate enough
+
+    Runs in a training job process; the server activates the returned version.
+
+    Args:
+        label: One of COMPACTABLE_MODELS
+        options: Optional dict of LeadScoringModel.compact keyword arguments
+        max_roc_auc_drop: Largest accepted ROC-AUC loss
+        progress: Optional progress function passed to the model's compact()
+
+    Returns:
+        Dict with the published version (None if the compacted model lost
+        too much ROC-AUC), the base version and the compaction report
+    """
+    register_models()
+    base_version = model_registry.latest_version(label)
+    if base_version is None:
+        raise FileNotFoundError(f"No published versions for {label}")
+    if progress is not None:
+        progress(stage="loading_model", base_version=base_version)
+    model, _ = model_registry.load(label, base_version)
+    compacted = compact_lead_scoring_model(model, options, progress=progress)
+    report = compacted.compaction['report']
+
+    version = None
+    if -report['change']['roc_auc'] <= max_roc_auc_drop:
+        if progress is not None:
+            progress(stage="publishing")
+        version = model_registry.publish(label, compacted, source="compaction", activate=False)
+    return {"version": version, "base_version": base_version,
+            "trees": compacted.compaction['trees_after'], "nodes": compacted.compaction['nodes_after'],
+            "report": report}
+
+def initialize_models(labels=None):
+    """Load the startup models, training the ones that don't exist yet
+
+    Args:
+        labels: Models to make available, defaults to STARTUP_MODELS. Stored
+            versions load concurrently and are warmed up before this returns.
+
+    Raises:
+        Exception: Whatever loading or training a model raised, so the
+            caller doesn't report models as available that aren't
+    """
     global lead_scoring_model, lead_scoring_model_bank, lead_scoring_tabnet_model
-    
-    data_dir = ensure_data_directory()
-    
-    try:
-        # Skip bank model training as we don't have the dataset
+
+    labels = labels or STARTUP_MODELS
+    load_registered_models(labels)
+
+    # Skip bank model training as we don't have the dataset
+    if BANK_MODEL_LABEL in labels:
+        labels = [label for label in labels if label != BANK_MODEL_LABEL]
         print("Skipping bank model training as dataset is not available")
-        
-        # Initialize and train lead scoring model if needed
-        lead_model_path = os.path.join(data_dir, 'lead_scoring_custom_model.pkl')
-        if not os.path.exists(lead_model_path):
-            print("Training lead scoring model...")
-            lead_scoring_model = LeadScoringModel('lead_scoring')
-            lead_scoring_model.train()
-            lead_scoring_model.save_model('lead_scoring_custom_model.pkl')
-        else:
-            print(f"Loading existing lead scoring model from {lead_model_path}")
-            lead_scoring_model = LeadScoringModel('lead_scoring')
-            lead_scoring_model.load_model(lead_model_path)
-        
-        # Initialize and train TabNet model
-        print("Training TabNet model...")
-        lead_scoring_tabnet_model = TabNetLeadScoringModel()
-        lead_scoring_tabnet_model.train()
-        
-        print("All models initialized and trained successfully")
-        return lead_scoring_model, lead_scoring_model_bank, lead_scoring_tabnet_model
-    except Exception as e:
-        print(f"Error initializing models: {str(e)}")
-        print("Starting FastAPI server anyway...")
-        return None, None, None
+
+    # Train missing models in training job processes
+    jobs = []
+    for label in labels:
+        if model_registry.get(label) is None:
+            print(f"Training {label} model...")
+            jobs.append(submit_training(label))
+    for job in jobs:
+        job.future.result()
+
+    lead_scoring_model = model_registry.get(LEAD_MODEL_LABEL)
+    lead_scoring_model_bank = model_registry.get(BANK_MODEL_LABEL)
+    lead_scoring_tabnet_model = model_registry.get(TABNET_MODEL_LABEL)
+
+    print("All models initialized successfully")
+    return lead_scoring_model, lead_scoring_model_bank, lead_scoring_tabnet_model
 
 def get_models():
     """Get initialized model instances"""
@@ -55,4 +336,4 @@ def get_models():
     return lead_scoring_model, lead_scoring_model_bank, lead_scoring_tabnet_model
 
 if __name__ == "__main__":
-    initialize_models() 
\ No newline at end of file
+    initialize_models()
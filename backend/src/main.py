@@ -1,10 +1,25 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 import uvicorn
+import asyncio
+import logging
 import os
 
-from routes.ml_scoring import router as ml_scoring_router, load_models
-from initialize_models import initialize_models, get_models
+# Imported first so startup timings include importing the routes and models
+from services.startup import startup_tracker
+from routes.ml_scoring import router as ml_scoring_router, update_models
+from routes.leads import router as leads_router
+from routes.debug import router as debug_router
+from initialize_models import initialize_models, get_models, STARTUP_MODELS
+from services.executors import shutdown_executors
+from services.model_registry import model_registry
+from services.lead_store import lead_store
+from services.telemetry import TelemetryMiddleware, render_metrics
+from services.profiling import ProfilingMiddleware, request_profiler
+
+# Structured scoring logs go through the standard logging module
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(name)s %(levelname)s %(message)s")
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -22,18 +37,56 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Record request counts and latency per endpoint
+app.add_middleware(TelemetryMiddleware)
+
+# Keep the slowest requests with a stage breakdown, and profile requests on demand
+app.add_middleware(ProfilingMiddleware)
+
+async def load_startup_models():
+    """Load and warm up the startup models, then report the server ready"""
+    error = None
+    try:
+        # Initialize models off the event loop and make them available
+        lead_model, bank_model, tabnet_model = await asyncio.to_thread(initialize_models)
+        startup_tracker.mark("models_loaded")
+
+        # Update the models in the routes
+        update_models(lead_model, bank_model, tabnet_model)
+
+        missing = [label for label in STARTUP_MODELS if model_registry.active_version(label) is None]
+        if missing:
+            error = f"Startup models not loaded: {', '.join(missing)}"
+            print(f"Error loading startup models: {error}")
+    except Exception as e:
+        error = str(e)
+        print(f"Error loading startup models: {error}")
+
+    # Pick up model versions published by other processes
+    model_registry.start_watching()
+    startup_tracker.set_ready(error)
+
 # Initialize models on startup
 @app.on_event("startup")
 async def startup_event():
-    # Initialize models and make them available
-    lead_model, bank_model, tabnet_model = initialize_models()
-    
-    # Update the models in the routes
-    from routes.ml_scoring import update_models
-    update_models(lead_model, bank_model, tabnet_model)
+    startup_tracker.mark("imports")
+    # Models load in the background so /health answers right away; /ready
+    # reports when they are warmed up
+    app.state.model_loading = asyncio.create_task(load_startup_models())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Stop the registry watcher, the inference and training pools and the
+    # profiler's sampler, and write the scored leads still queued
+    model_registry.stop_watching()
+    shutdown_executors()
+    lead_store.shutdown()
+    request_profiler.shutdown()
 
 # Include routers
 app.include_router(ml_scoring_router, prefix="/api/ml-scoring", tags=["ML Scoring"])
+app.include_router(leads_router, prefix="/api/leads", tags=["Leads"])
+app.include_router(debug_router, prefix="/debug", tags=["Debug"])
 
 # Root endpoint
 @app.get("/")
@@ -50,6 +103,19 @@ async def root():
 async def health_check():
     return {"status": "ok"}
 
+# Readiness probe: 503 until the startup models are loaded and warmed up
+@app.get("/ready")
+async def readiness_check():
+    state = startup_tracker.describe()
+    state["models"] = {label: model_registry.active_version(label) for label in STARTUP_MODELS}
+    state["ready"] = state["ready"] and all(version is not None for version in state["models"].values())
+    return JSONResponse(state, status_code=200 if state["ready"] else 503)
+
+# Prometheus scrape endpoint
+@app.get("/telemetry", response_class=PlainTextResponse)
+async def telemetry():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000))
     uvicorn.run("main:app", host="0.0.0.0", port=port, reload=True) 
\ No newline at end of file
@@ -0,0 +1,239 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+class CompiledEncoder:
+    """Encodes lead dicts straight into model rows without pandas
+
+    Built once from the fitted ColumnTransformer of the scoring pipeline. It
+    holds the output slice of every transformer, the scaler's mean/scale
+    arrays and a category -> one-hot column dict per categorical feature, and
+    writes leads into a preallocated numpy matrix. The output is identical to
+    the dense form of ColumnTransformer.transform.
+
+    Only StandardScaler and OneHotEncoder (without drop or infrequent
+    categories) are supported; anything else raises ValueError so the caller
+    can keep the sklearn path.
+    """
+
+    def __init__(self, preprocessor):
+        """Compile a fitted ColumnTransformer
+
+        Args:
+            preprocessor: Fitted ColumnTransformer of StandardScaler and
+                OneHotEncoder steps
+        """
+        self.n_features = int(sum(
+            s.stop - s.start for s in preprocessor.output_indices_.values()))
+        self.dtype = np.float64
+        self.columns = list(preprocessor.feature_names_in_)
+        self._numeric = []
+        self._categorical = []
+
+        for name, transformer, columns in preprocessor.transformers_:
+            if transformer == 'drop' or len(columns) == 0:
+                continue
+            columns = [preprocessor.feature_names_in_[c] if isinstance(c, (int, np.integer)) else c
+                       for c in columns]
+            output = preprocessor.output_indices_[name]
+            if isinstance(transformer, StandardScaler):
+                self._numeric.append(self._compile_scaler(transformer, columns, output))
+            elif isinstance(transformer, OneHotEncoder):
+                self._categorical.extend(self._compile_one_hot(transformer, columns, output))
+            else:
+                raise ValueError(f"Unsupported transformer for compiled encoding: {name}")
+
+        self.required_columns = frozenset(
+            [c for _, columns, _, _ in self._numeric for c in columns] +
+            [c for c, _ in self._categorical])
+
+    def save(self, directory):
+        """Write the scaler arrays as .npy files and the column layout as JSON
+
+        Args:
+            directory: Existing directory to write into
+        """
+        numeric = []
+        for i, (output, columns, mean, scale) in enumerate(self._numeric):
+            for name, array in (('mean', mean), ('scale', scale)):
+                if array is not None:
+                    np.save(os.path.join(directory, f"encoder_{name}_{i}.npy"), array)
+            numeric.append({'start': int(output.start), 'stop': int(output.stop), 'columns': list(columns),
+                            'mean': mean is not None, 'scale': scale is not None})
+        layout = {
+            'n_features': self.n_features,
+            'columns': self.columns,
+            'numeric': numeric,
+            # Lookups as [category, position] pairs, JSON keys would turn numbers into strings
+            'categorical': [[column, list(lookup.items())] for column, lookup in self._categorical]
+        }
+        with open(os.path.join(directory, 'encoder.json'), 'w') as f:
+            json.dump(layout, f)
+
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        """Open an encoder written by save()
+
+        Args:
+            directory: Directory passed to save()
+            mmap_mode: numpy mmap mode for the scaler arrays
+
+        Returns:
+            The CompiledEncoder
+        """
+        with open(os.path.join(directory, 'encoder.json'), 'r') as f:
+            layout = json.load(f)
+        encoder = cls.__new__(cls)
+        encoder.n_features = layout['n_features']
+        encoder.dtype = np.float64
+        encoder.columns = layout['columns']
+        encoder._numeric = []
+        for i, entry in enumerate(layout['numeric']):
+            arrays = {}
+            for name in ('mean', 'scale'):
+                arrays[name] = None
+                if entry[name]:
+                    path = os.path.join(directory, f"encoder_{name}_{i}.npy")
+                    arrays[name] = np.asarray(np.load(path, mmap_mode=mmap_mode))
+            encoder._numeric.append((slice(entry['start'], entry['stop']), entry['columns'],
+                                     arrays['mean'], arrays['scale']))
+        encoder._categorical = [
+            (column, {category: position for category, position in pairs})
+            for column, pairs in layout['categorical']
+        ]
+        encoder.required_columns = frozenset(
+            [c for _, columns, _, _ in encoder._numeric for c in columns] +
+            [c for c, _ in encoder._categorical])
+        return encoder
+
+    def output_columns(self):
+        """Input column each output feature is encoded from, one-hot features included
+
+        Returns:
+            List of column names, one per output feature
+        """
+        names = [None] * self.n_features
+        for output, columns, _, _ in self._numeric:
+            names[output] = columns
+        for column, lookup in self._categorical:
+            for position in lookup.values():
+                names[position] = column
+        return names
+
+    @staticmethod
+    def _compile_scaler(scaler, columns, output):
+        mean = scaler.mean_ if scaler.with_mean else None
+        scale = scaler.scale_ if scaler.with_std else None
+        return output, columns, mean, scale
+
+    @staticmethod
+    def _compile_one_hot(encoder, columns, output):
+        if encoder.drop_idx_ is not None or getattr(encoder, '_infrequent_enabled', False):
+            raise ValueError("OneHotEncoder with drop or infrequent categories is not supported")
+        if encoder.handle_unknown != 'ignore':
+            raise ValueError("Only OneHotEncoder(handle_unknown='ignore') is supported")
+
+        compiled = []
+        offset = output.start
+        for column, categories in zip(columns, encoder.categories_):
+            lookup = {}
+            for position, category in enumerate(categories.tolist()):
+                # NaN categories can't be found by dict lookup
+                if isinstance(category, float) and np.isnan(category):
+                    raise ValueError(f"Missing-value category in {column} is not supported")
+                lookup[category] = offset + position
+            compiled.append((column, lookup))
+            offset += len(categories)
+        if offset != output.stop:
+            raise ValueError("One-hot output width does not match the fitted preprocessor")
+        return compiled
+
+    def transform(self, records, out=None):
+        """Encode lead dicts into a dense feature matrix
+
+        Args:
+            records: List of dicts holding at least the model's input columns
+            out: Optional preallocated float64 array of shape
+                (len(records), n_features) to write into
+
+        Returns:
+            The feature matrix, one row per record
+        """
+        for record in records:
+            if not self.required_columns.issubset(record.keys()):
+                missing = sorted(self.required_columns.difference(record.keys()))
+                raise ValueError(f"columns are missing: {set(missing)}")
+        columns = {column: [record[column] for record in records] for column in self.required_columns}
+        return self.transform_columns(columns, len(records), out)
+
+    def transform_columns(self, columns, n_rows, out=None):
+        """Encode a batch given column-wise, e.g. from LeadPreprocessor.transform_columns
+
+        Args:
+            columns: Dict of column -> sequence of n_rows values
+            n_rows: Number of rows in the batch
+            out: Optional preallocated float64 array of shape
+                (n_rows, n_features) to write into
+
+        Returns:
+            The feature matrix, one row per record
+        """
+        if not self.required_columns.issubset(columns.keys()):
+            missing = sorted(self.required_columns.difference(columns.keys()))
+            raise ValueError(f"columns are missing: {set(missing)}")
+
+        if out is None:
+            out = np.zeros((n_rows, self.n_features), dtype=self.dtype)
+        else:
+            out[:] = 0.0
+
+        for output, names, mean, scale in self._numeric:
+            # None becomes NaN, like the object -> float conversion in sklearn
+            values = np.empty((n_rows, len(names)), dtype=np.float64)
+            for position, name in enumerate(names):
+                values[:, position] = np.asarray(columns[name], dtype=np.float64)
+            if mean is not None:
+                values -= mean
+            if scale is not None:
+                values /= scale
+            out[:, output] = values
+
+        rows = np.arange(n_rows)
+        for column, lookup in self._categorical:
+            positions = np.fromiter((lookup.get(value, -1) for value in columns[column]),
+                                    dtype=np.int64, count=n_rows)
+            known = positions >= 0
+            out[rows[known], positions[known]] = 1.0
+        return out
+
+    def verify(self, preprocessor, records=None):
+        """Check the encoding matches preprocessor.transform exactly
+
+        Args:
+            preprocessor: The ColumnTransformer this encoder was compiled from
+            records: Optional records to compare on. By default one record is
+                built per category position, plus one with unknown categories.
+
+        Returns:
+            True if both give identical matrices
+        """
+        if records is None:
+            records = self._synthetic_records()
+        expected = preprocessor.transform(pd.DataFrame(records, columns=self.columns))
+        if hasattr(expected, 'toarray'):
+            expected = expected.toarray()
+        return bool(np.array_equal(self.transform(records), expected))
+
+    def _synthetic_records(self):
+        width = max([len(lookup) for _, lookup in self._categorical] + [1])
+        records = []
+        for i in range(width + 1):
+            record = {column: float(i) * 1.5 - 3.0 for column in self.columns}
+            for column, lookup in self._categorical:
+                categories = list(lookup)
+                # Last record uses a category the encoder never saw
+                record[column] = categories[i % len(categories)] if i < width else '__unknown__'
+            records.append(record)
+        return records
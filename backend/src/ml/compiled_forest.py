@@ -0,0 +1,230 @@
+import copy
+import json
+import os
+import numpy as np
+
+# Storage types compact() accepts for thresholds and leaf values
+FLOAT_DTYPES = ('float64', 'float32', 'float16')
+
+def _index_dtype(max_value):
+    """Narrowest signed integer type holding 0..max_value"""
+    for dtype in (np.int16, np.int32):
+        if max_value <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+class CompiledForest:
+    """Array-backed inference engine for a fitted RandomForestClassifier
+
+    All trees' node arrays are concatenated into one structure of arrays and
+    traversed level by level for every (row, tree) pair at once with numpy,
+    which avoids sklearn's per-call validation and per-tree dispatch.
+
+    Each step advances only the (row, tree) pairs that have not reached a
+    leaf yet. Probabilities are accumulated tree by tree in estimator order,
+    like sklearn does, so results are bitwise equal to
+    RandomForestClassifier.predict_proba.
+    """
+
+    # Rows traversed at once, bounds the (rows x trees) working arrays
+    CHUNK_SIZE = 4096
+
+    # Node arrays written by save() as .npy files
+    ARRAYS = ('feature', 'threshold', 'left', 'right', 'value', 'is_leaf', 'roots', 'classes_')
+
+    def __init__(self, forest):
+        """Compile a fitted forest
+
+        Args:
+            forest: Fitted sklearn RandomForestClassifier with a single output
+        """
+        if getattr(forest, 'n_outputs_', 1) != 1:
+            raise ValueError("CompiledForest only supports single-output forests")
+
+        trees = [estimator.tree_ for estimator in forest.estimators_]
+        node_counts = np.array([tree.node_count for tree in trees], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(node_counts)[:-1]])
+
+        features, thresholds, lefts, rights, values = [], [], [], [], []
+        for tree, offset in zip(trees, offsets):
+            node_ids = np.arange(tree.node_count, dtype=np.int64) + offset
+            is_leaf = tree.children_left == -1
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int64))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold).astype(np.float64))
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left + offset))
+            rights.append(np.where(is_leaf, node_ids, tree.children_right + offset))
+
+            # Same normalization as DecisionTreeClassifier.predict_proba
+            value = tree.value[:, 0, :].astype(np.float64)
+            normalizer = value.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            values.append(value / normalizer)
+
+        self.feature = np.ascontiguousarray(np.concatenate(features))
+        self.threshold = np.ascontiguousarray(np.concatenate(thresholds))
+        self.left = np.ascontiguousarray(np.concatenate(lefts))
+        self.right = np.ascontiguousarray(np.concatenate(rights))
+        self.value = np.ascontiguousarray(np.concatenate(values))
+        self.is_leaf = self.left == np.arange(len(self.left))
+        self.roots = offsets.astype(np.int64)
+        self.max_depth = int(max(tree.max_depth for tree in trees))
+        self.n_features = int(forest.n_features_in_)
+        self.classes_ = forest.classes_
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def nbytes(self):
+        """Size of the node arrays"""
+        return int(sum(np.asarray(getattr(self, name)).nbytes for name in self.ARRAYS))
+
+    def compact(self, threshold_dtype='float32', value_dtype='float32', narrow_indices=True):
+        """Copy of the engine with narrower node arrays
+
+        float32 thresholds give the same predictions: inputs are float32, so
+        each threshold is rounded down to the largest float32 not above it,
+        which sends every input the same way. float16 thresholds and
+        float16/float32 leaf values round, so predictions can differ
+        slightly from the forest's. Node and feature indices shrink to the
+        narrowest integer type that holds them.
+
+        Args:
+            threshold_dtype: One of FLOAT_DTYPES
+            value_dtype: One of FLOAT_DTYPES
+            narrow_indices: Store node and feature indices as int16/int32
+
+        Returns:
+            The compacted CompiledForest
+
+        Raises:
+            ValueError: If a dtype is unknown or a threshold is out of its range
+        """
+        for dtype in (threshold_dtype, value_dtype):
+            if dtype not in FLOAT_DTYPES:
+                raise ValueError(f"Unsupported dtype {dtype}, expected one of {', '.join(FLOAT_DTYPES)}")
+        engine = copy.copy(self)
+
+        threshold = np.asarray(self.threshold, dtype=np.float64)
+        narrowed = threshold.astype(threshold_dtype)
+        finite = np.isfinite(threshold)
+        if np.any(finite & ~np.isfinite(narrowed)):
+            raise ValueError(f"Split thresholds exceed the range of {threshold_dtype}")
+        # Round down so x <= threshold keeps its outcome for float32 inputs
+        rounded_up = narrowed > threshold
+        narrowed[rounded_up] = np.nextafter(narrowed[rounded_up], narrowed.dtype.type(-np.inf))
+        engine.threshold = narrowed
+        engine.value = np.asarray(self.value).astype(value_dtype)
+
+        if narrow_indices:
+            node_dtype = _index_dtype(len(self.left) - 1)
+            engine.left = np.asarray(self.left).astype(node_dtype)
+            engine.right = np.asarray(self.right).astype(node_dtype)
+            engine.roots = np.asarray(self.roots).astype(node_dtype)
+            engine.feature = np.asarray(self.feature).astype(_index_dtype(self.n_features - 1))
+        return engine
+
+    def save(self, directory):
+        """Write the node arrays as .npy files and the scalars as JSON
+
+        Args:
+            directory: Existing directory to write into
+        """
+        for name in self.ARRAYS:
+            np.save(os.path.join(directory, f"forest_{name}.npy"), np.asarray(getattr(self, name)))
+        with open(os.path.join(directory, 'forest.json'), 'w') as f:
+            json.dump({'max_depth': self.max_depth, 'n_features': self.n_features}, f)
+
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        """Open an engine written by save()
+
+        Args:
+            directory: Directory passed to save()
+            mmap_mode: numpy mmap mode; the default maps the arrays read-only,
+                so processes loading the same files share their pages
+
+        Returns:
+            The CompiledForest
+        """
+        engine = cls.__new__(cls)
+        for name in cls.ARRAYS:
+            array = np.load(os.path.join(directory, f"forest_{name}.npy"), mmap_mode=mmap_mode)
+            # Plain ndarray view of the map; np.memmap indexing is slower
+            setattr(engine, name, np.asarray(array))
+        with open(os.path.join(directory, 'forest.json'), 'r') as f:
+            scalars = json.load(f)
+        engine.max_depth = scalars['max_depth']
+        engine.n_features = scalars['n_features']
+        return engine
+
+    def apply(self, X):
+        """Global leaf index reached in every tree, shape (n_rows, n_trees)"""
+        # sklearn trees compare float32 inputs against float64 thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows = X.shape[0]
+        flat_X = X.ravel()
+        # One entry per (row, tree) pair; only pairs not yet at a leaf advance
+        nodes = np.tile(self.roots, n_rows)
+        row_offsets = np.repeat(np.arange(n_rows, dtype=np.int64) * self.n_features, self.n_trees)
+        active = np.flatnonzero(~self.is_leaf[nodes])
+        while active.size:
+            current = nodes[active]
+            go_left = flat_X[row_offsets[active] + self.feature[current]] <= self.threshold[current]
+            current = np.where(go_left, self.left[current], self.right[current])
+            nodes[active] = current
+            active = active[~self.is_leaf[current]]
+        return nodes.reshape(n_rows, self.n_trees)
+
+    def predict_proba(self, X):
+        """Class probabilities, equal to the forest's predict_proba"""
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X[np.newaxis, :]
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"X has {X.shape[1]} features, but the forest expects {self.n_features}")
+        if np.isnan(X).any():
+            raise ValueError("Input X contains NaN.")
+
+        proba = np.empty((X.shape[0], self.value.shape[1]), dtype=np.float64)
+        for start in range(0, X.shape[0], self.CHUNK_SIZE):
+            chunk = X[start:start + self.CHUNK_SIZE]
+            leaf_values = self.value[self.apply(chunk)]
+            # cumsum accumulates sequentially in tree order, matching sklearn's
+            # per-tree += so the sums are bitwise identical; narrowed leaf
+            # values are still summed in float64
+            proba[start:start + len(chunk)] = np.cumsum(leaf_values, axis=1, dtype=np.float64)[:, -1, :]
+        proba /= self.n_trees
+        return proba
+
+    def verify(self, forest, X=None, n_samples=512, random_state=0):
+        """Check that predictions match the sklearn forest exactly
+
+        Args:
+            forest: The forest this engine was compiled from
+            X: Optional preprocessed rows to compare on. By default rows are
+                sampled around the split thresholds, including exact ties.
+            n_samples: Number of synthetic rows when X is not given
+            random_state: Seed for the synthetic rows
+
+        Returns:
+            True if both give identical probabilities
+        """
+        if X is None:
+            X = self._synthetic_rows(n_samples, random_state)
+        expected = forest.predict_proba(X)
+        return bool(np.array_equal(self.predict_proba(X), expected))
+
+    def _synthetic_rows(self, n_samples, random_state):
+        rng = np.random.default_rng(random_state)
+        is_split = np.isfinite(self.threshold)
+        X = np.zeros((n_samples, self.n_features), dtype=np.float32)
+        for feature in range(self.n_features):
+            splits = self.threshold[is_split & (self.feature == feature)]
+            if len(splits) == 0:
+                continue
+            picked = rng.choice(splits, size=n_samples)
+            offsets = rng.choice([-1e-3, 0.0, 1e-3], size=n_samples)
+            X[:, feature] = picked + offsets
+        return X
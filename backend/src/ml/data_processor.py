@@ -5,6 +5,8 @@ import os
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
+from .dataset_cache import dataset_cache, USE_DATASET_CACHE
+from .lead_preprocessor import LeadPreprocessor
 
 class DataProcessor:
     def __init__(self, data_path=None, dataset_type='bank'):
@@ -17,6 +19,8 @@ class DataProcessor:
         """
         self.data_path = data_path or self._get_default_path(dataset_type)
         self.dataset_type = dataset_type
+        # Fitted by load_and_prepare_data, to be stored with the trained model
+        self.preprocessor = None
         
     def _get_default_path(self, dataset_type):
         """Get default data path based on dataset type"""
@@ -29,30 +33,44 @@ class DataProcessor:
             raise ValueError(f"Unknown dataset type: {dataset_type}")
     
     def load_and_prepare_data(self):
-        """Load and prepare dataset based on type"""
+        """Load and prepare dataset based on type
+
+        Cleaning is done by a LeadPreprocessor fitted on the dataset and
+        kept in self.preprocessor. The cleaned frame and the fitted state are
+        cached by the CSV's content hash (see DatasetCache), so only the first
+        load after a CSV change parses it. String columns have the category
+        dtype when read from the cache.
+        """
         print(f"Loading {self.dataset_type} data from {self.data_path}")
         
         if self.dataset_type == 'bank':
-            return self._prepare_bank_data()
+            clean = self._clean_bank_data
         elif self.dataset_type == 'lead_scoring':
-            return self._prepare_lead_scoring_data()
+            clean = self._clean_lead_scoring_data
         else:
             raise ValueError(f"Unknown dataset type: {self.dataset_type}")
-    
-    def _prepare_bank_data(self):
-        """Prepare bank marketing dataset"""
+
+        if USE_DATASET_CACHE:
+            df, state = dataset_cache.load(self.data_path, clean)
+        else:
+            df, state = clean()
+        self.preprocessor = LeadPreprocessor.from_dict(state)
+        return self._split(df, self.preprocessor.target_col, self.preprocessor.cat_cols, self.preprocessor.num_cols)
+
+    def _clean_bank_data(self):
+        """Parse and clean the bank marketing dataset"""
         # Load the dataset - using semicolon as separator
         df = pd.read_csv(self.data_path, sep=';')
         
         # Map the target variable to binary (1 for 'yes', 0 for 'no')
         df['y'] = df['y'].map({'yes': 1, 'no': 0})
-        target_col = 'y'
-        
-        # Identify categorical features (object type columns)
-        cat_cols = df.select_dtypes(include=['object']).columns.tolist()
-        cat_cols.remove(target_col)  # Remove target from categorical columns
-        num_cols = df.select_dtypes(include=['int64', 'float64']).columns.tolist()
         
+        # Categorical features are the object columns, numeric ones the rest
+        preprocessor = LeadPreprocessor(target_col='y').fit(df)
+        return preprocessor.transform_frame(df), preprocessor.to_dict()
+
+    def _split(self, df, target_col, cat_cols, num_cols):
+        """Split a cleaned frame into train and test frames with a 'target' column"""
         print(f"Categorical features: {cat_cols}")
         print(f"Numeric features: {num_cols}")
         
@@ -70,57 +88,20 @@ class DataProcessor:
         
         return train_df, test_df, cat_cols, num_cols
     
-    def _prepare_lead_scoring_data(self):
-        """Prepare lead scoring dataset"""
+    def _clean_lead_scoring_data(self):
+        """Parse and clean the lead scoring dataset"""
         # Load the dataset
         df = pd.read_csv(self.data_path)
         
-        # Define target column
-        target_col = 'Converted'
-        
-        # Handle missing values
-        df.fillna({
-            'TotalVisits': 0,
-            'Total Time Spent on Website': 0,
-            'Page Views Per Visit': 0
-        }, inplace=True)
-        
-        # Fill remaining NA values with mode for categorical and mean for numerical
-        for col in df.columns:
-            if df[col].dtype == 'object':
-                df[col].fillna(df[col].mode()[0], inplace=True)
-            else:
-                df[col].fillna(df[col].mean(), inplace=True)
-        
-        # Drop columns that are not useful for prediction
-        drop_cols = ['Prospect ID', 'Lead Number']
-        df = df.drop(drop_cols, axis=1)
-        
-        # Convert categorical columns to categories
-        cat_cols = df.select_dtypes(include=['object']).columns.tolist()
-        if target_col in cat_cols:
-            cat_cols.remove(target_col)
-            
-        num_cols = df.select_dtypes(include=['int64', 'float64']).columns.tolist()
-        if target_col in num_cols:
-            num_cols.remove(target_col)
-        
-        print(f"Categorical features: {cat_cols}")
-        print(f"Numeric features: {num_cols}")
-        
-        # Split data into training and test sets
-        X_train, X_test, y_train, y_test = train_test_split(
-            df.drop(target_col, axis=1), 
-            df[target_col], 
-            test_size=0.2, 
-            random_state=42
-        )
-        
-        # Combine X and y for PyTorch Tabular
-        train_df = pd.concat([X_train, y_train.rename('target')], axis=1)
-        test_df = pd.concat([X_test, y_test.rename('target')], axis=1)
-        
-        return train_df, test_df, cat_cols, num_cols
+        # Missing visit/time counts mean none; other missing values get the
+        # mode for categorical and the mean for numerical columns. Id columns
+        # are not useful for prediction.
+        preprocessor = LeadPreprocessor(
+            drop_cols=['Prospect ID', 'Lead Number'],
+            zero_fill_cols=['TotalVisits', 'Total Time Spent on Website', 'Page Views Per Visit'],
+            target_col='Converted'
+        ).fit(df)
+        return preprocessor.transform_frame(df), preprocessor.to_dict()
         
     def transform_input_data(self, lead_data, dataset_type=None):
         """Transform input data to match model's expected format"""
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+
+_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'data')
+
+# Cache prepared training frames instead of re-parsing the CSV on every load
+USE_DATASET_CACHE = os.getenv("DATASET_CACHE", "1") != "0"
+# Directory holding the cached frames
+DATASET_CACHE_DIR = os.getenv("DATASET_CACHE_DIR", os.path.join(_DATA_DIR, 'cache'))
+# Layout of a cache entry; entries with another version are rebuilt
+CACHE_FORMAT_VERSION = 5
+
+def file_hash(path, chunk_size=1 << 20):
+    """SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _downcast(values):
+    """Smallest dtype that holds every value exactly"""
+    if np.issubdtype(values.dtype, np.integer):
+        return pd.to_numeric(pd.Series(values), downcast='integer').to_numpy()
+    if values.dtype == np.float64:
+        narrowed = values.astype(np.float32)
+        if np.array_equal(narrowed.astype(np.float64), values, equal_nan=True):
+            return narrowed
+    return values
+
+def _code_dtype(n_categories):
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+class DatasetCache:
+    """Prepared training frames stored column by column as .npy files
+
+    An entry is a directory named after the source file and the SHA-256 of
+    its content, so editing the CSV makes the next load rebuild the entry.
+    Numeric columns are downcast to the smallest dtype that holds their
+    values exactly, and the frame keeps that dtype: a load hands the
+    memory-mapped arrays to the frame without copying them. The values are
+    unchanged, so training sees the same numbers. String columns are stored
+    as category codes plus a category list and read back as the category
+    dtype. Loads memory-map the column files instead of parsing the CSV.
+    Numeric columns of a loaded frame are read-only.
+    """
+
+    def __init__(self, cache_dir=DATASET_CACHE_DIR):
+        """Initialize the cache
+
+        Args:
+            cache_dir: Directory holding the cache entries
+        """
+        self.cache_dir = cache_dir
+
+    def load(self, source_path, prepare):
+        """Cached result of prepare() for a source file, building it on a miss
+
+        Args:
+            source_path: File the frame is derived from
+            prepare: Function returning (frame, info) from the source file,
+                where info is a JSON-serializable dict stored with the frame
+
+        Returns:
+            Tuple of (frame, info). String columns come back with the
+            category dtype.
+        """
+        stem = os.path.splitext(os.path.basename(source_path))[0].replace(' ', '_')
+        prefix = f"{stem}-"
+        entry_dir = os.path.join(self.cache_dir, prefix + file_hash(source_path)[:16])
+        try:
+            return self._read(entry_dir)
+        except (OSError, ValueError, KeyError):
+            pass
+
+        df, info = prepare()
+        try:
+            self._write(entry_dir, df, info)
+            self._remove_stale(prefix, entry_dir)
+            return self._read(entry_dir)
+        except (OSError, ValueError) as e:
+            print(f"Could not cache the prepared {source_path}: {str(e)}")
+            return df, info
+
+    def _write(self, entry_dir, df, info):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        staging_dir = f"{entry_dir}.tmp-{os.getpid()}"
+        os.makedirs(staging_dir)
+        try:
+            columns = []
+            for position, (name, series) in enumerate(df.items()):
+                path = os.path.join(staging_dir, f"{position}.npy")
+                if series.dtype == object or isinstance(series.dtype, pd.CategoricalDtype):
+                    categorical = pd.Categorical(series)
+                    categories = categorical.categories.tolist()
+                    np.save(path, categorical.codes.astype(_code_dtype(len(categories))))
+                    columns.append({'name': name, 'kind': 'category', 'categories': categories})
+                elif np.issubdtype(series.dtype, np.number):
+                    values = _downcast(series.to_numpy())
+                    np.save(path, values)
+                    columns.append({'name': name, 'kind': 'numeric', 'dtype': str(values.dtype),
+                                    'prepared_dtype': str(series.dtype)})
+                else:
+                    raise ValueError(f"Column {name} has unsupported dtype {series.dtype}")
+            np.save(os.path.join(staging_dir, 'index.npy'), _downcast(df.index.to_numpy()))
+            meta = {
+                'format_version': CACHE_FORMAT_VERSION,
+                'columns': columns,
+                'info': info
+            }
+            with open(os.path.join(staging_dir, 'meta.json'), 'w') as f:
+                json.dump(meta, f)
+            if os.path.isdir(entry_dir):
+                shutil.rmtree(entry_dir, ignore_errors=True)
+            os.rename(staging_dir, entry_dir)
+        except Exception:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+
+    def _read(self, entry_dir):
+        with open(os.path.join(entry_dir, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        if meta.get('format_version') != CACHE_FORMAT_VERSION:
+            raise ValueError(f"Cache entry {entry_dir} has an old format")
+
+        data = {}
+        for position, column in enumerate(meta['columns']):
+            values = np.load(os.path.join(entry_dir, f"{position}.npy"), mmap_mode='r')
+            if column['kind'] == 'category':
+                data[column['name']] = pd.Categorical.from_codes(values, categories=column['categories'])
+            else:
+                # Already the stored dtype, so this is the mapped array itself
+                data[column['name']] = values.astype(column['dtype'], copy=False)
+        index = np.load(os.path.join(entry_dir, 'index.npy'), mmap_mode='r')
+        # copy=False keeps each column its own block, backed by its file
+        df = pd.DataFrame(data, index=pd.Index(np.asarray(index, dtype=np.int64)), copy=False)
+        return df, meta['info']
+
+    def _remove_stale(self, prefix, entry_dir):
+        """Delete entries of older versions of the same source file"""
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.startswith(prefix) and path != entry_dir and '.tmp-' not in name:
+                shutil.rmtree(path, ignore_errors=True)
+
+dataset_cache = DatasetCache()
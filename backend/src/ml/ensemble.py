@@ -0,0 +1,62 @@
+import numpy as np
+from sklearn.linear_model import LogisticRegression
+
+# Probabilities are clipped this far from 0 and 1 before taking their logit
+_EPSILON = 1e-6
+
+def _logit(proba):
+    proba = np.clip(np.asarray(proba, dtype=np.float64), _EPSILON, 1.0 - _EPSILON)
+    return np.log(proba / (1.0 - proba))
+
+class PlattCalibrator:
+    """Maps a model's positive-class probability to a calibrated one
+
+    Platt scaling on the logit: calibrated = sigmoid(a * logit(p) + b), with
+    a and b fitted by logistic regression on held-out labels. A random
+    forest's averaged votes and a network's softmax are both monotonic but
+    differently scaled, so this puts them on the same scale before they are
+    combined.
+    """
+
+    def __init__(self, a=1.0, b=0.0):
+        """Initialize the calibrator; the defaults leave probabilities unchanged"""
+        self.a = float(a)
+        self.b = float(b)
+
+    def fit(self, proba, y):
+        """Fit the scaling to predicted probabilities and their true labels
+
+        Args:
+            proba: Positive-class probabilities, shape (n_rows,)
+            y: 0/1 labels, shape (n_rows,)
+
+        Returns:
+            self
+        """
+        regression = LogisticRegression(C=1e6)
+        regression.fit(_logit(proba).reshape(-1, 1), np.asarray(y))
+        self.a = float(regression.coef_[0, 0])
+        self.b = float(regression.intercept_[0])
+        return self
+
+    def transform(self, proba):
+        """Calibrated probabilities of an array of probabilities"""
+        return 1.0 / (1.0 + np.exp(-(self.a * _logit(proba) + self.b)))
+
+    def to_dict(self):
+        return {'a': self.a, 'b': self.b}
+
+def combine_probabilities(probabilities, weights=None):
+    """Weighted mean of several models' calibrated probabilities
+
+    Args:
+        probabilities: Dict of model label -> calibrated probabilities, shape (n_rows,)
+        weights: Optional dict of model label -> weight, equal weights by default
+
+    Returns:
+        Array of combined probabilities, shape (n_rows,)
+    """
+    labels = list(probabilities)
+    stacked = np.vstack([np.asarray(probabilities[label], dtype=np.float64) for label in labels])
+    weights = np.array([1.0 if weights is None else float(weights.get(label, 0.0)) for label in labels])
+    return weights @ stacked / weights.sum()
@@ -0,0 +1,231 @@
+import copy
+import heapq
+import os
+import tempfile
+import time
+import numpy as np
+from sklearn.tree._tree import Tree
+
+# sklearn's markers for a leaf's children and feature
+_TREE_LEAF = -1
+_TREE_UNDEFINED = -2
+
+def _split_gain(nodes, node):
+    """Weighted impurity decrease of splitting a node, the order sklearn grows best-first trees in"""
+    left, right = nodes['left_child'][node], nodes['right_child'][node]
+    weighted = nodes['weighted_n_node_samples']
+    impurity = nodes['impurity']
+    return (weighted[node] * impurity[node] - weighted[left] * impurity[left]
+            - weighted[right] * impurity[right])
+
+def prune_tree(tree, max_depth=None, max_leaves=None):
+    """Copy of a fitted sklearn tree cut back to a depth and/or leaf budget
+
+    Splits are kept best first, by weighted impurity decrease, until the
+    tree has max_leaves leaves; splits below max_depth are dropped. A node
+    whose split is dropped becomes a leaf predicting its class distribution,
+    which sklearn already stores for every node.
+
+    Args:
+        tree: Fitted sklearn Tree (estimator.tree_)
+        max_depth: Deepest level kept, the root is level 0
+        max_leaves: Most leaves kept
+
+    Returns:
+        A new Tree, or tree itself if nothing is pruned
+    """
+    state = tree.__getstate__()
+    nodes, values = state['nodes'], state['values']
+    is_split = nodes['left_child'] != _TREE_LEAF
+    depth = np.zeros(len(nodes), dtype=np.int64)
+
+    # Expand splits best first from the root; unexpanded nodes become leaves
+    expanded = np.zeros(len(nodes), dtype=bool)
+    n_leaves = 1
+    frontier = [(-_split_gain(nodes, 0), 0)] if is_split[0] else []
+    while frontier and (max_leaves is None or n_leaves < max_leaves):
+        _, node = heapq.heappop(frontier)
+        if max_depth is not None and depth[node] >= max_depth:
+            continue
+        expanded[node] = True
+        n_leaves += 1
+        for child in (nodes['left_child'][node], nodes['right_child'][node]):
+            depth[child] = depth[node] + 1
+            if is_split[child]:
+                heapq.heappush(frontier, (-_split_gain(nodes, child), child))
+    if np.array_equal(expanded, is_split):
+        return tree
+
+    # Renumber the kept nodes depth first, left before right, like sklearn
+    order = []
+    stack = [0]
+    while stack:
+        node = stack.pop()
+        order.append(node)
+        if expanded[node]:
+            stack.append(nodes['right_child'][node])
+            stack.append(nodes['left_child'][node])
+    order = np.array(order, dtype=np.int64)
+    new_ids = np.full(len(nodes), _TREE_LEAF, dtype=np.int64)
+    new_ids[order] = np.arange(len(order))
+
+    pruned = nodes[order].copy()
+    leaf = ~expanded[order]
+    pruned['left_child'] = np.where(leaf, _TREE_LEAF, new_ids[nodes['left_child'][order]])
+    pruned['right_child'] = np.where(leaf, _TREE_LEAF, new_ids[nodes['right_child'][order]])
+    pruned['feature'][leaf] = _TREE_UNDEFINED
+    pruned['threshold'][leaf] = _TREE_UNDEFINED
+    pruned['missing_go_to_left'][leaf] = 0
+
+    new_tree = Tree(tree.n_features, np.asarray(tree.n_classes), tree.n_outputs)
+    new_tree.__setstate__({
+        'max_depth': int(depth[order].max()),
+        'node_count': len(order),
+        'nodes': pruned,
+        'values': np.ascontiguousarray(values[order])
+    })
+    return new_tree
+
+def prune_forest(forest, max_depth=None, max_leaves=None):
+    """Copy of a fitted RandomForestClassifier with every tree pruned, see prune_tree
+
+    The input forest and its trees are left unchanged.
+    """
+    pruned = copy.copy(forest)
+    pruned.estimators_ = []
+    for estimator in forest.estimators_:
+        tree = prune_tree(estimator.tree_, max_depth, max_leaves)
+        if tree is not estimator.tree_:
+            estimator = copy.copy(estimator)
+            estimator.tree_ = tree
+        pruned.estimators_.append(estimator)
+    return pruned
+
+def select_trees(tree_proba, reference, tolerance, min_trees=1):
+    """Trees that can be dropped while the ensemble output barely changes
+
+    Trees are removed greedily, each time the one whose removal keeps the
+    averaged positive-class probability closest to reference, as long as the
+    mean absolute difference stays within tolerance.
+
+    Args:
+        tree_proba: Positive-class probability of every tree, shape (n_trees, n_rows)
+        reference: Probability the ensemble output should stay close to, shape (n_rows,)
+        tolerance: Largest allowed mean absolute difference from reference
+        min_trees: Fewest trees kept
+
+    Returns:
+        Tuple of (sorted indices of the kept trees, their mean absolute difference)
+    """
+    kept = list(range(len(tree_proba)))
+    total = tree_proba.sum(axis=0)
+    deviation = float(np.abs(total / len(kept) - reference).mean())
+    while len(kept) > max(1, min_trees):
+        candidates = np.array(kept)
+        # Ensemble output without each candidate, all candidates at once
+        without = (total[np.newaxis, :] - tree_proba[candidates]) / (len(kept) - 1)
+        deviations = np.abs(without - reference[np.newaxis, :]).mean(axis=1)
+        best = int(np.argmin(deviations))
+        if deviations[best] > tolerance:
+            break
+        total = total - tree_proba[candidates[best]]
+        deviation = float(deviations[best])
+        kept.pop(best)
+    return kept, deviation
+
+def _serving_proba(model, X):
+    """Positive-class probabilities from the path that serves small batches"""
+    if model.engine is not None:
+        return model.engine.predict_proba(X)[:, 1]
+    return model.model.named_steps['classifier'].predict_proba(X)[:, 1]
+
+def _latency_ms(predict, X, min_seconds=0.2):
+    """Median milliseconds of predict(X) over repeated calls"""
+    predict(X)
+    timings = []
+    deadline = time.perf_counter() + min_seconds
+    while time.perf_counter() < deadline or len(timings) < 5:
+        start = time.perf_counter()
+        predict(X)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)) * 1000
+
+def _directory_bytes(directory):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(directory) for name in names)
+
+def _describe(model, X_test, y_test, work_dir):
+    """Holdout metrics, artifact size, load time and latency of a model"""
+    forest = model.model.named_steps['classifier']
+    proba = _serving_proba(model, X_test)
+    preds = model.classes_[(proba > 0.5).astype(int)]
+
+    artifact_dir = os.path.join(work_dir, 'artifact')
+    os.makedirs(artifact_dir)
+    model_path = os.path.join(artifact_dir, 'model.pkl')
+    model.save_model(model_path)
+    start = time.perf_counter()
+    loaded = type(model)(model.dataset_type).load_model(model_path)
+    loaded_at = time.perf_counter()
+    # The pipeline is unpickled lazily when the model is served from its arrays
+    loaded.model
+    pipeline_loaded_at = time.perf_counter()
+
+    predict = model.engine.predict_proba if model.engine is not None else forest.predict_proba
+    return {
+        'n_trees': len(forest.estimators_),
+        'n_nodes': int(sum(estimator.tree_.node_count for estimator in forest.estimators_)),
+        'max_depth': int(max(estimator.tree_.max_depth for estimator in forest.estimators_)),
+        'metrics': model._classification_metrics(y_test, preds, proba),
+        'artifact_bytes': _directory_bytes(artifact_dir),
+        'pickle_bytes': os.path.getsize(model_path),
+        'engine_bytes': model.engine.nbytes if model.engine is not None else None,
+        'load_ms': (loaded_at - start) * 1000,
+        'pipeline_load_ms': (pipeline_loaded_at - loaded_at) * 1000,
+        'latency_ms': {
+            'single_row': _latency_ms(predict, X_test[:1]),
+            'batch_256': _latency_ms(predict, X_test[:256])
+        }
+    }
+
+def compaction_report(original, compacted, X_test, y_test):
+    """Compare a compacted model with its original on holdout data
+
+    Args:
+        original: The LeadScoringModel that was compacted
+        compacted: The model returned by original.compact()
+        X_test: Encoded holdout rows
+        y_test: Holdout labels
+
+    Returns:
+        Dict with the metrics, tree and node counts, artifact and engine
+        size, load time and single-row and batch latency of both models,
+        and the compacted model's change relative to the original
+    """
+    X_test = np.asarray(X_test.toarray() if hasattr(X_test, 'toarray') else X_test, dtype=np.float32)
+    y_test = np.asarray(y_test)
+    with tempfile.TemporaryDirectory(prefix='compaction-') as work_dir:
+        before = _describe(original, X_test, y_test, os.path.join(work_dir, 'original'))
+        after = _describe(compacted, X_test, y_test, os.path.join(work_dir, 'compacted'))
+
+    def ratio(key, *path):
+        old, new = before, after
+        for part in path or (key,):
+            old, new = old[part], new[part]
+        return new / old if old else None
+
+    return {
+        'original': before,
+        'compacted': after,
+        'change': {
+            'accuracy': after['metrics']['accuracy'] - before['metrics']['accuracy'],
+            'roc_auc': after['metrics']['roc_auc'] - before['metrics']['roc_auc'],
+            'artifact_size_ratio': ratio('artifact_bytes'),
+            'load_time_ratio': ratio('load_ms'),
+            'pipeline_load_time_ratio': ratio('pipeline_load_ms'),
+            'single_row_latency_ratio': ratio(None, 'latency_ms', 'single_row'),
+            'batch_latency_ratio': ratio(None, 'latency_ms', 'batch_256')
+        },
+        # How far the served probabilities moved, from pruning, dropped trees and narrowing
+        'mean_abs_probability_change': float(np.abs(
+            _serving_proba(compacted, X_test) - _serving_proba(original, X_test)).mean())
+    }
@@ -0,0 +1,323 @@
+import itertools
+import math
+import multiprocessing
+import os
+import random
+import shutil
+import signal
+import tempfile
+import threading
+import time
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score, roc_auc_score
+from sklearn.model_selection import StratifiedKFold
+from .data_processor import DataProcessor
+from .compiled_forest import CompiledForest
+from .lead_model import build_feature_transformer, COMPILED_FOREST_MAX_ROWS
+
+# Processes evaluating configurations at once
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", str(os.cpu_count() or 1)))
+
+# Values tried per parameter, unless a search passes its own space
+RANDOM_FOREST_SEARCH_SPACE = {
+    'n_estimators': [50, 100, 200],
+    'max_depth': [None, 12, 24],
+    'min_samples_leaf': [1, 4],
+    'max_features': ['sqrt', 0.3]
+}
+TABNET_SEARCH_SPACE = {
+    # n_a follows n_d unless it is searched too
+    'n_d': [8, 16, 32],
+    'n_steps': [3, 5],
+    'batch_size': [256, 1024],
+    'virtual_batch_size': [128]
+}
+RANDOM_FOREST_PARAMS = ('n_estimators', 'max_depth', 'min_samples_split', 'min_samples_leaf',
+                        'max_features', 'max_leaf_nodes', 'criterion', 'bootstrap', 'class_weight')
+# Parameters passed to TabNetClassifier.fit() rather than its constructor
+TABNET_FIT_PARAMS = ('batch_size', 'virtual_batch_size')
+TABNET_PARAMS = ('n_d', 'n_a', 'n_steps', 'gamma', 'lambda_sparse', 'momentum') + TABNET_FIT_PARAMS
+
+# Timed predictions per configuration: single rows and batches of the
+# largest size the compiled forest serves
+SINGLE_ROW_REPEATS = 50
+BATCH_REPEATS = 5
+BATCH_ROWS = COMPILED_FOREST_MAX_ROWS
+
+def _load_fold(fold_dir):
+    """A prepared fold's matrices, memory-mapped"""
+    return tuple(np.load(os.path.join(fold_dir, f"{name}.npy"), mmap_mode='r')
+                 for name in ('X_train', 'y_train', 'X_val', 'y_val'))
+
+def _median_ms(fn, X, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(X)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times) * 1000)
+
+def _evaluate(task):
+    """Fit one configuration on one fold and measure it; runs in a pool process
+
+    Args:
+        task: Tuple of (config index, model_type, params, fold_dir, max_epochs)
+
+    Returns:
+        Tuple of (config index, result dict), the result holding an error
+        instead of metrics if fitting failed
+    """
+    index, model_type, params, fold_dir, max_epochs = task
+    try:
+        X_train, y_train, X_val, y_val = _load_fold(fold_dir)
+        start = time.perf_counter()
+        if model_type == 'random_forest':
+            forest = RandomForestClassifier(random_state=42, n_jobs=1, **params).fit(X_train, y_train)
+            fit_seconds = time.perf_counter() - start
+            # Latency and size of the compiled engine that serves the forest
+            engine = CompiledForest(forest)
+            predict_proba = engine.predict_proba
+            size_bytes = sum(np.asarray(getattr(engine, name)).nbytes for name in CompiledForest.ARRAYS)
+        else:
+            # Imported here so random forest searches don't load torch
+            import torch
+            from pytorch_tabnet.tab_model import TabNetClassifier
+            from .tabnet_model import TabNetLeadScoringModel
+            torch.set_num_threads(1)
+            model_params = {name: value for name, value in params.items() if name not in TABNET_FIT_PARAMS}
+            fit_params = {name: value for name, value in params.items() if name in TABNET_FIT_PARAMS}
+            classifier = TabNetClassifier(seed=42, verbose=0, **model_params)
+            classifier.fit(
+                np.asarray(X_train), np.asarray(y_train),
+                eval_set=[(np.asarray(X_val), np.asarray(y_val))],
+                eval_metric=['accuracy'], patience=5, max_epochs=max_epochs, **fit_params
+            )
+            fit_seconds = time.perf_counter() - start
+            # Latency of the serving forward pass
+            model = TabNetLeadScoringModel()
+            model.model = classifier
+            predict_proba = model._predict_proba
+            size_bytes = sum(p.numel() * p.element_size() for p in classifier.network.parameters())
+
+        X_val = np.array(X_val)
+        proba = predict_proba(X_val)[:, 1]
+        return index, {
+            'accuracy': float(accuracy_score(y_val, proba > 0.5)),
+            'roc_auc': float(roc_auc_score(y_val, proba)),
+            'fit_seconds': fit_seconds,
+            'single_row_latency_ms': _median_ms(predict_proba, X_val[:1], SINGLE_ROW_REPEATS),
+            'batch_latency_ms': _median_ms(predict_proba, X_val[:BATCH_ROWS], BATCH_REPEATS),
+            'model_size_bytes': int(size_bytes)
+        }
+    except Exception as e:
+        return index, {'error': f"{type(e).__name__}: {str(e)}"}
+
+def _exit_on_sigterm(signum, frame):
+    raise SystemExit(1)
+
+class HyperparameterSearch:
+    """Cross-validated search over model parameters with successive halving
+
+    The training split is cut into n_folds stratified folds, and each fold
+    is preprocessed once (the same encoding the model trains with) into
+    .npy files that the pool processes memory-map, so configurations share
+    one copy of the matrices. Every configuration is evaluated on the first
+    fold; after each fold only the best 1/eta of them by mean ROC-AUC go on
+    to the next one, so losing configurations stop early. Each evaluation
+    also measures single-row and batch inference latency and the size of
+    the model as it is served.
+    """
+
+    def __init__(self, dataset_type='lead_scoring', model_type='random_forest', search_space=None,
+                 n_folds=3, max_configs=12, eta=2, max_epochs=20, max_latency_ms=None,
+                 workers=SEARCH_WORKERS, seed=42):
+        """Initialize the search
+
+        Args:
+            dataset_type: Type of dataset to use ('bank' or 'lead_scoring')
+            model_type: 'random_forest' or 'transformer' (lead_scoring only)
+            search_space: Dict of parameter -> list of values, defaults to
+                the model type's default space
+            n_folds: Cross-validation folds, also the number of halving rounds
+            max_configs: Configurations sampled from the space's grid
+            eta: Fraction of configurations (1/eta) kept after each fold
+            max_epochs: Epoch limit of TabNet fits
+            max_latency_ms: Single-row latency target the best configuration
+                has to meet, if any
+            workers: Pool processes
+            seed: Seed of the configuration sampling
+        """
+        if model_type not in ('random_forest', 'transformer'):
+            raise ValueError(f"Unknown model type: {model_type}")
+        if model_type == 'transformer' and dataset_type != 'lead_scoring':
+            raise ValueError("The transformer model only supports the lead_scoring dataset")
+        default_space = RANDOM_FOREST_SEARCH_SPACE if model_type == 'random_forest' else TABNET_SEARCH_SPACE
+        self.search_space = dict(search_space or default_space)
+        allowed = RANDOM_FOREST_PARAMS if model_type == 'random_forest' else TABNET_PARAMS
+        unknown = [name for name in self.search_space if name not in allowed]
+        if unknown:
+            raise ValueError(f"Unknown {model_type} parameters: {', '.join(unknown)}")
+        if n_folds < 2:
+            raise ValueError("n_folds must be at least 2")
+
+        self.dataset_type = dataset_type
+        self.model_type = model_type
+        self.n_folds = int(n_folds)
+        self.max_configs = max(1, int(max_configs))
+        self.eta = max(2, int(eta))
+        self.max_epochs = int(max_epochs)
+        self.max_latency_ms = max_latency_ms
+        self.workers = max(1, int(workers))
+        self.seed = seed
+
+    def configurations(self):
+        """Parameter dicts to evaluate, sampled from the grid if it is larger than max_configs"""
+        names = list(self.search_space)
+        grid = [dict(zip(names, values)) for values in itertools.product(*(self.search_space[n] for n in names))]
+        if len(grid) > self.max_configs:
+            grid = random.Random(self.seed).sample(grid, self.max_configs)
+        if self.model_type == 'transformer':
+            for params in grid:
+                if 'n_d' in params:
+                    params.setdefault('n_a', params['n_d'])
+        return grid
+
+    def run(self, progress=None):
+        """Run the search
+
+        Args:
+            progress: Optional function called with keyword fields (stage, ...)
+                as the search advances
+
+        Returns:
+            Dict with every configuration's mean metrics, latency and size,
+            sorted best first, and the best configuration meeting the latency
+            target
+        """
+        started_at = time.perf_counter()
+        configs = self.configurations()
+        evaluations = [[] for _ in configs]
+        errors = {}
+        # A cancelled job is terminated; exit through the finally blocks so
+        # the pool processes and fold files are cleaned up
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, _exit_on_sigterm)
+
+        folds_dir = tempfile.mkdtemp(prefix="leadgen-search-")
+        try:
+            if progress is not None:
+                progress(stage="preparing_folds", n_folds=self.n_folds, n_configs=len(configs))
+            fold_dirs = self._prepare_folds(folds_dir)
+
+            survivors = list(range(len(configs)))
+            # spawn rather than fork, like the training jobs
+            context = multiprocessing.get_context("spawn")
+            with context.Pool(processes=min(self.workers, len(configs))) as pool:
+                for fold, fold_dir in enumerate(fold_dirs):
+                    tasks = [(i, self.model_type, configs[i], fold_dir, self.max_epochs) for i in survivors]
+                    for done, (i, result) in enumerate(pool.imap_unordered(_evaluate, tasks), 1):
+                        if 'error' in result:
+                            errors[i] = result['error']
+                        else:
+                            evaluations[i].append(result)
+                        if progress is not None:
+                            progress(stage="searching", fold=fold + 1, n_folds=self.n_folds,
+                                     evaluated=done, configs_in_fold=len(tasks),
+                                     best_roc_auc=self._best_score(evaluations))
+                    survivors = sorted((i for i in survivors if i not in errors),
+                                       key=lambda i: self._mean(evaluations[i], 'roc_auc'), reverse=True)
+                    if fold < len(fold_dirs) - 1:
+                        survivors = survivors[:max(1, math.ceil(len(survivors) / self.eta))]
+        finally:
+            shutil.rmtree(folds_dir, ignore_errors=True)
+
+        results = [self._summarize(params, evaluations[i], errors.get(i)) for i, params in enumerate(configs)]
+        results.sort(key=lambda r: (r['folds_evaluated'], r['roc_auc'] or 0.0), reverse=True)
+        complete = [r for r in results if r['folds_evaluated'] == self.n_folds]
+        meeting_target = [r for r in complete if r['meets_latency_target'] is not False]
+        return {
+            'dataset_type': self.dataset_type,
+            'model_type': self.model_type,
+            'n_folds': self.n_folds,
+            'eta': self.eta,
+            'batch_rows': BATCH_ROWS,
+            'max_latency_ms': self.max_latency_ms,
+            'best': meeting_target[0] if meeting_target else None,
+            'configs': results,
+            'seconds': time.perf_counter() - started_at
+        }
+
+    def _prepare_folds(self, folds_dir):
+        """Encode every fold once and write its matrices as .npy files
+
+        Random forest folds are scaled and one-hot encoded by a transformer
+        fitted on the fold's training rows, like LeadScoringModel.train does.
+        TabNet folds are encoded like TabNetLeadScoringModel._encode does,
+        with vocabularies of the fold's training rows, so validation rows with
+        categories the fold never trained on get -1 as they would in serving.
+
+        Returns:
+            List of fold directories
+        """
+        processor = DataProcessor(dataset_type=self.dataset_type)
+        train_df, _, cat_cols, num_cols = processor.load_and_prepare_data()
+        X = train_df.drop('target', axis=1)
+        y = train_df['target'].to_numpy()
+        if self.model_type == 'transformer':
+            # Imports torch, which random forest searches don't need
+            from .tabnet_model import fit_vocabularies, encode_records
+            feature_columns = list(X.columns)
+            records = X.to_dict('records')
+
+        fold_dirs = []
+        folds = StratifiedKFold(n_splits=self.n_folds, shuffle=True, random_state=42).split(X, y)
+        for fold, (train_index, val_index) in enumerate(folds):
+            if self.model_type == 'random_forest':
+                transformer = build_feature_transformer(num_cols, cat_cols)
+                X_train = transformer.fit_transform(X.iloc[train_index])
+                X_val = transformer.transform(X.iloc[val_index])
+                # Trees compare float32 features, so nothing is lost
+                X_train, X_val = (
+                    (matrix.toarray() if hasattr(matrix, 'toarray') else np.asarray(matrix)).astype(np.float32)
+                    for matrix in (X_train, X_val)
+                )
+            else:
+                vocabularies = fit_vocabularies(X.iloc[train_index], cat_cols)
+                X_train, X_val = (
+                    encode_records([records[i] for i in index], feature_columns, vocabularies)
+                    for index in (train_index, val_index)
+                )
+
+            fold_dir = os.path.join(folds_dir, f"fold_{fold}")
+            os.makedirs(fold_dir)
+            for name, values in (('X_train', X_train), ('y_train', y[train_index]),
+                                 ('X_val', X_val), ('y_val', y[val_index])):
+                np.save(os.path.join(fold_dir, f"{name}.npy"), np.ascontiguousarray(values))
+            fold_dirs.append(fold_dir)
+        return fold_dirs
+
+    @staticmethod
+    def _mean(evaluations, metric):
+        return float(np.mean([e[metric] for e in evaluations])) if evaluations else None
+
+    def _best_score(self, evaluations):
+        scores = [self._mean(e, 'roc_auc') for e in evaluations if e]
+        return max(scores) if scores else None
+
+    def _summarize(self, params, evaluations, error):
+        single_row_ms = self._mean(evaluations, 'single_row_latency_ms')
+        return {
+            'params': params,
+            'folds_evaluated': len(evaluations),
+            'stopped_early': error is None and len(evaluations) < self.n_folds,
+            'error': error,
+            'accuracy': self._mean(evaluations, 'accuracy'),
+            'roc_auc': self._mean(evaluations, 'roc_auc'),
+            'fit_seconds': self._mean(evaluations, 'fit_seconds'),
+            'single_row_latency_ms': single_row_ms,
+            'batch_latency_ms': self._mean(evaluations, 'batch_latency_ms'),
+            'model_size_bytes': int(self._mean(evaluations, 'model_size_bytes')) if evaluations else None,
+            'meets_latency_target': None if self.max_latency_ms is None or single_row_ms is None
+            else single_row_ms <= self.max_latency_ms
+        }
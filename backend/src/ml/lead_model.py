@@ -1,5 +1,10 @@
+import copy
+import json
 import os
 import pickle
+import shutil
+import threading
+import time
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier
@@ -8,6 +13,83 @@ from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, roc_auc_score
 from .data_processor import DataProcessor
+from .compiled_forest import CompiledForest
+from .compiled_encoder import CompiledEncoder
+from .lead_preprocessor import LeadPreprocessor
+from .forest_compaction import prune_forest, select_trees
+from .tree_shap import TreeExplainer
+
+# Serve predictions from the compiled array-backed forest when it matches sklearn
+USE_COMPILED_FOREST = os.getenv("COMPILED_FOREST_ENGINE", "1") != "0"
+# Encode leads with the compiled encoder instead of DataFrame + ColumnTransformer
+USE_COMPILED_ENCODER = os.getenv("COMPILED_ENCODER", "1") != "0"
+# Above this many rows sklearn's compiled traversal is faster than the engine
+COMPILED_FOREST_MAX_ROWS = int(os.getenv("COMPILED_FOREST_MAX_ROWS", "256"))
+# Synthetic rows predicted by warm_up, covering the single-row and batched paths
+WARM_UP_ROWS = 8
+# Serve from memory-mapped engine/encoder arrays saved next to the pickle, so
+# worker processes share them, and only unpickle the pipeline when needed
+MMAP_MODEL_ARRAYS = os.getenv("MMAP_MODEL_ARRAYS", "1") != "0"
+# Format of the serving arrays directory; other versions load the pickle instead.
+# Version 2 may hold narrowed (compacted) arrays, which version 1 readers mishandle
+SERVING_ARRAYS_VERSION = 2
+_READABLE_SERVING_ARRAYS_VERSIONS = (1, 2)
+# Trees an incremental update fits on the new leads; as many of the oldest trees are retired
+INCREMENTAL_TREES = int(os.getenv("INCREMENTAL_TREES", "10"))
+
+# Label values of the bank dataset's target column
+_LABEL_VALUES = {'yes': 1, 'no': 0}
+
+def _arrays_dir(model_path):
+    """Directory holding the serving arrays of a pickled model"""
+    return os.path.splitext(model_path)[0] + '_arrays'
+
+def build_feature_transformer(num_cols, cat_cols):
+    """Unfitted transformer scaling numeric and one-hot encoding categorical columns"""
+    return ColumnTransformer(
+        transformers=[
+            ('num', StandardScaler(), num_cols),
+            ('cat', OneHotEncoder(handle_unknown='ignore'), cat_cols)
+        ])
+
+def _canonical_values(record, cat_cols, num_cols):
+    """Feature values of a record in column order, numbers as floats"""
+    values = []
+    for col in num_cols:
+        value = record.get(col)
+        try:
+            values.append(float(value) if value is not None else None)
+        except (TypeError, ValueError):
+            values.append(str(value))
+    for col in cat_cols:
+        value = record.get(col)
+        values.append(str(value) if value is not None else None)
+    return tuple(values)
+
+def format_results(proba, classes):
+    """Build score/probability/status results from a predict_proba matrix
+
+    Args:
+        proba: Class probabilities, shape (n_rows, 2)
+        classes: The 0/1 class labels of proba's columns
+    """
+    predictions = classes[np.argmax(proba, axis=1)]
+    probabilities = proba[:, 1]
+
+    # Convert score to 0-100 range for UI
+    scores = (predictions * 100).astype(int)
+
+    # Determine status based on probability
+    statuses = np.select(
+        [probabilities >= 0.7, probabilities >= 0.4],
+        ["hot", "warm"],
+        default="cold"
+    )
+
+    return [
+        {"score": score, "probability": probability, "status": status}
+        for score, probability, status in zip(scores.tolist(), probabilities.tolist(), statuses.tolist())
+    ]
 
 class LeadScoringModel:
     def __init__(self, dataset_type='bank'):
@@ -17,21 +99,61 @@ class LeadScoringModel:
             dataset_type: Type of dataset to use ('bank' or 'lead_scoring')
         """
         self.dataset_type = dataset_type
-        self.model = None
+        self._model = None
+        self._model_path = None
+        self._model_lock = threading.Lock()
+        self._explainer = None
+        self._explainer_lock = threading.Lock()
+        self.classes_ = None
         self.encoder = None
         self.scaler = None
         self.metrics = None
         self.feature_importance = None
         self.cat_cols = None
         self.num_cols = None
+        self.engine = None
+        # Fitted cleaning step; None for models saved before it existed
+        self.preprocessor = None
+        # Batch statistics of the incremental update that produced this model
+        self.update_info = None
+        # Options and size of the compaction that produced this model
+        self.compaction = None
+
+    @property
+    def model(self):
+        """The sklearn Pipeline, unpickled on first use if the model was loaded from serving arrays"""
+        if self._model is None and self._model_path is not None:
+            with self._model_lock:
+                if self._model is None:
+                    with open(self._model_path, 'rb') as f:
+                        self._model = pickle.load(f)
+                    print(f"Pipeline loaded from {self._model_path}")
+        return self._model
+
+    @model.setter
+    def model(self, model):
+        self._model = model
+
+    @property
+    def loaded(self):
+        """Whether the model can predict, from the pipeline or the serving arrays"""
+        return self._model is not None or self._model_path is not None or self.engine is not None
     
-    def train(self):
-        """Train the lead scoring model"""
+    def train(self, progress=None):
+        """Train the lead scoring model
+        
+        Args:
+            progress: Optional function called with keyword fields (stage, ...)
+                as training advances
+        """
+        if progress is not None:
+            progress(stage="loading_data")
         processor = DataProcessor(dataset_type=self.dataset_type)
         train_df, test_df, cat_cols, num_cols = processor.load_and_prepare_data()
         
         self.cat_cols = cat_cols
         self.num_cols = num_cols
+        self.preprocessor = processor.preprocessor
         
         print(f"Training model with {len(train_df)} samples, {len(cat_cols)} categorical and {len(num_cols)} numerical features")
         
@@ -42,11 +164,7 @@ class LeadScoringModel:
         y_test = test_df['target']
         
         # Create preprocessing pipeline
-        preprocessor = ColumnTransformer(
-            transformers=[
-                ('num', StandardScaler(), num_cols),
-                ('cat', OneHotEncoder(handle_unknown='ignore'), cat_cols)
-            ])
+        preprocessor = build_feature_transformer(num_cols, cat_cols)
         
         # Create and train model
         self.model = Pipeline(steps=[
@@ -54,7 +172,10 @@ class LeadScoringModel:
             ('classifier', RandomForestClassifier(n_estimators=100, random_state=42))
         ])
         
+        if progress is not None:
+            progress(stage="fitting", n_samples=len(train_df))
         self.model.fit(X_train, y_train)
+        self.classes_ = self.model.classes_
         
         # Calculate feature importance
         if hasattr(self.model.named_steps['classifier'], 'feature_importances_'):
@@ -78,52 +199,415 @@ class LeadScoringModel:
                 self.feature_importance.to_csv(csv_path, index=False)
                 
         # Evaluate model
+        if progress is not None:
+            progress(stage="evaluating")
         self.evaluate(X_test, y_test)
         
+        if USE_COMPILED_ENCODER:
+            self.compile_encoder()
+        if USE_COMPILED_FOREST:
+            self.compile_engine()
+        
         return self
     
+    def split_labels(self, records):
+        """Separate newly labeled leads into feature dicts and 0/1 labels
+
+        Args:
+            records: Lead dicts with the training columns and the dataset's
+                target column ('Converted', or 'y' for the bank dataset)
+
+        Returns:
+            Tuple of (feature dicts, label array)
+
+        Raises:
+            ValueError: If a label is missing or invalid, or the batch only
+                has one class
+        """
+        if self.preprocessor is None:
+            raise ValueError("Model was saved without a fitted preprocessor, retrain it before updating it")
+        if len(records) == 0:
+            raise ValueError("No labeled leads")
+        target_col = self.preprocessor.target_col
+        labels = []
+        for i, record in enumerate(records):
+            value = record.get(target_col)
+            value = _LABEL_VALUES.get(value.lower(), value) if isinstance(value, str) else value
+            try:
+                label = int(value)
+            except (TypeError, ValueError):
+                label = None
+            if label not in (0, 1):
+                raise ValueError(f"Lead {i} has no valid {target_col} label: {record.get(target_col)!r}")
+            labels.append(label)
+        labels = np.array(labels)
+        if len(np.unique(labels)) < 2:
+            raise ValueError(f"The batch needs converted and unconverted leads, all have {target_col}={labels[0]}")
+        features = [{key: value for key, value in record.items() if key != target_col} for record in records]
+        return features, labels
+
+    def update(self, records, n_trees=INCREMENTAL_TREES, progress=None):
+        """Build a new model that also learned from a batch of newly labeled leads
+
+        n_trees trees are fitted on the batch alone (warm_start) and the
+        n_trees oldest trees are retired, so the forest keeps its size and
+        slides towards recent outcomes. The imputation values are updated
+        from running counts (see LeadPreprocessor.partial_fit). The scaler and
+        one-hot encoder stay fitted on the original data, since the kept
+        trees split on their output. The cost depends on the batch size, not
+        on the training history. This model is left unchanged.
+
+        Args:
+            records: Labeled lead dicts, see split_labels
+            n_trees: Trees added and retired
+            progress: Optional function called with keyword fields (stage, ...)
+                as the update advances
+
+        Returns:
+            The updated LeadScoringModel; its update_info holds the batch
+            size, the tree counts and this model's metrics on the batch
+        """
+        features, y = self.split_labels(records)
+        pipeline = self.model
+        if pipeline is None:
+            raise Exception("Model not trained or loaded")
+        column_transformer = pipeline.named_steps['preprocessor']
+        forest = pipeline.named_steps['classifier']
+        n_trees = max(1, min(int(n_trees), len(forest.estimators_)))
+
+        if progress is not None:
+            progress(stage="preparing", n_samples=len(features))
+        processor = DataProcessor(dataset_type=self.dataset_type)
+        processed = [processor.transform_input_data(record, self.dataset_type) for record in features]
+        # Scored by the current model before it learns from them, an out-of-sample check
+        X_before = column_transformer.transform(pd.DataFrame(self.preprocessor.transform_columns(processed)))
+        proba = forest.predict_proba(X_before)[:, 1]
+        batch_metrics = self._classification_metrics(y, self.classes_[(proba > 0.5).astype(int)], proba)
+
+        preprocessor = LeadPreprocessor.from_dict(copy.deepcopy(self.preprocessor.to_dict())).partial_fit(processed)
+        X = column_transformer.transform(pd.DataFrame(preprocessor.transform_columns(processed)))
+
+        if progress is not None:
+            progress(stage="fitting", n_samples=len(features), n_trees=n_trees)
+        # The fitted trees are shared with this model, never modified
+        updated_forest = copy.copy(forest)
+        updated_forest.estimators_ = list(forest.estimators_)
+        updated_forest.set_params(warm_start=True, n_estimators=len(forest.estimators_) + n_trees)
+        updated_forest.fit(X, y)
+        updated_forest.estimators_ = updated_forest.estimators_[n_trees:]
+        updated_forest.set_params(warm_start=False, n_estimators=len(updated_forest.estimators_))
+
+        updated = LeadScoringModel(self.dataset_type)
+        updated.model = Pipeline(steps=[('preprocessor', column_transformer), ('classifier', updated_forest)])
+        updated.classes_ = updated_forest.classes_
+        updated.cat_cols = self.cat_cols
+        updated.num_cols = self.num_cols
+        updated.preprocessor = preprocessor
+        # Holdout metrics of the last full training; the update has no holdout
+        updated.metrics = self.metrics
+        updated.update_info = {
+            "n_samples": len(features),
+            "n_positive": int(y.sum()),
+            "trees_added": n_trees,
+            "trees_retired": n_trees,
+            "metrics_before_update": batch_metrics
+        }
+
+        if progress is not None:
+            progress(stage="compiling")
+        # Same column transformer, so the encoder carries over
+        updated.encoder = self.encoder
+        if USE_COMPILED_ENCODER and updated.encoder is None:
+            updated.compile_encoder()
+        if USE_COMPILED_FOREST:
+            updated.compile_engine()
+        return updated
+
+    def compact(self, X_reference, max_depth=16, max_leaves=None, drop_tolerance=0.01, min_trees=10,
+                threshold_dtype='float32', value_dtype='float32', narrow_indices=True, progress=None):
+        """Build a smaller, faster copy of this random forest model
+
+        Trees are pruned to max_depth and/or max_leaves (see prune_tree), then
+        trees are dropped while the ensemble's output on X_reference moves by
+        at most drop_tolerance on average (see select_trees). The serving
+        engine stores thresholds and leaf values as threshold_dtype and
+        value_dtype and uses narrow node indices. The pickled pipeline holds
+        the pruned forest at full precision. This model is left unchanged.
+
+        Args:
+            X_reference: Encoded feature rows the kept trees must agree on,
+                e.g. a sample of the training data
+            max_depth: Deepest tree level kept, None for no limit
+            max_leaves: Most leaves per tree, None for no limit
+            drop_tolerance: Largest mean absolute change of the predicted
+                probability from dropping trees, None to keep all trees
+            min_trees: Fewest trees kept
+            threshold_dtype: 'float64', 'float32' or 'float16'
+            value_dtype: 'float64', 'float32' or 'float16'
+            narrow_indices: Store node and feature indices as int16/int32
+            progress: Optional function called with keyword fields (stage, ...)
+                as compaction advances
+
+        Returns:
+            The compacted LeadScoringModel; its compaction holds the options
+            and the tree and node counts before and after
+        """
+        pipeline = self.model
+        if pipeline is None:
+            raise Exception("Model not trained or loaded")
+        forest = pipeline.named_steps['classifier']
+        X_reference = np.asarray(X_reference.toarray() if hasattr(X_reference, 'toarray') else X_reference,
+                                 dtype=np.float32)
+
+        if progress is not None:
+            progress(stage="pruning", n_trees=len(forest.estimators_))
+        compacted_forest = prune_forest(forest, max_depth, max_leaves)
+
+        deviation = 0.0
+        if drop_tolerance is not None:
+            if progress is not None:
+                progress(stage="selecting_trees", n_rows=len(X_reference))
+            tree_proba = np.array([
+                estimator.predict_proba(X_reference)[:, 1] for estimator in compacted_forest.estimators_
+            ])
+            kept, deviation = select_trees(tree_proba, tree_proba.mean(axis=0), drop_tolerance, min_trees)
+            compacted_forest.estimators_ = [compacted_forest.estimators_[i] for i in kept]
+            compacted_forest.n_estimators = len(kept)
+
+        compacted = LeadScoringModel(self.dataset_type)
+        compacted.model = Pipeline(steps=[('preprocessor', pipeline.named_steps['preprocessor']),
+                                          ('classifier', compacted_forest)])
+        compacted.classes_ = compacted_forest.classes_
+        compacted.cat_cols = self.cat_cols
+        compacted.num_cols = self.num_cols
+        compacted.preprocessor = self.preprocessor
+        compacted.metrics = self.metrics
+        storage = {'threshold_dtype': threshold_dtype, 'value_dtype': value_dtype, 'narrow_indices': narrow_indices}
+        compacted.compaction = {
+            'options': {'max_depth': max_depth, 'max_leaves': max_leaves, 'drop_tolerance': drop_tolerance,
+                        'min_trees': min_trees},
+            'storage': storage,
+            'trees_before': len(forest.estimators_),
+            'trees_after': len(compacted_forest.estimators_),
+            'nodes_before': int(sum(estimator.tree_.node_count for estimator in forest.estimators_)),
+            'nodes_after': int(sum(estimator.tree_.node_count for estimator in compacted_forest.estimators_)),
+            'drop_deviation': deviation
+        }
+
+        if progress is not None:
+            progress(stage="compiling")
+        # Same column transformer, so the encoder carries over
+        compacted.encoder = self.encoder
+        if USE_COMPILED_ENCODER and compacted.encoder is None:
+            compacted.compile_encoder()
+        if USE_COMPILED_FOREST and compacted.compile_engine():
+            compacted.engine = compacted.engine.compact(**storage)
+        return compacted
+
     def predict(self, lead_data):
         """Predict lead score"""
-        if self.model is None:
+        if not self.loaded:
             raise Exception("Model not trained or loaded")
         
-        # Prepare input data
+        return self.predict_batch([lead_data])[0]
+
+    def predict_batch(self, leads, timings=None):
+        """Predict lead scores for many leads with a single model call
+
+        Args:
+            leads: List of lead data dicts
+            timings: Optional dict that receives the seconds spent in each stage
+
+        Returns:
+            List of result dicts in the same order as the input
+        """
+        if not self.loaded:
+            raise Exception("Model not trained or loaded")
+
+        if len(leads) == 0:
+            return []
+
+        X = self._encode(leads, timings)
+        encoded = time.perf_counter()
+
+        # One predict_proba over the whole batch; the label is derived from it.
+        # Large batches go to sklearn only if the pipeline is in memory anyway.
+        if self.engine is not None and (len(leads) <= COMPILED_FOREST_MAX_ROWS or self._model is None):
+            proba = self.engine.predict_proba(X.toarray() if hasattr(X, 'toarray') else X)
+        else:
+            proba = self.model.named_steps['classifier'].predict_proba(X)
+        if timings is not None:
+            timings['predict_proba'] = time.perf_counter() - encoded
+        return self._format_results(proba)
+
+    def explain_batch(self, leads, timings=None):
+        """Per-column contributions to the lead scores, exact TreeSHAP values
+
+        Contributions of one-hot features are summed into their original
+        column. They are computed on the pipeline's forest, so with the base
+        value they add up to the probability sklearn would predict.
+
+        Args:
+            leads: List of lead data dicts
+            timings: Optional dict that receives the seconds spent in each stage
+
+        Returns:
+            List of result dicts in the same order as the input, each with
+            score/probability/status, base_value and a column -> contribution dict
+        """
+        if not self.loaded:
+            raise Exception("Model not trained or loaded")
+
+        if len(leads) == 0:
+            return []
+
+        X = self._encode(leads, timings)
+        start = time.perf_counter()
+        explainer = self.explainer
+        built = time.perf_counter()
+        values = explainer.shap_values(X)
+        proba = explainer.base_value + values.sum(axis=1)
+        if timings is not None:
+            timings['build_explainer'] = built - start
+            timings['explain'] = time.perf_counter() - built
+
+        results = self._format_results(np.column_stack([1.0 - proba, proba]))
+        for result, row in zip(results, values.tolist()):
+            result['base_value'] = explainer.base_value
+            result['contributions'] = dict(zip(explainer.group_names, row))
+        return results
+
+    @property
+    def explainer(self):
+        """TreeExplainer of the pipeline's forest, built on first use"""
+        if self._explainer is None:
+            with self._explainer_lock:
+                if self._explainer is None:
+                    if not isinstance(self.model.named_steps['classifier'], RandomForestClassifier):
+                        raise ValueError("Explanations are only available for random forest models")
+                    columns = self._output_columns()
+                    names = list(dict.fromkeys(columns))
+                    group = {name: i for i, name in enumerate(names)}
+                    self._explainer = TreeExplainer(
+                        self.model.named_steps['classifier'],
+                        feature_groups=[group[column] for column in columns],
+                        group_names=names)
+        return self._explainer
+
+    def _output_columns(self):
+        """Input column of every encoded feature, or the feature names if they can't be mapped"""
+        if self.encoder is not None:
+            return self.encoder.output_columns()
+        preprocessor = self.model.named_steps['preprocessor']
+        try:
+            return CompiledEncoder(preprocessor).output_columns()
+        except (AttributeError, ValueError):
+            return list(preprocessor.get_feature_names_out())
+
+    def _encode(self, leads, timings=None):
+        """Encode lead dicts into the forest's feature matrix"""
+        start = time.perf_counter()
         processor = DataProcessor(dataset_type=self.dataset_type)
-        processed_data = processor.transform_input_data(lead_data, self.dataset_type)
-        
-        input_df = pd.DataFrame([processed_data])
-        prediction = self.model.predict(input_df)[0]
-        probability = self.model.predict_proba(input_df)[0][1]
-        
-        # Convert score to 0-100 range for UI
-        score = int(prediction * 100)
-        
-        # Determine status based on probability
-        if probability >= 0.7:
-            status = "hot"
-        elif probability >= 0.4:
-            status = "warm"
+        processed = [processor.transform_input_data(lead, self.dataset_type) for lead in leads]
+        if self.preprocessor is not None:
+            # Impute missing fields the way the training data was, column-wise
+            columns = self.preprocessor.transform_columns(processed)
+        transformed = time.perf_counter()
+        if self.preprocessor is None:
+            X = self.encoder.transform(processed) if self.encoder is not None else \
+                self.model.named_steps['preprocessor'].transform(pd.DataFrame(processed))
+        elif self.encoder is not None:
+            X = self.encoder.transform_columns(columns, len(leads))
         else:
-            status = "cold"
-            
-        return {
-            "score": score, 
-            "probability": float(probability),
-            "status": status
-        }
+            X = self.model.named_steps['preprocessor'].transform(pd.DataFrame(columns))
+        if timings is not None:
+            timings['transform_input_data'] = transformed - start
+            timings['encode'] = time.perf_counter() - transformed
+        return X
+
+    def compile_encoder(self, verify=True):
+        """Build the compiled feature encoder used by predict_batch
+
+        Args:
+            verify: Only enable the encoder if its output is identical to
+                the fitted preprocessor's
+
+        Returns:
+            True if the encoder is enabled
+        """
+        if self.model is None:
+            raise Exception("Model not trained or loaded")
+        preprocessor = self.model.named_steps['preprocessor']
+        try:
+            encoder = CompiledEncoder(preprocessor)
+        except (AttributeError, ValueError) as e:
+            print(f"Compiled feature encoder not available: {str(e)}")
+            return False
+        if verify and not encoder.verify(preprocessor):
+            print("Compiled feature encoder does not match the preprocessor, using the sklearn path")
+            return False
+        self.encoder = encoder
+        return True
+
+    def compile_engine(self, verify=True):
+        """Build the compiled forest engine used by predict_batch
+
+        Args:
+            verify: Only enable the engine if its probabilities are identical
+                to the sklearn forest's
+
+        Returns:
+            True if the engine is enabled
+        """
+        if self.model is None:
+            raise Exception("Model not trained or loaded")
+        forest = self.model.named_steps['classifier']
+        try:
+            engine = CompiledForest(forest)
+        except (AttributeError, ValueError) as e:
+            print(f"Compiled forest engine not available: {str(e)}")
+            return False
+        if verify and not engine.verify(forest):
+            print("Compiled forest engine does not match sklearn, using the sklearn path")
+            return False
+        self.engine = engine
+        return True
+
+    def warm_up(self):
+        """Predict a small synthetic batch so first requests don't pay one-time setup costs"""
+        if self.cat_cols is None or self.num_cols is None:
+            return
+        records = []
+        for i in range(WARM_UP_ROWS):
+            record = {col: float(i) for col in self.num_cols}
+            record.update({col: '' for col in self.cat_cols})
+            records.append(record)
+        self.predict_batch(records[:1])
+        self.predict_batch(records)
+
+    def canonical_features(self, lead_data):
+        """Canonical tuple of the feature values the model actually uses
+
+        Fields the model ignores (name, email, ...) are dropped and numbers are
+        normalized, so equivalent leads map to the same tuple. Returns None if
+        the feature columns are not known.
+        """
+        if self.cat_cols is None or self.num_cols is None:
+            return None
+        processor = DataProcessor(dataset_type=self.dataset_type)
+        processed = processor.transform_input_data(lead_data, self.dataset_type)
+        return _canonical_values(processed, self.cat_cols, self.num_cols)
+
+    def _format_results(self, proba):
+        """Build score/probability/status results from a predict_proba matrix"""
+        return format_results(proba, self.classes_)
     
     def evaluate(self, X_test, y_test):
         """Evaluate model performance"""
         preds = self.model.predict(X_test)
         proba = self.model.predict_proba(X_test)[:, 1]
         
-        self.metrics = {
-            "accuracy": float(accuracy_score(y_test, preds)),
-            "precision": float(precision_score(y_test, preds)),
-            "recall": float(recall_score(y_test, preds)),
-            "f1": float(f1_score(y_test, preds)),
-            "roc_auc": float(roc_auc_score(y_test, proba))
-        }
+        self.metrics = self._classification_metrics(y_test, preds, proba)
         
         # Save metrics to JSON
         import json
@@ -136,6 +620,16 @@ class LeadScoringModel:
         
         return self.metrics
     
+    @staticmethod
+    def _classification_metrics(y_true, preds, proba):
+        return {
+            "accuracy": float(accuracy_score(y_true, preds)),
+            "precision": float(precision_score(y_true, preds)),
+            "recall": float(recall_score(y_true, preds)),
+            "f1": float(f1_score(y_true, preds)),
+            "roc_auc": float(roc_auc_score(y_true, proba))
+        }
+    
     def save_model(self, filename=None):
         """Save model to disk"""
         if self.model is None:
@@ -149,18 +643,38 @@ class LeadScoringModel:
         
         with open(model_path, 'wb') as f:
             pickle.dump(self.model, f)
+
+        # Serving arrays, only written when both compiled paths are verified
+        arrays_dir = _arrays_dir(model_path)
+        if os.path.isdir(arrays_dir):
+            shutil.rmtree(arrays_dir)
+        if self.engine is not None and self.encoder is not None:
+            staging_dir = f"{arrays_dir}.tmp-{os.getpid()}"
+            os.makedirs(staging_dir)
+            self.engine.save(staging_dir)
+            self.encoder.save(staging_dir)
+            with open(os.path.join(staging_dir, 'serving.json'), 'w') as f:
+                json.dump({'format_version': SERVING_ARRAYS_VERSION}, f)
+            os.rename(staging_dir, arrays_dir)
         
         # Also save model config
         config = {
             'dataset_type': self.dataset_type,
             'cat_cols': self.cat_cols,
-            'num_cols': self.num_cols
+            'num_cols': self.num_cols,
+            'preprocessor': self.preprocessor.to_dict() if self.preprocessor is not None else None,
+            'compaction': self.compaction
         }
         
-        config_path = os.path.join(base_dir, 'data', 'lead_scoring_model_config.json')
-        import json
+        # Config and metrics go next to the model file, where load_model looks
+        config_path = os.path.join(os.path.dirname(model_path), 'lead_scoring_model_config.json')
         with open(config_path, 'w') as f:
             json.dump(config, f)
+        
+        if self.metrics is not None:
+            metrics_filename = 'lead_scoring_model_metrics.json' if self.dataset_type == 'lead_scoring' else 'model_metrics.json'
+            with open(os.path.join(os.path.dirname(model_path), metrics_filename), 'w') as f:
+                json.dump(self.metrics, f)
             
         print(f"Model saved to {model_path}")
         return self
@@ -181,28 +695,66 @@ class LeadScoringModel:
             raise FileNotFoundError(f"Model file not found: {model_path}")
             
         try:
-            with open(model_path, 'rb') as f:
-                self.model = pickle.load(f)
-            
             # Try to load config
             config_path = os.path.join(os.path.dirname(model_path), 'lead_scoring_model_config.json')
             if os.path.exists(config_path):
-                import json
                 with open(config_path, 'r') as f:
                     config = json.load(f)
                     self.dataset_type = config.get('dataset_type', self.dataset_type)
                     self.cat_cols = config.get('cat_cols')
                     self.num_cols = config.get('num_cols')
+                    if config.get('preprocessor') is not None:
+                        self.preprocessor = LeadPreprocessor.from_dict(config['preprocessor'])
+                    self.compaction = config.get('compaction')
             
             # Try to load metrics
             metrics_filename = 'lead_scoring_model_metrics.json' if self.dataset_type == 'lead_scoring' else 'model_metrics.json'
             metrics_path = os.path.join(os.path.dirname(model_path), metrics_filename)
             if os.path.exists(metrics_path):
-                import json
                 with open(metrics_path, 'r') as f:
                     self.metrics = json.load(f)
+
+            if USE_COMPILED_ENCODER and USE_COMPILED_FOREST and MMAP_MODEL_ARRAYS and self._load_serving_arrays(model_path):
+                print(f"Model loaded from {_arrays_dir(model_path)} (memory-mapped)")
+                return self
+
+            with open(model_path, 'rb') as f:
+                self.model = pickle.load(f)
+            self.classes_ = self.model.classes_
+            
+            if USE_COMPILED_ENCODER:
+                self.compile_encoder()
+            if USE_COMPILED_FOREST and self.compile_engine() and self.compaction is not None:
+                # The pickle holds the pruned forest; narrow the engine it was served with again
+                self.engine = self.engine.compact(**self.compaction['storage'])
             
             print(f"Model loaded from {model_path}")
             return self
         except Exception as e:
-            raise Exception(f"Error loading model: {str(e)}") 
\ No newline at end of file
+            raise Exception(f"Error loading model: {str(e)}")
+
+    def _load_serving_arrays(self, model_path):
+        """Map the engine and encoder arrays saved next to the pickle
+
+        The pipeline itself is unpickled lazily, the first time self.model is
+        used. Returns False, leaving the model unchanged, if there are no
+        usable serving arrays.
+        """
+        arrays_dir = _arrays_dir(model_path)
+        if not os.path.isdir(arrays_dir):
+            return False
+        try:
+            with open(os.path.join(arrays_dir, 'serving.json'), 'r') as f:
+                if json.load(f).get('format_version') not in _READABLE_SERVING_ARRAYS_VERSIONS:
+                    return False
+            engine = CompiledForest.load(arrays_dir)
+            encoder = CompiledEncoder.load(arrays_dir)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Serving arrays not usable, loading the pickle: {str(e)}")
+            return False
+        self.engine = engine
+        self.encoder = encoder
+        self.classes_ = engine.classes_
+        self._model = None
+        self._model_path = model_path
+        return True 
\ No newline at end of file
@@ -0,0 +1,175 @@
+import numpy as np
+import pandas as pd
+
+def _safe_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+def to_float_array(values):
+    """float64 array of a list of values; None and non-numeric values become NaN"""
+    try:
+        return np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        return np.array([_safe_float(value) for value in values], dtype=np.float64)
+
+class LeadPreprocessor:
+    """Fitted cleaning step shared by training and inference
+
+    fit() learns the feature columns and the values missing entries are
+    imputed with: a fixed default for zero_fill_cols, the training mode for
+    categorical columns and the training mean for numeric ones. The same
+    statistics clean the training frame (transform_frame) and the leads
+    being scored (transform_columns), so a lead with missing fields is
+    imputed the way the training data was. The counts behind the means and
+    modes are kept, so partial_fit() can update them with newly labeled
+    leads without the training data.
+    """
+
+    def __init__(self, drop_cols=(), zero_fill_cols=(), target_col=None):
+        """Initialize an unfitted preprocessor
+
+        Args:
+            drop_cols: Columns removed before training (ids and the like)
+            zero_fill_cols: Numeric columns whose missing values mean 0
+            target_col: Target column, excluded from the features
+        """
+        self.drop_cols = list(drop_cols)
+        self.zero_fill_cols = list(zero_fill_cols)
+        self.target_col = target_col
+        self.cat_cols = None
+        self.num_cols = None
+        self.fill_values = None
+        # Non-missing values per numeric column and value counts per
+        # categorical column; None for preprocessors saved without them
+        self.counts = None
+        self.category_counts = None
+
+    def fit(self, df):
+        """Learn feature columns and imputation values from a raw frame"""
+        df = self._drop(df).fillna({col: 0 for col in self.zero_fill_cols if col in df.columns})
+        features = [col for col in df.columns if col != self.target_col]
+        self.cat_cols = [col for col in features if df[col].dtype == 'object']
+        self.num_cols = [col for col in features if df[col].dtype in ('int64', 'float64')]
+
+        self.fill_values = {}
+        for col in self.cat_cols:
+            mode = df[col].mode()
+            if len(mode):
+                self.fill_values[col] = mode[0]
+        for col in self.num_cols:
+            mean = df[col].mean()
+            if not np.isnan(mean):
+                self.fill_values[col] = float(mean)
+        for col in self.zero_fill_cols:
+            self.fill_values[col] = 0.0
+
+        self.counts = {col: int(df[col].count()) for col in self.num_cols}
+        self.category_counts = {
+            col: {str(value): int(count) for value, count in df[col].value_counts().items()}
+            for col in self.cat_cols
+        }
+        return self
+
+    def partial_fit(self, records):
+        """Update the imputation values with a batch of lead dicts
+
+        Means and modes are recomputed from the running counts, so the cost
+        depends on the batch size only and columns the batch has no values
+        for keep their fill value. A preprocessor saved without counts is
+        left unchanged.
+
+        Args:
+            records: List of lead dicts, fields outside the features are ignored
+        """
+        if self.counts is None or self.category_counts is None:
+            return self
+        for col in self.num_cols:
+            if col in self.zero_fill_cols:
+                continue
+            values = to_float_array([record.get(col) for record in records])
+            values = values[~np.isnan(values)]
+            if len(values) == 0:
+                continue
+            mean = self.fill_values.get(col, 0.0)
+            self.counts[col] = self.counts.get(col, 0) + len(values)
+            self.fill_values[col] = float(mean + (values.sum() - len(values) * mean) / self.counts[col])
+        for col in self.cat_cols:
+            counts = self.category_counts.setdefault(col, {})
+            for value in (record.get(col) for record in records):
+                if value is None or value != value:
+                    continue
+                value = value if isinstance(value, str) else str(value)
+                counts[value] = counts.get(value, 0) + 1
+            if counts:
+                # Most frequent value, the smallest one on ties like pandas' mode()
+                self.fill_values[col] = min(counts, key=lambda value: (-counts[value], value))
+        return self
+
+    def transform_frame(self, df):
+        """Clean a training frame: drop columns, fill defaults and impute, in one pass"""
+        fills = {col: value for col, value in self.fill_values.items() if col in df.columns}
+        return self._drop(df).fillna(fills)
+
+    def transform_columns(self, records):
+        """Clean a batch of lead dicts into feature columns
+
+        Missing, None and NaN values are imputed; numbers arriving as strings
+        are converted and unparseable ones imputed; categories are mapped to
+        strings like the CSV values they were trained on.
+
+        Args:
+            records: List of lead dicts, fields outside the features are ignored
+
+        Returns:
+            Dict of column -> values: float64 arrays for numeric columns,
+            lists of strings for categorical ones
+        """
+        columns = {}
+        for col in self.num_cols:
+            values = to_float_array([record.get(col) for record in records])
+            fill = self.fill_values.get(col)
+            if fill is not None:
+                values[np.isnan(values)] = fill
+            columns[col] = values
+        for col in self.cat_cols:
+            fill = self.fill_values.get(col)
+            columns[col] = [
+                fill if value is None or value != value else value if isinstance(value, str) else str(value)
+                for value in (record.get(col) for record in records)
+            ]
+        return columns
+
+    def transform_records(self, records):
+        """Clean a batch of lead dicts, returning one feature dict per lead"""
+        columns = self.transform_columns(records)
+        names = list(columns)
+        return [dict(zip(names, row)) for row in zip(*(columns[name] for name in names))] if records else []
+
+    def to_dict(self):
+        """JSON-serializable state, stored with the model"""
+        return {
+            'drop_cols': self.drop_cols,
+            'zero_fill_cols': self.zero_fill_cols,
+            'target_col': self.target_col,
+            'cat_cols': self.cat_cols,
+            'num_cols': self.num_cols,
+            'fill_values': self.fill_values,
+            'counts': self.counts,
+            'category_counts': self.category_counts
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        """Rebuild a fitted preprocessor from to_dict() output"""
+        preprocessor = cls(state['drop_cols'], state['zero_fill_cols'], state['target_col'])
+        preprocessor.cat_cols = state['cat_cols']
+        preprocessor.num_cols = state['num_cols']
+        preprocessor.fill_values = state['fill_values']
+        preprocessor.counts = state.get('counts')
+        preprocessor.category_counts = state.get('category_counts')
+        return preprocessor
+
+    def _drop(self, df):
+        return df.drop(columns=[col for col in self.drop_cols if col in df.columns])
@@ -0,0 +1,96 @@
+import codecs
+import csv
+import json
+
+class InvalidRecord:
+    """Stands in for an input line that doesn't hold a record"""
+
+    def __init__(self, error):
+        self.error = error
+
+class RecordStreamParser:
+    """Incrementally parse CSV or NDJSON records from a stream of byte chunks
+
+    Only the current partial line (or partial quoted CSV record) is buffered,
+    so memory use does not depend on the size of the stream. An NDJSON line
+    that isn't a JSON object is returned as an InvalidRecord, so one bad
+    line doesn't end the stream.
+    """
+
+    def __init__(self, input_format='csv', delimiter=','):
+        """Initialize the parser
+
+        Args:
+            input_format: 'csv' (first record is the header) or 'ndjson'
+            delimiter: CSV field delimiter
+        """
+        if input_format not in ('csv', 'ndjson'):
+            raise ValueError(f"Unknown input format: {input_format}")
+        self.input_format = input_format
+        self.delimiter = delimiter
+        self.header = None
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._buffer = ''
+        self._pending = ''
+        self._pending_quotes = 0
+
+    def feed(self, chunk):
+        """Feed a chunk of bytes and return the records it completed"""
+        text = self._buffer + self._decoder.decode(chunk)
+        lines = text.split('\n')
+        # The last piece has no newline yet, keep it for the next chunk
+        self._buffer = lines.pop()
+        return self._parse_lines(lines)
+
+    def close(self):
+        """Flush the remaining buffered input and return its records"""
+        text = self._buffer + self._decoder.decode(b'', final=True)
+        self._buffer = ''
+        records = self._parse_lines([text] if text else [])
+        if self._pending:
+            # Unterminated quoted field at end of input, parse what we have
+            pending, self._pending, self._pending_quotes = self._pending, '', 0
+            records.extend(self._parse_csv_records([pending]))
+        return records
+
+    def _parse_lines(self, lines):
+        if self.input_format == 'ndjson':
+            return [self._parse_json(line) for line in lines if line.strip()]
+
+        complete = []
+        for line in lines:
+            # A newline only ends a CSV record outside a quoted field, i.e.
+            # when the number of quote characters seen so far is even
+            self._pending += line
+            self._pending_quotes += line.count('"')
+            if self._pending_quotes % 2 == 0:
+                record = self._pending.rstrip('\r')
+                self._pending, self._pending_quotes = '', 0
+                if record:
+                    complete.append(record)
+            else:
+                self._pending += '\n'
+        return self._parse_csv_records(complete)
+
+    @staticmethod
+    def _parse_json(line):
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            return InvalidRecord(f"Invalid JSON: {str(e)}")
+        if not isinstance(record, dict):
+            return InvalidRecord("Expected a JSON object")
+        return record
+
+    def _parse_csv_records(self, records):
+        rows = csv.reader(records, delimiter=self.delimiter)
+        parsed = []
+        for values in rows:
+            if self.header is None:
+                self.header = [name.strip() for name in values]
+                continue
+            parsed.append({
+                name: (value if value != '' else None)
+                for name, value in zip(self.header, values)
+            })
+        return parsed
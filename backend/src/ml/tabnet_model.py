@@ -1,9 +1,82 @@
+import json
 import os
+import shutil
+import time
+import zipfile
 import numpy as np
-import pandas as pd
+import torch
+from pytorch_tabnet.callbacks import Callback
 from pytorch_tabnet.tab_model import TabNetClassifier
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, roc_auc_score
 from .data_processor import DataProcessor
+from .lead_model import _canonical_values, WARM_UP_ROWS
+from .lead_preprocessor import LeadPreprocessor, to_float_array
+
+# Bump when the metadata stored next to the TabNet weights changes shape
+TABNET_ARTIFACT_VERSION = 1
+TABNET_MODEL_FILENAME = 'lead_scoring_tabnet_model.zip'
+
+def _data_path(filename):
+    if os.path.isabs(filename):
+        return filename
+    base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return os.path.join(base_dir, 'data', filename)
+
+def fit_vocabularies(frame, cat_cols):
+    """Category -> code vocabulary per categorical column, from the categories a frame uses"""
+    vocabularies = {}
+    for col in cat_cols:
+        # Cached frames are already categorical, with the full dataset's categories
+        categories = frame[col].astype('category').cat.remove_unused_categories().cat.categories
+        vocabularies[col] = {category: code for code, category in enumerate(categories.tolist())}
+    return vocabularies
+
+def encode_records(records, feature_columns, vocabularies, preprocessor=None):
+    """Write records into a float32 matrix in training column order
+
+    Missing values are imputed by the fitted preprocessor when there is one.
+    Categories map through the vocabularies, unknown or missing ones to -1
+    like pandas' category codes. Missing or non-numeric numbers left after
+    that become 0.
+    """
+    if preprocessor is not None:
+        columns = preprocessor.transform_columns(records)
+    else:
+        columns = {col: [record.get(col) for record in records] for col in feature_columns}
+
+    X = np.empty((len(records), len(feature_columns)), dtype=np.float32)
+    for position, col in enumerate(feature_columns):
+        values = columns.get(col)
+        if values is None:
+            values = [record.get(col) for record in records]
+        vocabulary = vocabularies.get(col)
+        if vocabulary is not None:
+            X[:, position] = np.fromiter((vocabulary.get(value, -1) for value in values),
+                                         dtype=np.float32, count=len(records))
+            continue
+        values = to_float_array(values)
+        values[np.isnan(values)] = 0.0
+        X[:, position] = values
+    return X
+
+class _ProgressCallback(Callback):
+    """Reports epochs done and the latest eval metric to a progress function"""
+
+    def __init__(self, progress, max_epochs):
+        super().__init__()
+        self.progress = progress
+        self.max_epochs = max_epochs
+
+    def on_epoch_end(self, epoch, logs=None):
+        logs = logs or {}
+        self.progress(
+            stage="fitting",
+            epochs_done=epoch + 1,
+            max_epochs=self.max_epochs,
+            loss=logs.get('loss'),
+            eval_metric='val_0_accuracy',
+            eval_value=logs.get('val_0_accuracy')
+        )
 
 class TabNetLeadScoringModel:
     def __init__(self, data_path=None):
@@ -13,60 +86,195 @@ class TabNetLeadScoringModel:
         self.num_cols = None
         self.metrics = None
         self.trained = False
+        # Training-time column order and category -> code vocabularies
+        self.feature_columns = None
+        self.vocabularies = None
+        # Fitted cleaning step; None for models saved before it existed
+        self.preprocessor = None
 
-    def train(self):
+    def train(self, progress=None, max_epochs=100):
+        """Train the model
+
+        Args:
+            progress: Optional function called with keyword fields (stage,
+                epochs_done, eval_value, ...) as training advances
+            max_epochs: Upper bound on training epochs; early stopping
+                usually ends training sooner
+        """
+        if progress is not None:
+            progress(stage="loading_data")
         processor = DataProcessor(self.data_path, dataset_type='lead_scoring')
         train_df, test_df, cat_cols, num_cols = processor.load_and_prepare_data()
         self.cat_cols = cat_cols
         self.num_cols = num_cols
+        self.preprocessor = processor.preprocessor
 
         X_train = train_df.drop('target', axis=1)
         y_train = train_df['target'].values
         X_test = test_df.drop('target', axis=1)
         y_test = test_df['target'].values
 
-        # Encode categorical columns
-        for col in cat_cols:
-            X_train[col] = X_train[col].astype('category').cat.codes
-            X_test[col] = X_test[col].astype('category').cat.codes
+        # Encode categorical columns with vocabularies taken from the training
+        # split, so test rows and served leads get the same codes
+        self.feature_columns = list(X_train.columns)
+        self.vocabularies = fit_vocabularies(X_train, cat_cols)
+        X_train = self._encode(X_train.to_dict('records'))
+        X_test = self._encode(X_test.to_dict('records'))
 
         self.model = TabNetClassifier()
         self.model.fit(
-            X_train.values, y_train,
-            eval_set=[(X_test.values, y_test)],
-            patience=10, max_epochs=100, batch_size=1024, virtual_batch_size=128,
-            eval_metric=['accuracy']
+            X_train, y_train,
+            eval_set=[(X_test, y_test)],
+            patience=10, max_epochs=max_epochs, batch_size=1024, virtual_batch_size=128,
+            eval_metric=['accuracy'],
+            callbacks=[_ProgressCallback(progress, max_epochs)] if progress is not None else None
         )
         self.trained = True
+        if progress is not None:
+            progress(stage="evaluating")
         self.evaluate(X_test, y_test)
 
     def predict(self, input_data):
+        return self.predict_batch([input_data])[0]
+
+    def predict_batch(self, inputs, timings=None):
         if not self.trained:
             raise Exception('Model not trained!')
-        # Prepare input as DataFrame
-        df = pd.DataFrame([input_data])
-        for col in self.cat_cols:
-            if col in df:
-                df[col] = df[col].astype('category').cat.codes
-        for col in self.num_cols:
-            if col in df:
-                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-        pred = self.model.predict(df.values)[0]
-        proba = self.model.predict_proba(df.values)[0][1]
-        return {
-            'score': int(pred),
-            'probability': float(proba),
-            'status': 'converted' if pred == 1 else 'not_converted',
-        }
+        if len(inputs) == 0:
+            return []
+        start = time.perf_counter()
+        X = self._encode(inputs)
+        encoded = time.perf_counter()
+        # Single forward pass; the label is the argmax of the probabilities
+        probas = self._predict_proba(X)
+        preds = np.asarray(self.model.classes_)[np.argmax(probas, axis=1)]
+        if timings is not None:
+            timings['encode'] = encoded - start
+            timings['predict_proba'] = time.perf_counter() - encoded
+        statuses = np.where(preds == 1, 'converted', 'not_converted')
+        return [
+            {'score': int(pred), 'probability': float(proba), 'status': status}
+            for pred, proba, status in zip(preds.tolist(), probas[:, 1].tolist(), statuses.tolist())
+        ]
+
+    def _encode(self, records):
+        """Write records into a float32 matrix in training column order, see encode_records"""
+        return encode_records(records, self.feature_columns, self.vocabularies, self.preprocessor)
+
+    def _predict_proba(self, X):
+        """Softmax probabilities from one forward pass per chunk of rows"""
+        network = self.model.network
+        network.eval()
+        results = []
+        with torch.inference_mode():
+            for start in range(0, len(X), self.model.batch_size):
+                data = torch.from_numpy(X[start:start + self.model.batch_size]).to(self.model.device)
+                output, _ = network(data)
+                results.append(torch.softmax(output, dim=1).cpu().numpy())
+        return np.vstack(results)
+
+    def warm_up(self):
+        """Predict a small synthetic batch so first requests don't pay one-time setup costs"""
+        if self.trained:
+            self.predict_batch([{}])
+            self.predict_batch([{}] * WARM_UP_ROWS)
+
+    def canonical_features(self, input_data):
+        """Canonical tuple of the feature values the model uses, None if unknown"""
+        if not self.trained:
+            return None
+        return _canonical_values(input_data, self.cat_cols, self.num_cols)
 
     def evaluate(self, X_test, y_test):
-        preds = self.model.predict(X_test.values)
-        probas = self.model.predict_proba(X_test.values)[:, 1]
+        """Evaluate on an encoded test matrix, through the serving forward pass"""
+        probas = self._predict_proba(X_test)
+        preds = np.asarray(self.model.classes_)[np.argmax(probas, axis=1)]
         self.metrics = {
             'accuracy': accuracy_score(y_test, preds),
             'precision': precision_score(y_test, preds),
             'recall': recall_score(y_test, preds),
             'f1': f1_score(y_test, preds),
-            'roc_auc': roc_auc_score(y_test, probas)
+            'roc_auc': roc_auc_score(y_test, probas[:, 1])
         }
-        return self.metrics 
\ No newline at end of file
+        return self.metrics
+
+    def save_model(self, filename=None):
+        """Save the model as a versioned zip artifact
+
+        The artifact is pytorch_tabnet's own zip (model_params.json and
+        network.pt) plus lead_model_meta.json holding the feature columns,
+        category vocabularies, classes and metrics. It is written to a
+        temporary file and then renamed, so readers never see a partial file.
+
+        Args:
+            filename: Artifact file name in the data directory, or an
+                absolute path. Defaults to TABNET_MODEL_FILENAME.
+        """
+        if not self.trained:
+            raise Exception("No model to save")
+
+        model_path = _data_path(filename or TABNET_MODEL_FILENAME)
+        staging_path = f"{model_path}.tmp-{os.getpid()}"
+        # pytorch_tabnet appends ".zip" to the path it is given
+        saved_path = self.model.save_model(staging_path)
+
+        meta = {
+            'format_version': TABNET_ARTIFACT_VERSION,
+            'feature_columns': self.feature_columns,
+            'cat_cols': self.cat_cols,
+            'num_cols': self.num_cols,
+            # Ordered category lists keep value types that JSON object keys would lose
+            'vocabularies': {col: list(vocabulary) for col, vocabulary in self.vocabularies.items()},
+            'classes': np.asarray(self.model.classes_).tolist(),
+            'preprocessor': self.preprocessor.to_dict() if self.preprocessor is not None else None,
+            'metrics': {name: float(value) for name, value in (self.metrics or {}).items()}
+        }
+        try:
+            with zipfile.ZipFile(saved_path, 'a') as z:
+                z.writestr('lead_model_meta.json', json.dumps(meta))
+            os.replace(saved_path, model_path)
+        finally:
+            if os.path.exists(saved_path):
+                os.remove(saved_path)
+            shutil.rmtree(staging_path, ignore_errors=True)
+
+        print(f"TabNet model saved to {model_path}")
+        return self
+
+    def load_model(self, filename=None):
+        """Load a model saved with save_model
+
+        Args:
+            filename: Artifact file name in the data directory, or an
+                absolute path. Defaults to TABNET_MODEL_FILENAME.
+        """
+        model_path = _data_path(filename or TABNET_MODEL_FILENAME)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Model file not found: {model_path}")
+
+        try:
+            with zipfile.ZipFile(model_path) as z:
+                meta = json.loads(z.read('lead_model_meta.json'))
+            if meta.get('format_version') != TABNET_ARTIFACT_VERSION:
+                raise ValueError(f"unsupported artifact version {meta.get('format_version')}")
+
+            model = TabNetClassifier()
+            model.load_model(model_path)
+            model.classes_ = np.asarray(meta['classes'])
+
+            self.model = model
+            self.feature_columns = meta['feature_columns']
+            self.cat_cols = meta['cat_cols']
+            self.num_cols = meta['num_cols']
+            self.vocabularies = {
+                col: {category: code for code, category in enumerate(categories)}
+                for col, categories in meta['vocabularies'].items()
+            }
+            self.metrics = meta['metrics'] or None
+            if meta.get('preprocessor') is not None:
+                self.preprocessor = LeadPreprocessor.from_dict(meta['preprocessor'])
+            self.trained = True
+            print(f"TabNet model loaded from {model_path}")
+            return self
+        except Exception as e:
+            raise Exception(f"Error loading TabNet model: {str(e)}")
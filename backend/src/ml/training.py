@@ -0,0 +1,94 @@
+# Training entry points. These are plain top-level functions so they can be
+# pickled and run in a worker process; each returns the trained model, which
+# the caller publishes to the model registry.
+from .lead_model import LeadScoringModel
+
+# Training rows the trees kept by a compaction must agree on
+COMPACTION_REFERENCE_ROWS = 2000
+
+def train_lead_scoring_model(dataset_type='bank', progress=None):
+    """Train a LeadScoringModel
+
+    Args:
+        dataset_type: Type of dataset to use ('bank' or 'lead_scoring')
+        progress: Optional progress function, see LeadScoringModel.train
+    """
+    model = LeadScoringModel(dataset_type)
+    model.train(progress=progress)
+    return model
+
+def train_tabnet_model(data_path=None, progress=None):
+    """Train a TabNetLeadScoringModel on the lead scoring dataset
+
+    Args:
+        data_path: Lead scoring CSV, defaults to the bundled dataset
+        progress: Optional progress function, see TabNetLeadScoringModel.train
+    """
+    # Imported here so torch is only loaded when a TabNet model is trained
+    from .tabnet_model import TabNetLeadScoringModel
+    model = TabNetLeadScoringModel(data_path)
+    model.train(progress=progress)
+    return model
+
+def search_hyperparameters(dataset_type='lead_scoring', model_type='random_forest', options=None, progress=None):
+    """Run a HyperparameterSearch and return its report
+
+    Args:
+        dataset_type: Type of dataset to use ('bank' or 'lead_scoring')
+        model_type: 'random_forest' or 'transformer'
+        options: Optional dict of HyperparameterSearch keyword arguments
+        progress: Optional progress function, see HyperparameterSearch.run
+    """
+    from .hyperparameter_search import HyperparameterSearch
+    search = HyperparameterSearch(dataset_type, model_type, **(options or {}))
+    return search.run(progress=progress)
+
+def compact_lead_scoring_model(model, options=None, progress=None):
+    """Compact a LeadScoringModel and compare it with the original on the holdout data
+
+    Args:
+        model: Trained LeadScoringModel
+        options: Optional dict of LeadScoringModel.compact keyword arguments
+        progress: Optional progress function, see LeadScoringModel.compact
+
+    Returns:
+        The compacted model. Its metrics are its holdout metrics and its
+        compaction['report'] is the comparison with the original (see
+        compaction_report).
+    """
+    from .data_processor import DataProcessor
+    from .forest_compaction import compaction_report
+    if progress is not None:
+        progress(stage="loading_data")
+    train_df, test_df, _, _ = DataProcessor(dataset_type=model.dataset_type).load_and_prepare_data()
+    column_transformer = model.model.named_steps['preprocessor']
+    reference = train_df.drop('target', axis=1).sample(
+        n=min(COMPACTION_REFERENCE_ROWS, len(train_df)), random_state=0)
+
+    compacted = model.compact(column_transformer.transform(reference), progress=progress, **(options or {}))
+
+    if progress is not None:
+        progress(stage="evaluating")
+    report = compaction_report(model, compacted, column_transformer.transform(test_df.drop('target', axis=1)),
+                               test_df['target'])
+    compacted.metrics = report['compacted']['metrics']
+    compacted.compaction['report'] = report
+    return compacted
+
+def fit_calibrator(model, dataset_type):
+    """Fit a PlattCalibrator to a model's probabilities on the dataset's holdout split
+
+    Args:
+        model: Trained model with a predict_batch method
+        dataset_type: Dataset the model was trained on ('bank' or 'lead_scoring')
+
+    Returns:
+        The fitted PlattCalibrator
+    """
+    import numpy as np
+    from .data_processor import DataProcessor
+    from .ensemble import PlattCalibrator
+    _, test_df, _, _ = DataProcessor(dataset_type=dataset_type).load_and_prepare_data()
+    results = model.predict_batch(test_df.drop('target', axis=1).to_dict('records'))
+    proba = np.array([result['probability'] for result in results])
+    return PlattCalibrator().fit(proba, test_df['target'].values)
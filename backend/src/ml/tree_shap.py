@@ -0,0 +1,213 @@
+import numpy as np
+from scipy import sparse
+
+class TreeExplainer:
+    """Exact path-dependent TreeSHAP values of a random forest, vectorized over rows
+
+    Per root-to-leaf path, TreeSHAP is the Shapley value of a product game:
+    with the path's distinct features as players, a coalition S is worth
+    v * prod(o_j for j in S) * prod(z_j for j not in S), where v is the
+    leaf value, o_j is 1 if the row satisfies every split on feature j along
+    the path, and z_j is the fraction of training samples that followed
+    those splits. The Shapley weights |S|!(d-|S|-1)!/d! are the integral of
+    t^|S| (1-t)^(d-|S|-1) over [0, 1], so feature j's value on a path is
+
+        v * (o_j - z_j) * integral of prod(z_k (1-t) + o_k t for k != j) dt
+
+    a polynomial of degree d-1 that Gauss-Legendre quadrature with
+    ceil(d/2) points integrates exactly.
+
+    The products are shared between paths through the tree: they are built
+    top-down per node, and the leaf sums they are multiplied with are built
+    bottom-up, so a row costs O(nodes x quadrature points) numpy work
+    instead of the O(leaves x depth^2) of the TreeSHAP recursion. A node's
+    contribution only counts leaves below it whose path has no later split
+    on the same feature; those leaves' sums are taken off at the next split
+    on that feature (see owners).
+
+    Values are averaged over the trees like the forest's predict_proba, so
+    base_value plus the sum of a row's values is its positive-class
+    probability, up to float32 rounding (about 1e-7).
+    """
+
+    # Upper bound on nodes x rows x quadrature points per working array
+    WORK_SIZE = 1 << 21
+
+    def __init__(self, forest, feature_groups=None, group_names=None, positive_class=1):
+        """Precompute the path structure of a fitted forest
+
+        Args:
+            forest: Fitted sklearn RandomForestClassifier
+            feature_groups: Optional group index of every input feature, e.g.
+                the original column of each one-hot feature; values of a
+                group are summed
+            group_names: Names of the groups (or of the features)
+            positive_class: Index of the class explained
+        """
+        trees = [estimator.tree_ for estimator in forest.estimators_]
+        n_features = int(forest.n_features_in_)
+        if feature_groups is None:
+            feature_groups = np.arange(n_features)
+        feature_groups = np.asarray(feature_groups, dtype=np.int64)
+        n_groups = int(feature_groups.max()) + 1
+        self.group_names = list(group_names) if group_names is not None else [str(i) for i in range(n_groups)]
+        self.n_trees = len(trees)
+
+        parents, features, lows, highs, covers, prevs, owners, values = [], [], [], [], [], [], [], []
+        lefts, rights = [], []
+        max_distinct = 1
+        offset = 0
+        for tree in trees:
+            n = tree.node_count
+            parent = np.full(n, -1, dtype=np.int64)
+            feature = np.zeros(n, dtype=np.int64)
+            low = np.full(n, -np.inf)
+            high = np.full(n, np.inf)
+            cover = np.ones(n)
+            prev = np.full(n, -1, dtype=np.int64)
+            owner = np.full(n, -1, dtype=np.int64)
+            left, right = tree.children_left, tree.children_right
+            weight = tree.weighted_n_node_samples
+            split_feature, threshold = tree.feature, tree.threshold
+
+            # Depth first; per path, the latest node entered through each
+            # feature and the bounds that feature's splits put on the row
+            stack = [(0, {}, {})]
+            while stack:
+                node, last, bounds = stack.pop()
+                if left[node] == -1:
+                    max_distinct = max(max_distinct, len(last))
+                    continue
+                f = int(split_feature[node])
+                owner[node] = last.get(f, -1)
+                lo, hi = bounds.get(f, (-np.inf, np.inf))
+                for child, child_bounds in ((left[node], (lo, min(hi, threshold[node]))),
+                                            (right[node], (max(lo, threshold[node]), hi))):
+                    parent[child] = node
+                    feature[child] = f
+                    low[child], high[child] = child_bounds
+                    previous = last.get(f, -1)
+                    prev[child] = previous
+                    # Fraction of samples following all of this path's splits on f
+                    cover[child] = (cover[previous] if previous >= 0 else 1.0) * weight[child] / weight[node]
+                    stack.append((child, {**last, f: child}, {**bounds, f: child_bounds}))
+
+            value = tree.value[:, 0, :].astype(np.float64)
+            normalizer = value.sum(axis=1)
+            normalizer[normalizer == 0.0] = 1.0
+            values.append(value[:, positive_class] / normalizer)
+            for array, shifted in ((parent, parents), (prev, prevs), (owner, owners)):
+                shifted.append(np.where(array >= 0, array + offset, -1))
+            lefts.append(np.where(left >= 0, left + offset, -1))
+            rights.append(np.where(right >= 0, right + offset, -1))
+            features.append(feature)
+            lows.append(low)
+            highs.append(high)
+            covers.append(cover)
+            offset += n
+
+        parent = np.concatenate(parents)
+        left = np.concatenate(lefts)
+        right = np.concatenate(rights)
+        is_leaf = left == -1
+        roots = np.flatnonzero(parent == -1)
+        value = np.concatenate(values)
+        self.base_value = float(value[roots].mean())
+
+        # Breadth first layout: every level is a contiguous slice and the
+        # children of a level's split nodes follow as (left, right) pairs, so
+        # the passes over the levels need no scatter or gather of children
+        order, self.levels = [], []
+        level, position = roots, 0
+        while len(level):
+            splits = np.flatnonzero(~is_leaf[level])
+            order.append(level)
+            self.levels.append((position, position + len(level), splits))
+            position += len(level)
+            level = np.column_stack([left[level[splits]], right[level[splits]]]).ravel()
+        order = np.concatenate(order)
+        new_id = np.empty(len(order), dtype=np.int64)
+        new_id[order] = np.arange(len(order))
+
+        self.n_nodes = offset
+        self.feature = np.concatenate(features)[order]
+        self.low = np.concatenate(lows)[order]
+        self.high = np.concatenate(highs)[order]
+        self.cover = np.concatenate(covers)[order].astype(np.float32)
+        self.leaf_value = np.where(is_leaf, value, 0.0)[order].astype(np.float32)
+        # A node without a previous node on its feature reads the extra
+        # factor row of ones at the end
+        prev = np.concatenate(prevs)[order]
+        self.prev_index = np.where(prev >= 0, new_id[np.maximum(prev, 0)], self.n_nodes)
+        # Leaf sums of the nodes splitting on a feature again, taken off the
+        # node that last entered the path through that feature; as segments
+        # of split nodes sharing that node, for np.add.reduceat
+        owner = np.concatenate(owners)[order]
+        split_nodes = np.flatnonzero(owner >= 0)
+        owner = new_id[owner[split_nodes]]
+        self.owned = split_nodes[np.argsort(owner, kind='stable')]
+        self.owners, self.owned_starts = np.unique(np.sort(owner), return_index=True)
+        # Node contributions summed per group of the feature entering it
+        contributing = np.flatnonzero(parent[order] >= 0)
+        self.grouping = sparse.csr_matrix(
+            (np.full(len(contributing), 1.0 / self.n_trees), (feature_groups[self.feature[contributing]], contributing)),
+            shape=(n_groups, self.n_nodes))
+
+        # Exact for paths with up to 2 * n_points distinct features
+        n_points = (max_distinct + 1) // 2
+        points, weights = np.polynomial.legendre.leggauss(max(1, n_points))
+        self.points = ((points + 1.0) / 2.0).astype(np.float32)
+        self.weights = (weights / 2.0).astype(np.float32)
+        # z (1 - t) of every node and point, the factor of a row not satisfying the node
+        self.unsatisfied_factor = self.cover[:, np.newaxis] * (1.0 - self.points)
+
+    def shap_values(self, X):
+        """SHAP values of every row, summed per feature group
+
+        Args:
+            X: Encoded rows, shape (n_rows, n_features)
+
+        Returns:
+            Array of shape (n_rows, n_groups); each row sums to the row's
+            positive-class probability minus base_value
+        """
+        X = np.asarray(X.toarray() if hasattr(X, 'toarray') else X)
+        if X.ndim == 1:
+            X = X[np.newaxis, :]
+        # sklearn compares float32 inputs against float64 thresholds
+        X = X.astype(np.float32).astype(np.float64)
+        result = np.empty((X.shape[0], len(self.group_names)))
+        chunk = max(1, self.WORK_SIZE // (self.n_nodes * len(self.points)))
+        for start in range(0, X.shape[0], chunk):
+            result[start:start + chunk] = self._shap_chunk(X[start:start + chunk])
+        return result
+
+    def _shap_chunk(self, X):
+        n_rows, n_points = X.shape[0], len(self.points)
+        # Working arrays are (nodes, rows, points) float32, to keep the passes memory-light
+        x = X[:, self.feature].T
+        # Whether the row satisfies the path's splits on the node's feature
+        satisfied = ((self.low[:, np.newaxis] < x) & (x <= self.high[:, np.newaxis])).astype(np.float32)
+        # Merged factor z (1 - t) + o t of the node's feature, plus a row of ones
+        factor = np.empty((self.n_nodes + 1, n_rows, n_points), dtype=np.float32)
+        np.multiply(satisfied[:, :, np.newaxis], self.points, out=factor[:-1])
+        factor[:-1] += self.unsatisfied_factor[:, np.newaxis, :]
+        factor[-1] = 1.0
+        product = factor[:-1] / factor[self.prev_index]
+
+        # Product of the path's merged factors, top-down
+        for (start, stop, splits), (child_start, child_stop, _) in zip(self.levels, self.levels[1:]):
+            product[child_start:child_stop] *= np.repeat(product[start:stop][splits], 2, axis=0)
+
+        # Sum of value x product over the leaves below each node, bottom-up
+        below = self.leaf_value[:, np.newaxis, np.newaxis] * product
+        for (start, stop, splits), (child_start, child_stop, _) in reversed(list(zip(self.levels, self.levels[1:]))):
+            level = below[start:stop]
+            level[splits] += below[child_start:child_stop:2] + below[child_start + 1:child_stop:2]
+
+        if len(self.owned):
+            below[self.owners] -= np.add.reduceat(below[self.owned], self.owned_starts, axis=0)
+        below /= factor[:-1]
+        integral = np.dot(below.reshape(-1, n_points), self.weights).reshape(self.n_nodes, n_rows)
+        contribution = (satisfied - self.cover[:, np.newaxis]) * integral
+        return (self.grouping @ contribution).T
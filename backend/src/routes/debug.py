@@ -0,0 +1,45 @@
+from fastapi import APIRouter, Depends, Header, HTTPException
+from typing import Optional
+import os
+import sys
+
+# Add the parent directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.profiling import debug_token_valid, request_profiler
+
+def require_debug_token(x_debug_token: Optional[str] = Header(None)):
+    """Stack samples and request paths aren't for every client: the /debug
+    endpoints need PROFILE_DEBUG_TOKEN in the X-Debug-Token header and are
+    disabled while it's unset"""
+    if not request_profiler.debug_token:
+        raise HTTPException(status_code=404, detail="Debug endpoints are disabled; set PROFILE_DEBUG_TOKEN to enable them")
+    if not debug_token_valid(x_debug_token, request_profiler.debug_token):
+        raise HTTPException(status_code=403, detail="Missing or invalid X-Debug-Token header")
+
+router = APIRouter(dependencies=[Depends(require_debug_token)])
+
+@router.get("/slow-requests")
+async def get_slow_requests():
+    """The slowest requests since startup or the last reset, slowest first
+
+    Each has its stage timings in milliseconds and, if it was in flight
+    longer than PROFILE_SLOW_MS, folded stack samples of the busy threads.
+    """
+    return {
+        "profiler": request_profiler.stats(),
+        "requests": request_profiler.slowest()
+    }
+
+@router.delete("/slow-requests")
+async def reset_slow_requests():
+    """Forget the kept slow requests"""
+    request_profiler.reset()
+    return {"status": "ok"}
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str):
+    """The profile named by a response's X-Profile-Id header"""
+    profile = request_profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired profile: {profile_id}")
+    return profile
@@ -0,0 +1,55 @@
+from fastapi import APIRouter, HTTPException
+import os
+import sys
+from datetime import datetime, timezone
+from typing import Optional
+
+# Add the parent directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.executors import lead_store_executor
+from services.lead_store import lead_store, MAX_PAGE_SIZE
+
+router = APIRouter()
+
+def _unix_time(value: Optional[datetime]):
+    """Unix time of a datetime; naive datetimes are taken as UTC"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+@router.get("")
+async def list_leads(
+    status: Optional[str] = None,
+    min_score: Optional[int] = None,
+    max_score: Optional[int] = None,
+    source: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    model_type: Optional[str] = None,
+    limit: int = 50,
+    cursor: Optional[str] = None
+):
+    """List scored leads newest first, one page at a time
+
+    Pass the next_cursor of a response as cursor to get the following page;
+    next_cursor is null on the last page.
+    """
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    try:
+        return await lead_store_executor.run(
+            lead_store.query, status, min_score, max_score, source,
+            _unix_time(since), _unix_time(until), model_type, limit, cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/{lead_id}")
+async def get_lead(lead_id: int):
+    """A scored lead by id"""
+    lead = await lead_store_executor.run(lead_store.get, lead_id)
+    if lead is None:
+        raise HTTPException(status_code=404, detail=f"Unknown lead: {lead_id}")
+    return lead
@@ -1,78 +1,159 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+import asyncio
 import os
 import sys
+import csv
+import io
 import json
-from pydantic import BaseModel
-from typing import Dict, Any, Optional, List
+import time
+from pydantic import BaseModel, ConfigDict
+from typing import Dict, Any, Optional, List, Union
+import numpy as np
 
 # Add the parent directory to sys.path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from ml.lead_model import LeadScoringModel
+from ml.lead_model import LeadScoringModel, format_results
+from ml.ensemble import combine_probabilities
 from ml.data_processor import DataProcessor
-from ml.tabnet_model import TabNetLeadScoringModel
+from ml.stream_reader import RecordStreamParser, InvalidRecord
+from ml.hyperparameter_search import HyperparameterSearch
+from ml.compiled_forest import FLOAT_DTYPES
+from services.batching import get_batcher, batching_stats
+from services.executors import inference_executor, executor_stats
+from services.telemetry import (
+    log_event, mark_handler_start, mark_handler_end, observe_stages,
+    record_error, record_fallback
+)
+from services.profiling import record_stage, record_stages
+from services.prediction_cache import prediction_cache
+from services.model_registry import model_registry
+from services.training_jobs import training_jobs
+from services.lead_store import lead_store, LEAD_STORE_ENABLED
+from initialize_models import (
+    import_legacy_artifact, load_registered_models, submit_training, submit_update, submit_search,
+    submit_compaction, get_calibrator, UPDATABLE_MODELS, COMPACTABLE_MODELS, MAX_COMPACTION_ROC_AUC_DROP,
+    ENSEMBLE_MEMBERS, MODEL_FANOUT_TIMEOUT_MS, LEAD_MODEL_LABEL, BANK_MODEL_LABEL, TABNET_MODEL_LABEL
+)
 
 router = APIRouter()
 
-# Global variables for storing model instances
-lead_scoring_model = None
-lead_scoring_model_bank = None
-lead_scoring_tabnet_model = None
+# model_type that averages the calibrated probabilities of the dataset's ENSEMBLE_MEMBERS
+ENSEMBLE_MODEL_TYPE = "ensemble"
+# Models compare-models scores a lead with, and their keys in its response
+COMPARE_MODEL_KEYS = {
+    BANK_MODEL_LABEL: "bank_model",
+    LEAD_MODEL_LABEL: "lead_scoring_model",
+    TABNET_MODEL_LABEL: "tabnet_model"
+}
+
+SCORE_ENDPOINT = "/api/ml-scoring/score"
+SCORE_BATCH_ENDPOINT = "/api/ml-scoring/score-batch"
+SCORE_FILE_ENDPOINT = "/api/ml-scoring/score-file"
+EXPLAIN_ENDPOINT = "/api/ml-scoring/explain"
 
 # Get the absolute path to the data directory
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 data_dir = os.path.join(project_root, 'data')
 print(f"Data directory path: {data_dir}")
 
+def _model_label(dataset_type: str, model_type: str):
+    """Label identifying the model serving a dataset/model type"""
+    if dataset_type == "lead_scoring":
+        return "lead_scoring:transformer" if model_type.lower() == "transformer" else "lead_scoring:random_forest"
+    return "bank:random_forest"
+
 def update_models(lead_model, bank_model, tabnet_model):
-    """Update global model references when initialized from main.py"""
-    global lead_scoring_model, lead_scoring_model_bank, lead_scoring_tabnet_model
-    
-    # Only update if not None
-    if lead_model is not None:
-        lead_scoring_model = lead_model
-    
-    if bank_model is not None:
-        lead_scoring_model_bank = bank_model
-    
-    if tabnet_model is not None:
-        lead_scoring_tabnet_model = tabnet_model
+    """Publish models initialized from main.py that the registry doesn't serve yet"""
+    for label, model in ((LEAD_MODEL_LABEL, lead_model), (BANK_MODEL_LABEL, bank_model),
+                         (TABNET_MODEL_LABEL, tabnet_model)):
+        if model is not None and model_registry.get(label) is not model:
+            model_registry.publish(label, model, source="update")
+
+def _training_label(dataset_type: str, model_type: str):
+    """Normalized dataset type and model label for a training request"""
+    if dataset_type.lower() == "lead_scoring":
+        return "lead_scoring", _model_label("lead_scoring", model_type)
+    return "bank", BANK_MODEL_LABEL
+
+# Seconds a client is told to wait before retrying a model that is being trained
+TRAINING_RETRY_AFTER_SECONDS = 30
+
+class ModelTrainingPending(HTTPException):
+    """503 for a model that has no stored version yet and is being trained
+
+    The detail names the training job, which can be polled at
+    GET /train-jobs/{job_id}; the model serves once the job publishes it.
+    """
+
+    def __init__(self, model_label: str, job):
+        super().__init__(
+            status_code=503,
+            detail={
+                "message": f"Model {model_label} is being trained; retry once training job {job.id} has finished",
+                "job_id": job.id,
+                "job_status": job.status
+            },
+            headers={"Retry-After": str(TRAINING_RETRY_AFTER_SECONDS)}
+        )
+
+# On-demand loads in progress, so concurrent first requests share one load
+_pending_loads: Dict[str, "asyncio.Future"] = {}
+
+async def _load_or_train(model_label: str):
+    """Activate the latest stored version of a model, training one if none exists
+
+    Loading runs on the inference pool, so it doesn't block the event loop.
+    The model only becomes visible to other requests once it is fully loaded
+    and warmed up. A model without a stored version isn't waited for: a
+    training job is started (or the running one reused) in the background.
+
+    Raises:
+        ModelTrainingPending: If the model has to be trained first
+    """
+    pending = _pending_loads.get(model_label)
+    if pending is None:
+        pending = asyncio.ensure_future(_activate_or_train(model_label))
+        _pending_loads[model_label] = pending
+        pending.add_done_callback(lambda future: _finish_load(model_label, future))
+    # A cancelled request must not cancel the load other requests wait for
+    await asyncio.shield(pending)
+    return model_registry.get(model_label)
+
+def _finish_load(model_label: str, future):
+    _pending_loads.pop(model_label, None)
+    # Waiters may have timed out; retrieve the error so asyncio doesn't log it as unhandled
+    if not future.cancelled():
+        future.exception()
+
+async def _activate_or_train(model_label: str):
+    if await inference_executor.run(import_legacy_artifact, model_label):
+        print(f"Imported {model_label} on demand into the model registry")
+    elif model_registry.latest_version(model_label) is not None:
+        await inference_executor.run(model_registry.activate, model_label)
+        print(f"Loaded {model_label} on demand from the model registry")
+    else:
+        job = submit_training(model_label)
+        print(f"Training new {model_label} model on demand in job {job.id}")
+        raise ModelTrainingPending(model_label, job)
 
 # Check if models exist and load them
-def load_models():
-    global lead_scoring_model, lead_scoring_model_bank, lead_scoring_tabnet_model
-    
+def load_models(labels=None):
+    """Load stored models; startup does this through initialize_models"""
     try:
-        # Check for bank model
-        model_path = os.path.join(data_dir, 'lead_scoring_model.pkl')
-        if os.path.exists(model_path):
-            try:
-                lead_scoring_model_bank = LeadScoringModel()
-                lead_scoring_model_bank.load_model(model_path)
-                print(f"Loaded existing bank model from {model_path}")
-            except Exception as e:
-                print(f"Error loading bank model: {str(e)}")
-        else:
-            print(f"Bank model not found at {model_path}, will be created when requested")
-
-        # Check for lead scoring model
-        lead_model_path = os.path.join(data_dir, 'lead_scoring_custom_model.pkl')
-        if os.path.exists(lead_model_path):
-            try:
-                lead_scoring_model = LeadScoringModel('lead_scoring')
-                lead_scoring_model.load_model(lead_model_path)
-                print(f"Loaded existing lead scoring model from {lead_model_path}")
-            except Exception as e:
-                print(f"Error loading lead scoring model: {str(e)}")
-        else:
-            print(f"Lead scoring model not found at {lead_model_path}, will be created when requested")
+        load_registered_models(labels)
+        for label in (labels or (BANK_MODEL_LABEL, LEAD_MODEL_LABEL, TABNET_MODEL_LABEL)):
+            if model_registry.get(label) is None:
+                print(f"{label} model not found in the model registry, will be created when requested")
     except Exception as e:
         print(f"Error during model loading: {str(e)}")
 
-# Load models at module import time
-load_models()
-
 # Pydantic models for request and response
 class LeadData(BaseModel):
+    # Columns of the lead scoring CSV ("Lead Origin", "TotalVisits", ...) have
+    # no declared field; they are passed through to the model as sent
+    model_config = ConfigDict(extra="allow")
+
     # Common personal information
     name: Optional[str] = None
     email: Optional[str] = None
@@ -126,6 +207,7 @@ class ScoringResponse(BaseModel):
     status: str
     dataset_type: Optional[str] = None
     error: Optional[str] = None
+    members: Optional[Dict[str, float]] = None  # Calibrated probability per model, ensemble only
 
 class ModelMetricsResponse(BaseModel):
     accuracy: float
@@ -135,24 +217,46 @@ class ModelMetricsResponse(BaseModel):
     roc_auc: float
     dataset_type: Optional[str] = None
 
+class SearchRequest(BaseModel):
+    search_space: Optional[Dict[str, List[Any]]] = None  # Defaults to the model type's space
+    n_folds: int = 3
+    max_configs: int = 12
+    eta: int = 2
+    max_epochs: int = 20  # TabNet only
+    max_latency_ms: Optional[float] = None  # Single-row latency target
+
+class CompactionRequest(BaseModel):
+    max_depth: Optional[int] = 16  # Deepest tree level kept
+    max_leaves: Optional[int] = None  # Most leaves per tree
+    drop_tolerance: Optional[float] = 0.01  # Mean probability change allowed from dropping trees
+    min_trees: int = 10
+    threshold_dtype: str = "float32"  # float64, float32 or float16
+    value_dtype: str = "float32"
+    narrow_indices: bool = True
+    max_roc_auc_drop: float = MAX_COMPACTION_ROC_AUC_DROP  # Publish only within this holdout loss
+
 class FeatureImportanceItem(BaseModel):
     feature: str
     importance: float
 
-@router.post("/score", response_model=ScoringResponse)
-async def score_lead(lead: LeadData):
-    """Score a lead using the trained ML model"""
-    global lead_scoring_model, lead_scoring_model_bank, lead_scoring_tabnet_model
-    
-    # Log the incoming request data
-    print("\n----- INCOMING LEAD SCORING REQUEST -----")
-    print(f"Lead data: {lead.model_dump()}")
-    print(f"Using dataset type: {lead.dataset_type}")
-    
-    # Determine which model to use
-    dataset_type = lead.dataset_type.lower() if lead.dataset_type else "bank"
-    requested_dataset_type = dataset_type  # Save the originally requested dataset type
-    
+class FeatureContribution(BaseModel):
+    feature: str
+    contribution: float
+
+class ExplanationResponse(BaseModel):
+    score: int
+    probability: float
+    status: str
+    dataset_type: Optional[str] = None
+    base_value: float  # Mean probability of the forest; the contributions add up from it
+    contributions: List[FeatureContribution]  # Largest absolute contribution first
+
+def _prepare_lead_dict(lead: LeadData):
+    """Convert a LeadData record into the dict passed to the models
+
+    Returns:
+        Tuple of (lead_dict, model_type)
+    """
     # Format lead data
     lead_dict = lead.model_dump()
     
@@ -161,7 +265,7 @@ async def score_lead(lead: LeadData):
         lead_dict.pop("dataset_type")
     
     if "model_type" in lead_dict:
-        model_type = lead_dict.pop("model_type")
+        model_type = lead_dict.pop("model_type") or "random_forest"
     else:
         model_type = "random_forest"
     
@@ -180,67 +284,234 @@ async def score_lead(lead: LeadData):
             lead_dict["cons_price_idx"] = lead_dict["cons.price.idx"]
             lead_dict["cons_conf_idx"] = lead_dict["cons.conf.idx"]
             lead_dict["nr_employed"] = lead_dict["nr.employed"]
-        
-        print(f"Reformatted lead data: {lead_dict}")
     except KeyError as e:
         print(f"Field name conversion error: {str(e)}")
         # Fields might already be in the expected format
         pass
     
+    return lead_dict, model_type
+
+def _record_scored(lead: LeadData, result: Dict[str, Any], model_label: str):
+    """Queue a scored lead for the lead store; returns right away"""
+    if LEAD_STORE_ENABLED:
+        dataset_type, model_type = model_label.split(":", 1)
+        lead_store.record(lead.model_dump(exclude_none=True), result, dataset_type, model_type,
+                          model_registry.active_version(model_label))
+
+def _featureless_leads(model, lead_dicts: List[Dict[str, Any]]):
+    """Positions of the leads without a value for any of the model's feature columns
+
+    Such a lead would be scored from imputed values only, so every one of
+    them gets the same score; it's rejected rather than scored.
+    """
+    featureless = []
+    for i, lead_dict in enumerate(lead_dicts):
+        values = model.canonical_features(lead_dict)
+        if values is not None and all(value is None or value != value for value in values):
+            featureless.append(i)
+    return featureless
+
+def _featureless_detail(model, model_label: str, positions=None):
+    columns = list(model.cat_cols or []) + list(model.num_cols or [])
+    expected = ", ".join(f"'{column}'" for column in columns[:5])
+    leads = "Lead has" if positions is None else f"Leads {positions} have"
+    return f"{leads} no value for any feature of {model_label}; expected fields such as {expected}"
+
+def _loaded_member(dataset_type: str):
+    """A loaded ensemble member; members share their dataset's feature columns"""
+    return next((model for model in map(model_registry.get, _ensemble_members(dataset_type)) if model is not None),
+                None)
+
+def _reject_featureless(model, model_label: str, indices: List[int], lead_dicts: List[Dict[str, Any]],
+                        results: List[Optional[Dict[str, Any]]], dataset_type: str):
+    """Give the featureless leads of a /score-batch group an error result
+
+    Returns:
+        The positions of the group's other leads, which are scored
+    """
+    featureless = set(_featureless_leads(model, [lead_dicts[i] for i in indices]))
+    if not featureless:
+        return indices
+    record_fallback(SCORE_BATCH_ENDPOINT, "no_features")
+    error = _featureless_detail(model, model_label)
+    for position in featureless:
+        results[indices[position]] = {
+            "score": 50, "probability": 0.5, "status": "warm", "dataset_type": dataset_type, "error": error
+        }
+    return [i for position, i in enumerate(indices) if position not in featureless]
+
+async def _select_model(dataset_type: str, model_type: str):
+    """Pick the model for a dataset/model type, loading or training it on demand
+
+    Returns:
+        Tuple of (selected_model, dataset_type, error_message). dataset_type is
+        switched to "bank" when the requested model could not be made available.
+
+    Raises:
+        ModelTrainingPending: If the model is being trained in the background
+    """
     error_message = None
+    model_label = _model_label(dataset_type, model_type)
+    selected_model = model_registry.get(model_label)
     
-    # If models are not loaded, try loading them again
-    if lead_scoring_model is None and dataset_type == "lead_scoring":
+    # Lead scoring models are loaded or trained on demand
+    if selected_model is None and dataset_type == "lead_scoring":
         try:
-            lead_scoring_model = LeadScoringModel('lead_scoring')
-            lead_model_path = os.path.join(data_dir, 'lead_scoring_custom_model.pkl')
-            if os.path.exists(lead_model_path):
-                lead_scoring_model.load_model(lead_model_path)
-                print(f"Loaded lead scoring model on demand from {lead_model_path}")
-            else:
-                print("Training new lead scoring model on demand...")
-                lead_scoring_model.train()
-                lead_scoring_model.save_model('lead_scoring_custom_model.pkl')
+            selected_model = await _load_or_train(model_label)
+        except ModelTrainingPending:
+            raise
         except Exception as e:
-            error_message = f"Failed to load or train lead scoring model: {str(e)}"
+            error_message = f"Model {model_label} not trained or loaded: {str(e)}"
             print(f"ERROR: {error_message}")
+            dataset_type = "bank"
     
-    # Choose appropriate model based on dataset_type
-    if dataset_type == "lead_scoring":
-        if model_type.lower() == "transformer":
-            if lead_scoring_tabnet_model is None:
-                try:
-                    print("Creating and training new TabNet transformer model...")
-                    lead_scoring_tabnet_model = TabNetLeadScoringModel()
-                    lead_scoring_tabnet_model.train()
-                    print("TabNet model created and trained successfully")
-                except Exception as e:
-                    error_msg = f"TabNet model not trained or loaded: {str(e)}"
-                    print(f"ERROR: {error_msg}")
-                    dataset_type = "bank"
-                    error_message = error_msg
-            selected_model = lead_scoring_tabnet_model
-        else:
-            if lead_scoring_model is None:
-                try:
-                    print("Creating and training new lead scoring model...")
-                    lead_scoring_model = LeadScoringModel('lead_scoring')
-                    lead_scoring_model.train()
-                    lead_scoring_model.save_model('lead_scoring_custom_model.pkl')
-                    print("Lead scoring model created and trained successfully")
-                except Exception as e:
-                    error_msg = f"Model not trained or loaded: {str(e)}"
-                    print(f"ERROR: {error_msg}")
-                    dataset_type = "bank"
-                    error_message = error_msg
-            selected_model = lead_scoring_model
+    return selected_model, dataset_type, error_message
+
+async def _predict_with(model_label: str, lead_dicts: List[Dict[str, Any]], calibrate: bool,
+                        load_missing: bool = False):
+    """Score leads with one model
+
+    A single lead goes through the model's micro-batcher like /score, a
+    list through one predict_batch call. A calibration failure leaves the
+    scores usable, only without calibrated probabilities.
+
+    Raises:
+        LookupError: If the model isn't active and load_missing is false
+    """
+    model = model_registry.get(model_label)
+    if model is None and load_missing:
+        model = await _load_or_train(model_label)
+    if model is None:
+        raise LookupError("not loaded")
+    if len(lead_dicts) == 1:
+        results = [await get_batcher(model_label).submit(model, lead_dicts[0])]
     else:
-        # Use bank model
-        selected_model = lead_scoring_model_bank
+        results = await inference_executor.run(model.predict_batch, lead_dicts)
+    outcome = {"results": results, "calibrated": None}
+    if calibrate:
+        try:
+            calibrator = await inference_executor.run(get_calibrator, model_label, model)
+            outcome["calibrated"] = calibrator.transform([result['probability'] for result in results])
+        except Exception as e:
+            outcome["calibration_error"] = str(e)
+    return outcome
+
+async def _fan_out(model_labels, lead_dicts: List[Dict[str, Any]], calibrate=(), load_missing=()):
+    """Score leads with several models concurrently, each within MODEL_FANOUT_TIMEOUT_MS
+
+    A model that fails or runs out of time is reported without holding back
+    the others; its work carries on in the background, so it is warm for
+    later requests. Models that aren't active are reported as not loaded
+    right away, unless they are in load_missing.
+
+    Args:
+        model_labels: Models to score with
+        lead_dicts: Leads, as passed to predict_batch
+        calibrate: Labels of the models whose probabilities are also calibrated
+        load_missing: Labels of the models loaded on demand, like /score does; one that
+            has to be trained first is reported with the training job
+
+    Returns:
+        Dict of model label -> {"results", "calibrated", "latency_ms"}, or
+        {"error"} for models that failed or timed out
+    """
+    timeout_ms = MODEL_FANOUT_TIMEOUT_MS
+
+    async def timed(model_label):
+        start = time.perf_counter()
+        try:
+            outcome = await asyncio.wait_for(
+                _predict_with(model_label, lead_dicts, model_label in calibrate, model_label in load_missing),
+                timeout_ms / 1000)
+        except asyncio.TimeoutError:
+            return {"error": f"timed out after {timeout_ms:.0f} ms"}
+        except ModelTrainingPending as e:
+            return {"error": e.detail["message"]}
+        except Exception as e:
+            return {"error": str(e)}
+        outcome["latency_ms"] = (time.perf_counter() - start) * 1000
+        return outcome
+
+    outcomes = await asyncio.gather(*(timed(model_label) for model_label in model_labels))
+    return dict(zip(model_labels, outcomes))
+
+def _ensemble_members(dataset_type: str):
+    return ENSEMBLE_MEMBERS["lead_scoring" if dataset_type == "lead_scoring" else "bank"]
+
+def _ensemble_loaded_on_demand(dataset_type: str):
+    """Ensemble members loaded on demand; as in _select_model, only lead scoring models are"""
+    return _ensemble_members(dataset_type) if dataset_type == "lead_scoring" else ()
+
+def _ensemble_results(outcomes: Dict[str, Dict[str, Any]]):
+    """Combine the calibrated probabilities of the members that answered
+
+    Raises:
+        LookupError: If no member has calibrated probabilities
+    """
+    calibrated = {label: outcome["calibrated"] for label, outcome in outcomes.items()
+                  if outcome.get("calibrated") is not None}
+    if not calibrated:
+        errors = "; ".join(f"{label}: {outcome.get('error') or outcome.get('calibration_error')}"
+                           for label, outcome in outcomes.items())
+        raise LookupError(f"No ensemble member available ({errors})")
+    proba = combine_probabilities(calibrated)
+    results = format_results(np.column_stack([1.0 - proba, proba]), np.array([0, 1]))
+    for i, result in enumerate(results):
+        result['members'] = {label: float(probabilities[i]) for label, probabilities in calibrated.items()}
+    return results
+
+async def _score_ensemble(lead: LeadData, lead_dict: Dict[str, Any], dataset_type: str, request: Request,
+                          started_at: float):
+    """/score for the ensemble model_type: members are scored concurrently and combined"""
+    model_label = f"{dataset_type}:{ENSEMBLE_MODEL_TYPE}"
+    members = _ensemble_members(dataset_type)
+    member = _loaded_member(dataset_type)
+    if member is not None and _featureless_leads(member, [lead_dict]):
+        record_fallback(SCORE_ENDPOINT, "no_features")
+        mark_handler_end(request)
+        raise HTTPException(status_code=422, detail=_featureless_detail(member, model_label))
+    outcomes = await _fan_out(members, [lead_dict], calibrate=members,
+                              load_missing=_ensemble_loaded_on_demand(dataset_type))
+    try:
+        result = _ensemble_results(outcomes)[0]
+    except LookupError as e:
+        record_fallback(SCORE_ENDPOINT, "no_model")
+        log_event("score_fallback", sampled=False, model=model_label, reason="no_model", error=str(e))
+        mark_handler_end(request)
+        return ScoringResponse(score=50, probability=0.5, status="warm", dataset_type=dataset_type, error=str(e))
+
+    result['dataset_type'] = dataset_type
+    _record_scored(lead, result, model_label)
+    log_event("score", model=model_label, status=result['status'], score=result['score'],
+              probability=result['probability'], latency_ms=(time.perf_counter() - started_at) * 1000)
+    mark_handler_end(request)
+    return result
+
+@router.post("/score", response_model=ScoringResponse)
+async def score_lead(lead: LeadData, request: Request):
+    """Score a lead using the trained ML model"""
+    mark_handler_start(request)
+    started_at = time.perf_counter()
+    
+    # Determine which model to use
+    dataset_type = lead.dataset_type.lower() if lead.dataset_type else "bank"
+    requested_dataset_type = dataset_type  # Save the originally requested dataset type
+    
+    lead_dict, model_type = _prepare_lead_dict(lead)
+    model_label = _model_label(requested_dataset_type, model_type)
+    prepared_at = time.perf_counter()
+    record_stage("prepare", prepared_at - started_at)
+    if model_type.lower() == ENSEMBLE_MODEL_TYPE:
+        return await _score_ensemble(lead, lead_dict, requested_dataset_type, request, started_at)
+    
+    selected_model, dataset_type, error_message = await _select_model(dataset_type, model_type)
+    record_stage("select_model", time.perf_counter() - prepared_at)
     
     # Ensure we have a valid model to use
     if selected_model is None:
-        print("No valid model available, using default fallback")
+        record_fallback(SCORE_ENDPOINT, "no_model")
+        log_event("score_fallback", sampled=False, model=model_label, reason="no_model", error=error_message)
+        mark_handler_end(request)
         # Return a default score if no model is available
         return ScoringResponse(
             score=50,
@@ -249,11 +520,23 @@ async def score_lead(lead: LeadData):
             dataset_type=requested_dataset_type,
             error="No valid model available for scoring"
         )
+    if _featureless_leads(selected_model, [lead_dict]):
+        record_fallback(SCORE_ENDPOINT, "no_features")
+        mark_handler_end(request)
+        raise HTTPException(status_code=422, detail=_featureless_detail(selected_model, model_label))
     
     # Make prediction
     try:
-        # Make prediction with selected model
-        result = selected_model.predict(lead_dict)
+        # Serve repeated leads from the cache, otherwise predict with the
+        # selected model, coalesced with concurrent requests
+        lookup_start = time.perf_counter()
+        cache_key = prediction_cache.key(model_label, selected_model, lead_dict)
+        result = prediction_cache.get(cache_key)
+        record_stage("cache_lookup", time.perf_counter() - lookup_start)
+        if result is None:
+            batcher = get_batcher(model_label)
+            result = await batcher.submit(selected_model, lead_dict)
+            prediction_cache.put(cache_key, result)
         
         # Add dataset type information
         result['dataset_type'] = dataset_type
@@ -261,14 +544,21 @@ async def score_lead(lead: LeadData):
         # Add error message if we had to fall back
         if error_message and dataset_type != requested_dataset_type:
             result['error'] = error_message
-                
-        print(f"Prediction result: {result}")
-        print("----- END OF REQUEST -----\n")
+        else:
+            record_start = time.perf_counter()
+            _record_scored(lead, result, model_label)
+            record_stage("lead_store", time.perf_counter() - record_start)
+        
+        log_event("score", model=model_label, status=result['status'], score=result['score'],
+                  probability=result['probability'], latency_ms=(time.perf_counter() - started_at) * 1000)
+        mark_handler_end(request)
         return result
     except Exception as e:
         error_msg = f"Error scoring lead: {str(e)}"
-        print(f"ERROR: {error_msg}")
-        print("----- END OF REQUEST (WITH ERROR) -----\n")
+        record_error(SCORE_ENDPOINT, model_label)
+        record_fallback(SCORE_ENDPOINT, "prediction_error")
+        log_event("score_fallback", sampled=False, model=model_label, reason="prediction_error", error=error_msg)
+        mark_handler_end(request)
         return ScoringResponse(
             score=50,
             probability=0.5,
@@ -277,54 +567,476 @@ async def score_lead(lead: LeadData):
             error=error_msg
         )
 
-@router.get("/train", response_model=ModelMetricsResponse)
-async def train_model(dataset_type: str = "bank", model_type: str = "random_forest"):
-    """Train or retrain the lead scoring model"""
-    global lead_scoring_model, lead_scoring_model_bank, lead_scoring_tabnet_model
+@router.post("/score-batch", response_model=List[ScoringResponse])
+async def score_leads_batch(leads: List[LeadData], request: Request):
+    """Score many leads in one call, running one model pass per dataset/model type"""
+    mark_handler_start(request)
+    results: List[Optional[Dict[str, Any]]] = [None] * len(leads)
     
-    try:
-        if dataset_type.lower() == "lead_scoring":
-            if model_type == "transformer":
-                lead_scoring_tabnet_model = TabNetLeadScoringModel()
-                lead_scoring_tabnet_model.train()
-                metrics = lead_scoring_tabnet_model.metrics
-                metrics['dataset_type'] = 'lead_scoring'
-                return metrics
+    # Group leads by the model they need so each group is scored in one pass
+    groups: Dict[tuple, List[int]] = {}
+    lead_dicts = []
+    prepare_start = time.perf_counter()
+    for i, lead in enumerate(leads):
+        dataset_type = lead.dataset_type.lower() if lead.dataset_type else "bank"
+        lead_dict, model_type = _prepare_lead_dict(lead)
+        lead_dicts.append(lead_dict)
+        groups.setdefault((dataset_type, model_type.lower()), []).append(i)
+    record_stage("prepare", time.perf_counter() - prepare_start)
+    
+    for (requested_dataset_type, model_type), indices in groups.items():
+        if model_type == ENSEMBLE_MODEL_TYPE:
+            model_label = f"{requested_dataset_type}:{ENSEMBLE_MODEL_TYPE}"
+            members = _ensemble_members(requested_dataset_type)
+            member = _loaded_member(requested_dataset_type)
+            if member is not None:
+                indices = _reject_featureless(member, model_label, indices, lead_dicts, results,
+                                              requested_dataset_type)
+                if not indices:
+                    continue
+            outcomes = await _fan_out(members, [lead_dicts[i] for i in indices], calibrate=members,
+                                      load_missing=_ensemble_loaded_on_demand(requested_dataset_type))
+            try:
+                group_results = _ensemble_results(outcomes)
+            except LookupError as e:
+                record_fallback(SCORE_BATCH_ENDPOINT, "no_model")
+                group_results = [
+                    {"score": 50, "probability": 0.5, "status": "warm", "error": str(e)} for _ in indices
+                ]
+            for i, result in zip(indices, group_results):
+                result['dataset_type'] = requested_dataset_type
+                if 'error' not in result:
+                    _record_scored(leads[i], result, model_label)
+                results[i] = result
+            continue
+
+        selected_model, dataset_type, error_message = await _select_model(requested_dataset_type, model_type)
+        model_label = _model_label(requested_dataset_type, model_type)
+        
+        if selected_model is None:
+            record_fallback(SCORE_BATCH_ENDPOINT, "no_model")
+            fallback = {
+                "score": 50,
+                "probability": 0.5,
+                "status": "warm",
+                "dataset_type": requested_dataset_type,
+                "error": "No valid model available for scoring"
+            }
+            for i in indices:
+                results[i] = dict(fallback)
+            continue
+        indices = _reject_featureless(selected_model, model_label, indices, lead_dicts, results, dataset_type)
+        if not indices:
+            continue
+        
+        try:
+            timings = {}
+            group_results = await inference_executor.run(
+                selected_model.predict_batch, [lead_dicts[i] for i in indices], timings
+            )
+            observe_stages(SCORE_BATCH_ENDPOINT, model_label, timings)
+            record_stages(timings)
+            for i, result in zip(indices, group_results):
+                result['dataset_type'] = dataset_type
+                if error_message and dataset_type != requested_dataset_type:
+                    result['error'] = error_message
+                else:
+                    _record_scored(leads[i], result, model_label)
+                results[i] = result
+        except Exception as e:
+            error_msg = f"Error scoring lead: {str(e)}"
+            record_error(SCORE_BATCH_ENDPOINT, model_label)
+            record_fallback(SCORE_BATCH_ENDPOINT, "prediction_error")
+            log_event("score_batch_fallback", sampled=False, model=model_label, size=len(indices), error=error_msg)
+            for i in indices:
+                results[i] = {
+                    "score": 50,
+                    "probability": 0.5,
+                    "status": "warm",
+                    "dataset_type": requested_dataset_type,
+                    "error": error_msg
+                }
+    
+    mark_handler_end(request)
+    return results
+
+@router.post("/explain", response_model=Union[ExplanationResponse, List[ExplanationResponse]])
+async def explain_leads(leads: Union[List[LeadData], LeadData], request: Request, top: Optional[int] = None):
+    """Per-column contributions to the score of one lead or a list of leads
+
+    Contributions are exact TreeSHAP values of the random forest, computed
+    from its tree arrays in one vectorized pass per model; one-hot features
+    are reported as their original column. base_value plus a lead's
+    contributions is its probability. top keeps only the largest ones.
+    """
+    mark_handler_start(request)
+    single = isinstance(leads, LeadData)
+    if single:
+        leads = [leads]
+    if top is not None and top < 1:
+        raise HTTPException(status_code=400, detail="top must be positive")
+    results: List[Optional[Dict[str, Any]]] = [None] * len(leads)
+
+    groups: Dict[tuple, List[int]] = {}
+    lead_dicts = []
+    prepare_start = time.perf_counter()
+    for i, lead in enumerate(leads):
+        dataset_type = lead.dataset_type.lower() if lead.dataset_type else "bank"
+        lead_dict, model_type = _prepare_lead_dict(lead)
+        lead_dicts.append(lead_dict)
+        groups.setdefault((dataset_type, model_type.lower()), []).append(i)
+    record_stage("prepare", time.perf_counter() - prepare_start)
+
+    for (dataset_type, model_type), indices in groups.items():
+        model_label = _model_label(dataset_type, model_type)
+        selected_model, _, error_message = await _select_model(dataset_type, model_type)
+        if selected_model is None:
+            raise HTTPException(status_code=503, detail=error_message or f"Model {model_label} not available")
+        if not hasattr(selected_model, 'explain_batch'):
+            raise HTTPException(status_code=400, detail=f"Explanations are not available for {model_label}")
+        featureless = _featureless_leads(selected_model, [lead_dicts[i] for i in indices])
+        if featureless:
+            positions = None if single else [indices[position] for position in featureless]
+            raise HTTPException(status_code=422, detail=_featureless_detail(selected_model, model_label, positions))
+
+        timings = {}
+        try:
+            group_results = await inference_executor.run(
+                selected_model.explain_batch, [lead_dicts[i] for i in indices], timings
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            record_error(EXPLAIN_ENDPOINT, model_label)
+            log_event("explain_error", sampled=False, model=model_label, size=len(indices), error=str(e))
+            raise HTTPException(status_code=500, detail=f"Error explaining lead: {str(e)}")
+        observe_stages(EXPLAIN_ENDPOINT, model_label, timings)
+        record_stages(timings)
+
+        for i, result in zip(indices, group_results):
+            contributions = sorted(result['contributions'].items(), key=lambda item: abs(item[1]), reverse=True)
+            result['contributions'] = [
+                {"feature": feature, "contribution": contribution} for feature, contribution in contributions[:top]
+            ]
+            result['dataset_type'] = dataset_type
+            results[i] = result
+
+    mark_handler_end(request)
+    return results[0] if single else results
+
+class UploadStreamingResponse(StreamingResponse):
+    """StreamingResponse that can stream while the request body is still being read
+
+    The stock response listens for client disconnects by calling receive()
+    concurrently, which would steal body chunks from the endpoint reading the
+    upload. A disconnect still surfaces as a failed send.
+    """
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+@router.post("/score-file")
+async def score_file(
+    request: Request,
+    dataset_type: str = "lead_scoring",
+    model_type: str = "random_forest",
+    output_format: str = "ndjson",
+    batch_size: int = 1000,
+    id_column: Optional[str] = "Prospect ID"
+):
+    """Score an uploaded CSV or NDJSON lead export, streaming results back
+
+    The request body is consumed chunk by chunk and scored in batches of
+    batch_size rows, so neither the upload nor the results are held in memory.
+    The body is read as NDJSON when the content type says so, otherwise as CSV
+    with the same columns as the training data. Missing and unparseable
+    values are imputed like on /score; a line that isn't a JSON object gets
+    an error row and the stream goes on.
+    """
+    output_format = output_format.lower()
+    if output_format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail=f"Unknown output format: {output_format}")
+    if batch_size < 1:
+        raise HTTPException(status_code=400, detail="batch_size must be positive")
+    
+    dataset_type = dataset_type.lower()
+    selected_model, resolved_dataset_type, error_message = await _select_model(dataset_type, model_type)
+    if selected_model is None or resolved_dataset_type != dataset_type:
+        raise HTTPException(
+            status_code=503,
+            detail=error_message or f"No valid model available for {dataset_type} dataset"
+        )
+    
+    content_type = request.headers.get("content-type", "")
+    input_format = "ndjson" if ("ndjson" in content_type or "jsonl" in content_type) else "csv"
+    parser = RecordStreamParser(input_format, delimiter=";" if dataset_type == "bank" else ",")
+    processor = DataProcessor(dataset_type=dataset_type)
+    model_label = _model_label(dataset_type, model_type)
+    fields = ["row", id_column, "score", "probability", "status", "error"] if id_column else \
+        ["row", "score", "probability", "status", "error"]
+    
+    def score_rows(records, first_row):
+        """Score one batch of records and render it in the output format"""
+        # Lines that didn't parse and leads without any feature value get an
+        # error row without a score, so they can't pass for scored leads; the
+        # others are scored together
+        results: List[Optional[Dict[str, Any]]] = [None] * len(records)
+        inputs, positions = [], []
+        for position, record in enumerate(records):
+            if isinstance(record, InvalidRecord):
+                record_fallback(SCORE_FILE_ENDPOINT, "invalid_record")
+                results[position] = {"score": None, "probability": None, "status": None, "error": record.error}
             else:
-                lead_scoring_model = LeadScoringModel('lead_scoring')
-                lead_scoring_model.train()
-                lead_scoring_model.save_model('lead_scoring_custom_model.pkl')
-                metrics = lead_scoring_model.metrics
-                metrics['dataset_type'] = 'lead_scoring'
-                return metrics
+                inputs.append(processor.transform_input_data(record, dataset_type))
+                positions.append(position)
+        featureless = set(_featureless_leads(selected_model, inputs))
+        if featureless:
+            record_fallback(SCORE_FILE_ENDPOINT, "no_features")
+            error_msg = _featureless_detail(selected_model, model_label)
+            for i in featureless:
+                results[positions[i]] = {"score": None, "probability": None, "status": None, "error": error_msg}
+        scored = [i for i in range(len(inputs)) if i not in featureless]
+        timings = {}
+        try:
+            scored_results = selected_model.predict_batch([inputs[i] for i in scored], timings)
+        except Exception as e:
+            error_msg = f"Error scoring lead: {str(e)}"
+            record_error(SCORE_FILE_ENDPOINT, model_label)
+            record_fallback(SCORE_FILE_ENDPOINT, "prediction_error")
+            log_event("score_file_fallback", sampled=False, model=model_label, size=len(scored), error=error_msg)
+            scored_results = [
+                {"score": 50, "probability": 0.5, "status": "warm", "error": error_msg}
+                for _ in scored
+            ]
+        for i, result in zip(scored, scored_results):
+            results[positions[i]] = result
+        
+        serialize_start = time.perf_counter()
+        rows = []
+        for offset, (record, result) in enumerate(zip(records, results)):
+            row = {"row": first_row + offset}
+            if id_column:
+                row[id_column] = record.get(id_column) if isinstance(record, dict) else None
+            row.update(result)
+            rows.append(row)
+        
+        if output_format == "ndjson":
+            rendered = "".join(json.dumps(row) + "\n" for row in rows)
         else:
-            lead_scoring_model_bank = LeadScoringModel()
-            lead_scoring_model_bank.train()
-            lead_scoring_model_bank.save_model()
-            metrics = lead_scoring_model_bank.metrics
-            metrics['dataset_type'] = 'bank'
-            return metrics
+            out = io.StringIO()
+            csv.DictWriter(out, fieldnames=fields, extrasaction="ignore").writerows(rows)
+            rendered = out.getvalue()
+        timings["serialization"] = time.perf_counter() - serialize_start
+        observe_stages(SCORE_FILE_ENDPOINT, model_label, timings)
+        return rendered
+    
+    async def stream_results():
+        if output_format == "csv":
+            out = io.StringIO()
+            csv.writer(out).writerow(fields)
+            yield out.getvalue()
+        
+        pending = []
+        next_row = 0
+        async for chunk in request.stream():
+            pending.extend(parser.feed(chunk))
+            while len(pending) >= batch_size:
+                batch, pending = pending[:batch_size], pending[batch_size:]
+                yield await inference_executor.run(score_rows, batch, next_row)
+                next_row += len(batch)
+        pending.extend(parser.close())
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            yield await inference_executor.run(score_rows, batch, next_row)
+            next_row += len(batch)
+    
+    media_type = "application/x-ndjson" if output_format == "ndjson" else "text/csv"
+    return UploadStreamingResponse(stream_results(), media_type=media_type)
+
+@router.get("/train", response_model=ModelMetricsResponse)
+async def train_model(dataset_type: str = "bank", model_type: str = "random_forest"):
+    """Train or retrain the lead scoring model and wait for the result
+
+    This runs a training job like POST /train-jobs but holds the request open
+    until it finishes. Prefer POST /train-jobs and polling for long trainings.
+    """
+    dataset_type, model_label = _training_label(dataset_type, model_type)
+    try:
+        result = await submit_training(model_label).wait()
+        metrics = dict(result["metrics"])
+        metrics['dataset_type'] = dataset_type
+        return metrics
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error training model: {str(e)}")
 
+@router.post("/train-jobs", status_code=202)
+async def submit_training_job(dataset_type: str = "bank", model_type: str = "random_forest"):
+    """Start training a model in the background
+
+    Returns the job, whose status can be polled at GET /train-jobs/{job_id}.
+    If the model is already being trained, that job is returned instead.
+    """
+    _, model_label = _training_label(dataset_type, model_type)
+    return submit_training(model_label).describe()
+
+@router.post("/update-jobs", status_code=202)
+async def submit_update_job(records: List[Dict[str, Any]], dataset_type: str = "lead_scoring",
+                            model_type: str = "random_forest"):
+    """Update a random forest model with newly labeled leads in the background
+
+    The body is a list of leads with the training columns and the outcome
+    ('Converted', or 'y' for the bank dataset). New trees are fitted on
+    these leads only and replace the oldest ones, and a new model version
+    is published. Returns the job; poll it at GET /train-jobs/{job_id}.
+    """
+    _, model_label = _training_label(dataset_type, model_type)
+    if model_label not in UPDATABLE_MODELS:
+        raise HTTPException(status_code=400, detail=f"{model_label} can't be updated incrementally")
+    active_model = model_registry.get(model_label)
+    if active_model is not None:
+        # Reject unusable batches right away instead of in the job
+        try:
+            active_model.split_labels(records)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return submit_update(model_label, records).describe()
+
+@router.post("/search-jobs", status_code=202)
+async def submit_search_job(options: Optional[SearchRequest] = None, dataset_type: str = "lead_scoring",
+                            model_type: str = "random_forest"):
+    """Start a hyperparameter search in the background
+
+    Configurations are cross-validated with successive halving on a process
+    pool. The finished job's result lists each configuration's accuracy,
+    ROC-AUC, single-row and batch latency and model size, and the best one
+    meeting max_latency_ms. Poll it at GET /train-jobs/{job_id}.
+    """
+    dataset_type, model_label = _training_label(dataset_type, model_type)
+    options = (options or SearchRequest()).model_dump()
+    try:
+        # Reject bad options right away instead of in the job
+        HyperparameterSearch(*model_label.split(":", 1), **options)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return submit_search(model_label, options).describe()
+
+@router.post("/compact-jobs", status_code=202)
+async def submit_compaction_job(options: Optional[CompactionRequest] = None, dataset_type: str = "lead_scoring",
+                                model_type: str = "random_forest"):
+    """Compact a random forest model in the background
+
+    Trees are pruned to max_depth/max_leaves, trees that barely change the
+    ensemble output are dropped, and the serving engine stores thresholds
+    and leaf values in narrower types. The finished job's result compares
+    accuracy, ROC-AUC, artifact size, load time and latency with the
+    original. The compacted model is published as a new version unless it
+    loses more than max_roc_auc_drop ROC-AUC. Poll it at GET /train-jobs/{job_id}.
+    """
+    _, model_label = _training_label(dataset_type, model_type)
+    if model_label not in COMPACTABLE_MODELS:
+        raise HTTPException(status_code=400, detail=f"{model_label} can't be compacted")
+    options = (options or CompactionRequest()).model_dump()
+    max_roc_auc_drop = options.pop("max_roc_auc_drop")
+    # Reject bad options right away instead of in the job
+    for key in ("threshold_dtype", "value_dtype"):
+        if options[key] not in FLOAT_DTYPES:
+            raise HTTPException(status_code=400, detail=f"{key} must be one of {', '.join(FLOAT_DTYPES)}")
+    for key in ("max_depth", "max_leaves", "min_trees"):
+        if options[key] is not None and options[key] < 1:
+            raise HTTPException(status_code=400, detail=f"{key} must be at least 1")
+    return submit_compaction(model_label, options, max_roc_auc_drop).describe()
+
+@router.get("/train-jobs")
+async def list_training_jobs():
+    """List queued, running and recently finished training jobs"""
+    return [job.describe() for job in training_jobs.jobs()]
+
+@router.get("/train-jobs/{job_id}")
+async def get_training_job(job_id: str):
+    """Get the status, progress and final metrics of a training job"""
+    job = training_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Training job {job_id} not found")
+    return job.describe()
+
+@router.post("/train-jobs/{job_id}/cancel")
+async def cancel_training_job(job_id: str):
+    """Cancel a queued or running training job"""
+    try:
+        cancelled = training_jobs.cancel(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Training job {job_id} not found")
+    if not cancelled:
+        raise HTTPException(status_code=409, detail=f"Training job {job_id} has already finished")
+    return training_jobs.get(job_id).describe()
+
+@router.get("/models")
+async def get_models_info():
+    """List the active and stored versions of every model"""
+    return model_registry.describe()
+
+@router.post("/models/activate")
+async def activate_model_version(dataset_type: str, model_type: str = "random_forest", version: Optional[str] = None):
+    """Activate a stored model version, the latest one by default"""
+    model_label = _model_label(dataset_type.lower(), model_type)
+    try:
+        version = await inference_executor.run(model_registry.activate, model_label, version)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error activating model: {str(e)}")
+    return {"model": model_label, "active_version": version}
+
+@router.post("/models/rollback")
+async def rollback_model_version(dataset_type: str, model_type: str = "random_forest"):
+    """Re-activate the version that was active before the current one"""
+    model_label = _model_label(dataset_type.lower(), model_type)
+    try:
+        version = await inference_executor.run(model_registry.rollback, model_label)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error rolling back model: {str(e)}")
+    return {"model": model_label, "active_version": version}
+
+@router.get("/cache-stats")
+async def get_cache_stats():
+    """Get prediction cache size, hits, misses and evictions"""
+    return prediction_cache.stats()
+
+@router.get("/executor-stats")
+async def get_executor_stats():
+    """Get inference and training pool sizes, activity and queue depth"""
+    return executor_stats()
+
+@router.get("/batching-stats")
+async def get_batching_stats():
+    """Get micro-batching statistics (batch size and queue wait histograms) per model"""
+    return batching_stats()
+
 @router.get("/metrics", response_model=ModelMetricsResponse)
 async def get_model_metrics(dataset_type: str = "bank"):
     """Get the current model metrics"""
-    global lead_scoring_model, lead_scoring_model_bank
+    lead_scoring_model = model_registry.get(LEAD_MODEL_LABEL)
+    lead_scoring_model_bank = model_registry.get(BANK_MODEL_LABEL)
     
     if dataset_type.lower() == "lead_scoring" and lead_scoring_model is not None:
         if not hasattr(lead_scoring_model, 'metrics') or not lead_scoring_model.metrics:
             raise HTTPException(status_code=404, detail="Lead scoring model metrics not available")
-        metrics = lead_scoring_model.metrics
+        metrics = dict(lead_scoring_model.metrics)
         metrics['dataset_type'] = 'lead_scoring'
         return metrics
     else:
         if lead_scoring_model_bank is None or not hasattr(lead_scoring_model_bank, 'metrics') or not lead_scoring_model_bank.metrics:
             raise HTTPException(status_code=404, detail="Bank model metrics not available")
-        metrics = lead_scoring_model_bank.metrics
+        metrics = dict(lead_scoring_model_bank.metrics)
         metrics['dataset_type'] = 'bank'
         return metrics
 
+# Feature importance CSV path -> (modification time, records)
+_feature_importance_cache: Dict[str, tuple] = {}
+
 @router.get("/feature-importance", response_model=List[FeatureImportanceItem])
 async def get_feature_importance(dataset_type: str = "bank"):
     """Get the feature importance from the model"""
@@ -338,9 +1050,14 @@ async def get_feature_importance(dataset_type: str = "bank"):
         raise HTTPException(status_code=404, detail=f"Feature importance data not available for {dataset_type} dataset")
     
     try:
-        import pandas as pd
-        df = pd.read_csv(feature_importance_path)
-        return df.to_dict('records')
+        # The CSV only changes when a model is trained
+        modified = os.path.getmtime(feature_importance_path)
+        cached = _feature_importance_cache.get(feature_importance_path)
+        if cached is None or cached[0] != modified:
+            import pandas as pd
+            cached = (modified, pd.read_csv(feature_importance_path).to_dict('records'))
+            _feature_importance_cache[feature_importance_path] = cached
+        return cached[1]
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving feature importance: {str(e)}")
 
@@ -381,8 +1098,7 @@ async def compare_models_post(lead_data: Dict[str, Any]):
     return await compare_models_internal(lead_data)
 
 async def compare_models_internal(lead_data: Optional[Dict[str, Any]] = None):
-    """Compare predictions using both datasets"""
-    global lead_scoring_model, lead_scoring_model_bank
+    """Compare the predictions of every model and of the lead scoring ensemble"""
     
     # Use sample data if none provided
     if lead_data is None:
@@ -435,56 +1151,33 @@ async def compare_models_internal(lead_data: Optional[Dict[str, Any]] = None):
     results = {
         "lead_data": lead_data
     }
-    
-    # Bank model prediction
-    if lead_scoring_model_bank is None:
-        try:
-            print("Creating and training new bank model...")
-            lead_scoring_model_bank = LeadScoringModel()
-            lead_scoring_model_bank.train()
-            lead_scoring_model_bank.save_model()
-            print("Bank model created and trained successfully")
-        except Exception as e:
-            results["bank_model"] = {"error": f"Bank model not available: {str(e)}"}
-    
-    if lead_scoring_model_bank is not None:
-        try:
-            bank_result = lead_scoring_model_bank.predict(lead_data)
-            bank_result['dataset_type'] = 'bank'
-            results["bank_model"] = bank_result
-        except Exception as e:
-            results["bank_model"] = {"error": f"Bank model prediction error: {str(e)}"}
-    
-    # Lead scoring model prediction
-    if lead_scoring_model is None:
-        try:
-            lead_scoring_model_file = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'data', 'lead_scoring_custom_model.pkl')
-            
-            if os.path.exists(lead_scoring_model_file):
-                print(f"Loading existing lead scoring model from {lead_scoring_model_file}")
-                lead_scoring_model = LeadScoringModel('lead_scoring')
-                lead_scoring_model.load_model('lead_scoring_custom_model.pkl')
-            else:
-                print("Creating and training new lead scoring model...")
-                lead_scoring_model = LeadScoringModel('lead_scoring')
-                lead_scoring_model.train()
-                lead_scoring_model.save_model('lead_scoring_custom_model.pkl')
-                print("Lead scoring model created and trained successfully")
-        except Exception as e:
-            # Log the error but allow comparison to continue with bank model only
-            error_msg = f"Lead scoring model not available: {str(e)}"
-            print(error_msg)
-            results["lead_scoring_model"] = {"error": error_msg}
-            # Return early with what we have
-            return results
-    
-    if lead_scoring_model is not None:
-        try:
-            lead_result = lead_scoring_model.predict(lead_data)
-            lead_result['dataset_type'] = 'lead_scoring'
-            results["lead_scoring_model"] = lead_result
-        except Exception as e:
-            results["lead_scoring_model"] = {"error": f"Lead scoring model prediction error: {str(e)}"}
-    
+
+    # Every active model scores the lead at the same time, so the comparison
+    # takes about as long as the slowest model rather than the sum of all of
+    # them. Models that aren't loaded are reported as such; comparing never
+    # loads or trains one.
+    started_at = time.perf_counter()
+    ensemble_members = _ensemble_members("lead_scoring")
+    outcomes = await _fan_out(list(COMPARE_MODEL_KEYS), [lead_data], calibrate=ensemble_members)
+    for model_label, key in COMPARE_MODEL_KEYS.items():
+        outcome = outcomes[model_label]
+        if "error" in outcome:
+            results[key] = {"error": f"Model {model_label} not available: {outcome['error']}"}
+            continue
+        result = outcome["results"][0]
+        result['dataset_type'] = model_label.split(":", 1)[0]
+        if outcome["calibrated"] is not None:
+            result['calibrated_probability'] = float(outcome["calibrated"][0])
+        result['latency_ms'] = outcome["latency_ms"]
+        results[key] = result
+
+    try:
+        ensemble = _ensemble_results({label: outcomes[label] for label in ensemble_members})[0]
+        ensemble['dataset_type'] = 'lead_scoring'
+    except LookupError as e:
+        ensemble = {"error": str(e)}
+    results["ensemble"] = ensemble
+    results["latency_ms"] = (time.perf_counter() - started_at) * 1000
+
     # Return comparison
-    return results 
\ No newline at end of file
+    return results
\ No newline at end of file
@@ -0,0 +1,165 @@
+import asyncio
+import os
+import time
+
+from .executors import inference_executor
+from .telemetry import registry, observe_stages
+from .profiling import current_profile
+
+# Coalescing limits for concurrent /score requests, configurable per deployment
+SCORE_BATCH_MAX_SIZE = int(os.getenv("SCORE_BATCH_MAX_SIZE", "32"))
+SCORE_BATCH_MAX_WAIT_MS = float(os.getenv("SCORE_BATCH_MAX_WAIT_MS", "5"))
+
+BATCH_SIZE = registry.histogram(
+    "leadgen_batch_size", "Requests coalesced into one micro-batch", ["model"],
+    buckets=[1, 2, 4, 8, 16, 32, 64, 128, 256])
+QUEUE_WAIT = registry.histogram(
+    "leadgen_batch_queue_wait_seconds", "Time a request waited in the micro-batch queue", ["model"],
+    buckets=[0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1])
+
+class MicroBatcher:
+    """Coalesce concurrent predictions into one predict_batch call
+
+    Requests are queued and collected until max_batch_size items are waiting
+    or the first one has waited max_wait_ms, then scored together. While a
+    batch is running new requests keep queueing, so batches grow with load.
+    If a batch fails, its items are scored again one by one, so each caller
+    only gets the error of its own item.
+    """
+
+    def __init__(self, name, max_batch_size=SCORE_BATCH_MAX_SIZE, max_wait_ms=SCORE_BATCH_MAX_WAIT_MS):
+        """Initialize the batcher
+
+        Args:
+            name: Name used when reporting statistics
+            max_batch_size: Maximum number of items scored in one call
+            max_wait_ms: Maximum time the oldest item waits for a batch to fill
+        """
+        self.name = name
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_ms = max(0.0, float(max_wait_ms))
+        self.batch_size = BATCH_SIZE.labels(model=name)
+        self.queue_wait = QUEUE_WAIT.labels(model=name)
+        self._queue = None
+        self._loop = None
+        self._worker = None
+
+    def _ensure_worker(self):
+        """Start the worker on the running loop, restarting it if the loop changed"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+        return loop
+
+    async def submit(self, model, item):
+        """Queue one item for model.predict_batch and wait for its result"""
+        loop = self._ensure_worker()
+        future = loop.create_future()
+        # The worker runs outside the request's context, so the caller's
+        # profile travels with the item
+        await self._queue.put((model, item, future, time.perf_counter(), current_profile()))
+        return await future
+
+    def stats(self):
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batch_size": self.batch_size.snapshot(),
+            "queue_wait_seconds": self.queue_wait.snapshot()
+        }
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait_ms / 1000
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            await self._flush(batch)
+
+    async def _flush(self, batch):
+        now = time.perf_counter()
+        self.batch_size.observe(len(batch))
+        for _, _, _, enqueued_at, profile in batch:
+            self.queue_wait.observe(now - enqueued_at)
+            if profile is not None:
+                profile.add("queue_wait", now - enqueued_at)
+
+        # Normally one model per batcher, but a model swapped mid-batch is
+        # scored separately so each caller gets the model it selected
+        groups = {}
+        for model, item, future, _, profile in batch:
+            groups.setdefault(id(model), (model, []))[1].append((item, future, profile))
+
+        for model, entries in groups.values():
+            items = [item for item, _, _ in entries]
+            timings = {}
+            try:
+                results = await inference_executor.run(model.predict_batch, items, timings)
+                observe_stages("/api/ml-scoring/score", self.name, timings)
+                outcomes = [(result, None) for result in results]
+            except Exception as e:
+                if len(entries) == 1:
+                    outcomes = [(None, e)]
+                else:
+                    # One bad item must not fail the requests it was coalesced
+                    # with, so each item is scored again on its own
+                    timings = {}
+                    outcomes = await inference_executor.run(_predict_each, model, items)
+            for (_, future, profile), (result, error) in zip(entries, outcomes):
+                if profile is not None:
+                    # Model stages took this long for the whole batch
+                    for stage, seconds in timings.items():
+                        profile.add(stage, seconds)
+                    profile.notes["batch_size"] = len(entries)
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+def _predict_each(model, items):
+    """Score items one predict_batch call at a time
+
+    Returns:
+        List of (result, None) or (None, exception) per item
+    """
+    outcomes = []
+    for item in items:
+        try:
+            outcomes.append((model.predict_batch([item])[0], None))
+        except Exception as e:
+            outcomes.append((None, e))
+    return outcomes
+
+# One batcher per model label ("<dataset_type>:<model_type>")
+_batchers = {}
+
+def get_batcher(model_label):
+    """Get or create the batcher for a model label"""
+    if model_label not in _batchers:
+        _batchers[model_label] = MicroBatcher(model_label)
+    return _batchers[model_label]
+
+def batching_stats():
+    """Statistics for all batchers, keyed by model label"""
+    return {key: batcher.stats() for key, batcher in _batchers.items()}
+
+registry.gauge_callback(
+    "leadgen_batch_queue_depth", "Requests waiting in the micro-batch queue",
+    lambda: [({"model": key}, batcher.stats()["queue_depth"]) for key, batcher in _batchers.items()])
@@ -0,0 +1,105 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from .telemetry import registry
+from .training_jobs import training_jobs
+
+# Pool sizes, configurable per deployment. sklearn and torch release the GIL
+# for most of their numeric work, so a few inference threads scale well.
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", str(min(4, os.cpu_count() or 1))))
+# SQLite reads of the lead store get their own threads, so listing leads
+# never queues behind or delays model inference
+LEAD_STORE_READERS = int(os.getenv("LEAD_STORE_READERS", "2"))
+
+class BoundedExecutor:
+    """Run blocking calls on a fixed-size pool without blocking the event loop
+
+    Tracks calls in flight so queue depth can be reported. Pools are FIFO, so
+    anything beyond max_workers in flight is waiting in the queue.
+    """
+
+    def __init__(self, name, max_workers, processes=False):
+        """Initialize the executor
+
+        Args:
+            name: Name used when reporting statistics
+            max_workers: Number of threads or processes in the pool
+            processes: Use a process pool instead of a thread pool
+        """
+        self.name = name
+        self.max_workers = max(1, int(max_workers))
+        self.processes = processes
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            if self.processes:
+                # spawn rather than fork: forking a process that has torch and
+                # its thread pools loaded is unsafe
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix=self.name
+                )
+        return self._pool
+
+    async def run(self, fn, *args):
+        """Run fn(*args) on the pool and await its result"""
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        try:
+            result = await loop.run_in_executor(self._get_pool(), fn, *args)
+            self.completed += 1
+            return result
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+    def stats(self):
+        return {
+            "kind": "process" if self.processes else "thread",
+            "max_workers": self.max_workers,
+            "active": min(self.in_flight, self.max_workers),
+            "queue_depth": max(0, self.in_flight - self.max_workers),
+            "completed": self.completed,
+            "failed": self.failed
+        }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+inference_executor = BoundedExecutor("inference", INFERENCE_WORKERS)
+lead_store_executor = BoundedExecutor("lead_store", LEAD_STORE_READERS)
+
+def executor_stats():
+    """Statistics for the inference and lead store pools and the training job processes"""
+    return {
+        "inference": inference_executor.stats(),
+        "lead_store": lead_store_executor.stats(),
+        "training": training_jobs.stats()
+    }
+
+registry.gauge_callback(
+    "leadgen_executor_in_flight", "Calls submitted to a pool and not yet finished",
+    lambda: [({"pool": name}, stats["active"] + stats["queue_depth"]) for name, stats in executor_stats().items()])
+registry.gauge_callback(
+    "leadgen_executor_queue_depth", "Calls waiting for a free pool worker",
+    lambda: [({"pool": name}, stats["queue_depth"]) for name, stats in executor_stats().items()])
+
+def shutdown_executors():
+    inference_executor.shutdown()
+    lead_store_executor.shutdown()
+    training_jobs.shutdown()
@@ -0,0 +1,306 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from .telemetry import log_event, registry
+
+_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'data')
+
+# Persist scored leads; 0 turns the store off
+LEAD_STORE_ENABLED = os.getenv("LEAD_STORE", "1") != "0"
+# SQLite database holding the scored leads
+LEAD_STORE_PATH = os.getenv("LEAD_STORE_PATH", os.path.join(_DATA_DIR, 'leads.db'))
+# Most leads written in one transaction
+LEAD_STORE_BATCH_SIZE = int(os.getenv("LEAD_STORE_BATCH_SIZE", "500"))
+# Longest time a scored lead waits before its batch is written
+LEAD_STORE_FLUSH_MS = float(os.getenv("LEAD_STORE_FLUSH_MS", "200"))
+# Leads waiting to be written; beyond this new leads are dropped, not waited on
+LEAD_STORE_QUEUE_SIZE = int(os.getenv("LEAD_STORE_QUEUE_SIZE", "100000"))
+
+# Page size limit of query()
+MAX_PAGE_SIZE = 500
+
+LEAD_FIELDS = ('name', 'email', 'company', 'source')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leads (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    name TEXT,
+    email TEXT,
+    company TEXT,
+    source TEXT,
+    dataset_type TEXT NOT NULL,
+    model_type TEXT NOT NULL,
+    model_version TEXT,
+    score INTEGER NOT NULL,
+    probability REAL NOT NULL,
+    status TEXT NOT NULL,
+    data TEXT
+);
+-- Pages are ordered by (created_at, id), the implicit tail of every index, so
+-- a page with an equality filter and/or a date range is one index range scan
+CREATE INDEX IF NOT EXISTS leads_created_at ON leads (created_at);
+CREATE INDEX IF NOT EXISTS leads_status ON leads (status, created_at);
+CREATE INDEX IF NOT EXISTS leads_source ON leads (source, created_at);
+CREATE INDEX IF NOT EXISTS leads_model_type ON leads (model_type, created_at);
+-- A narrow score range is a range scan here plus a sort of just its matches
+CREATE INDEX IF NOT EXISTS leads_score ON leads (score, created_at);
+"""
+
+# Most leads in a score range that are read through leads_score and sorted
+SCORE_INDEX_MAX_ROWS = 5000
+# Leads walked by date in the time one lead is looked up through leads_score and sorted
+SCORE_INDEX_ROW_COST = 8
+
+LEADS_WRITTEN = registry.counter(
+    "leadgen_lead_store_writes_total", "Scored leads written to or dropped by the lead store", ["outcome"])
+
+class LeadStore:
+    """Scored leads in a local SQLite database, written in batches
+
+    record() only appends to an in-memory queue; a writer thread drains it
+    and inserts up to batch_size leads per transaction, so scoring requests
+    never wait on disk. The database runs in WAL mode, so queries read
+    while the writer writes, also from other worker processes.
+
+    Leads are listed newest first with keyset pagination: a page ends with
+    a cursor (the last lead's created_at and id), and the next page starts
+    below it, which costs the same on the millionth page as on the first.
+    A narrow score range is read through leads_score and its matches are
+    sorted; a wide one walks the leads newest first until a page matches.
+    SQLite's planner can't tell the two apart without STAT4 statistics, so
+    a capped count over leads_score decides which reads fewer rows.
+    """
+
+    def __init__(self, path=LEAD_STORE_PATH, batch_size=LEAD_STORE_BATCH_SIZE,
+                 flush_ms=LEAD_STORE_FLUSH_MS, queue_size=LEAD_STORE_QUEUE_SIZE):
+        """Initialize the store; the database is opened on first use
+
+        Args:
+            path: SQLite database file
+            batch_size: Most leads written in one transaction
+            flush_ms: Longest time a lead waits before its batch is written
+            queue_size: Leads allowed to wait for the writer
+        """
+        self.path = path
+        self.batch_size = max(1, int(batch_size))
+        self.flush_seconds = flush_ms / 1000.0
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._writer = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._initialized = False
+
+    def record(self, lead, result, dataset_type, model_type, model_version=None):
+        """Queue a scored lead for writing
+
+        Args:
+            lead: The lead dict that was scored
+            result: The model result with score, probability and status
+            dataset_type: Dataset type of the model that scored it
+            model_type: Model type that scored it
+            model_version: Active registry version of that model
+        """
+        row = (
+            time.time(),
+            *(lead.get(field) for field in LEAD_FIELDS),
+            dataset_type,
+            model_type,
+            model_version,
+            int(result['score']),
+            float(result['probability']),
+            result['status'],
+            json.dumps(lead, default=str)
+        )
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            LEADS_WRITTEN.inc(outcome="dropped")
+
+    def query(self, status=None, min_score=None, max_score=None, source=None,
+              since=None, until=None, model_type=None, limit=50, cursor=None):
+        """One page of stored leads, newest first
+
+        Args:
+            status: Only leads with this status ('hot', 'warm', ...)
+            min_score: Lowest score included
+            max_score: Highest score included
+            source: Only leads from this source
+            since: Unix time of the oldest lead included
+            until: Unix time after which leads are excluded
+            model_type: Only leads scored by this model type
+            limit: Page size, at most MAX_PAGE_SIZE
+            cursor: next_cursor of the previous page
+
+        Returns:
+            Dict with the leads and the next_cursor, None on the last page
+
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        # Unary + keeps SQLite from range-scanning a wide score range and then
+        # sorting all of it by date
+        by_score = (min_score is not None or max_score is not None) and \
+            self._narrow_score_range(min_score, max_score, limit)
+        score = "score" if by_score else "+score"
+        clauses, params = [], []
+        for clause, value in (("status = ?", status), (f"{score} >= ?", min_score), (f"{score} <= ?", max_score),
+                              ("source = ?", source), ("created_at >= ?", since), ("created_at < ?", until),
+                              ("model_type = ?", model_type)):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        if cursor is not None:
+            created_at, lead_id = self._parse_cursor(cursor)
+            clauses.append("(created_at, id) < (?, ?)")
+            params.extend([created_at, lead_id])
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        table = "leads INDEXED BY leads_score" if by_score else "leads"
+        sql = f"SELECT * FROM {table} {where} ORDER BY created_at DESC, id DESC LIMIT ?"
+
+        rows = self._connection().execute(sql, params + [limit + 1]).fetchall()
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = f"{last['created_at']!r}:{last['id']}"
+        return {
+            "leads": [self._row_to_dict(row) for row in rows[:limit]],
+            "next_cursor": next_cursor
+        }
+
+    def get(self, lead_id):
+        """A stored lead by id, or None"""
+        row = self._connection().execute("SELECT * FROM leads WHERE id = ?", (lead_id,)).fetchone()
+        return self._row_to_dict(row) if row is not None else None
+
+    def flush(self, timeout=5.0):
+        """Wait until queued leads are written, at most timeout seconds"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches
+        }
+
+    def shutdown(self):
+        """Write the queued leads and stop the writer thread"""
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join(timeout=10)
+        self._writer = None
+
+    def _ensure_writer(self):
+        if self._writer is not None and self._writer.is_alive():
+            return
+        with self._lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, name="lead-store-writer", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        connection = self._connection()
+        while True:
+            row = self._queue.get()
+            if row is None:
+                self._queue.task_done()
+                return
+            batch = [row]
+            stop = False
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                try:
+                    row = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if row is None:
+                    stop = True
+                    break
+                batch.append(row)
+            try:
+                with connection:
+                    connection.executemany(
+                        "INSERT INTO leads (created_at, name, email, company, source, dataset_type, model_type, "
+                        "model_version, score, probability, status, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        batch
+                    )
+                self.written += len(batch)
+                self.batches += 1
+                LEADS_WRITTEN.inc(len(batch), outcome="written")
+            except sqlite3.Error as e:
+                self.dropped += len(batch)
+                LEADS_WRITTEN.inc(len(batch), outcome="dropped")
+                log_event("lead_store_write_failed", sampled=False, size=len(batch), error=str(e))
+            for _ in range(len(batch) + stop):
+                self._queue.task_done()
+            if stop:
+                return
+
+    def _connection(self):
+        """This thread's connection, opened and set up on first use"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            # WAL with NORMAL sync loses at most the last batches on power loss, never corrupts
+            connection.execute("PRAGMA synchronous=NORMAL")
+            with self._lock:
+                if not self._initialized:
+                    connection.executescript(SCHEMA)
+                    self._initialized = True
+            self._local.connection = connection
+        return connection
+
+    def _narrow_score_range(self, min_score, max_score, limit):
+        """Whether reading a page through leads_score is cheaper than walking by date
+
+        Reading through leads_score looks up every lead in the range; walking
+        by date reads about limit * total / matches leads before a page matches.
+        """
+        low = min_score if min_score is not None else -2 ** 63
+        high = max_score if max_score is not None else 2 ** 63 - 1
+        connection = self._connection()
+        # Counts on the covering index and stops just past the cap
+        matches = connection.execute(
+            "SELECT count(*) FROM (SELECT 1 FROM leads INDEXED BY leads_score WHERE score BETWEEN ? AND ? LIMIT ?)",
+            (low, high, SCORE_INDEX_MAX_ROWS + 1)
+        ).fetchone()[0]
+        if matches > SCORE_INDEX_MAX_ROWS:
+            return False
+        # Ids only grow, so the largest is a free estimate of the total
+        total = connection.execute("SELECT max(id) FROM leads").fetchone()[0] or 0
+        return matches * matches * SCORE_INDEX_ROW_COST <= (limit + 1) * total
+
+    @staticmethod
+    def _parse_cursor(cursor):
+        try:
+            created_at, lead_id = cursor.split(":")
+            return float(created_at), int(lead_id)
+        except (AttributeError, ValueError):
+            raise ValueError(f"Invalid cursor: {cursor}")
+
+    @staticmethod
+    def _row_to_dict(row):
+        lead = dict(row)
+        lead["created_at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(lead["created_at"]))
+        lead["data"] = json.loads(lead["data"]) if lead["data"] else None
+        return lead
+
+lead_store = LeadStore()
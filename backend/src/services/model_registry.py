@@ -0,0 +1,317 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from .prediction_cache import prediction_cache
+from .telemetry import log_event, record_model_load
+
+_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'data')
+
+# Directory holding the versioned model artifacts
+MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", os.path.join(_DATA_DIR, 'models'))
+# Seconds between scans for new artifact versions, 0 disables the watcher
+MODEL_WATCH_INTERVAL_SECONDS = float(os.getenv("MODEL_WATCH_INTERVAL_SECONDS", "10"))
+# Versions kept on disk per model; the active and previous versions are never pruned
+MODEL_REGISTRY_KEEP_VERSIONS = int(os.getenv("MODEL_REGISTRY_KEEP_VERSIONS", "5"))
+
+MANIFEST_FILENAME = 'manifest.json'
+
+class ModelVersion:
+    """One loaded, immutable model version"""
+
+    def __init__(self, label, version, model, manifest):
+        self.label = label
+        self.version = version
+        self.model = model
+        self.manifest = manifest
+        self.activated_at = time.time()
+
+    def describe(self):
+        return {
+            "version": self.version,
+            "created_at": self.manifest.get("created_at"),
+            "source": self.manifest.get("source"),
+            "activated_at": self.activated_at,
+            "metrics": self.manifest.get("metrics")
+        }
+
+class ModelRegistry:
+    """Versioned model artifacts on disk with one active version per model
+
+    Each model label ("lead_scoring:random_forest", ...) maps to a directory
+    <root>/<dataset_type>/<model_type>/ holding one sub-directory per version.
+    A version directory contains the model artifact and a manifest.json and is
+    never modified after it is published. Versions sort by name, so new
+    version names must sort after older ones (the default names start with a
+    UTC timestamp).
+
+    Readers get the active model with get(). A new version is loaded and
+    warmed up before the active reference is swapped, so requests only ever
+    see fully initialized models. A watcher thread picks up version
+    directories written by other processes, e.g. an offline trainer. Such a
+    trainer should write the directory under a name starting with "." and
+    rename it when complete, or write manifest.json last.
+    """
+
+    def __init__(self, root_dir=MODEL_REGISTRY_DIR, keep_versions=MODEL_REGISTRY_KEEP_VERSIONS):
+        """Initialize the registry
+
+        Args:
+            root_dir: Directory holding the versioned artifacts
+            keep_versions: Versions kept on disk per model when a version is
+                activated. Only the process serving a model knows its active
+                and previous versions, so only activating prunes; a process
+                that publishes without activating, like a training job,
+                never deletes anything.
+        """
+        self.root_dir = root_dir
+        self.keep_versions = keep_versions
+        self._kinds = {}
+        self._active = {}
+        self._previous = {}
+        self._seen = {}
+        self._lock = threading.RLock()
+        self._watcher = None
+        self._stop_watching = threading.Event()
+
+    def register(self, label, artifact_filename, loader):
+        """Declare how versions of a model are stored and loaded
+
+        Args:
+            label: Model label, "<dataset_type>:<model_type>"
+            artifact_filename: File name of the artifact inside a version directory
+            loader: Function taking the artifact path and returning the model
+        """
+        self._kinds[label] = (artifact_filename, loader)
+
+    def get(self, label):
+        """The active model for a label, or None"""
+        active = self._active.get(label)
+        return active.model if active is not None else None
+
+    def active_version(self, label):
+        active = self._active.get(label)
+        return active.version if active is not None else None
+
+    def versions(self, label):
+        """Published versions of a model on disk, oldest first"""
+        label_dir = self._label_dir(label)
+        if not os.path.isdir(label_dir):
+            return []
+        return sorted(
+            name for name in os.listdir(label_dir)
+            if not name.startswith('.') and os.path.exists(os.path.join(label_dir, name, MANIFEST_FILENAME))
+        )
+
+    def latest_version(self, label):
+        versions = self.versions(label)
+        return versions[-1] if versions else None
+
+    def publish(self, label, model, source="train", activate=True):
+        """Save a model as a new version and optionally make it active
+
+        The version is written to a hidden staging directory and renamed into
+        place, so the watcher never sees a partial version.
+
+        Args:
+            label: Registered model label
+            model: Trained model with a save_model(path) method
+            source: Where the model came from ('train', 'import', ...)
+            activate: Warm up the model and swap it in after saving
+
+        Returns:
+            The new version name
+        """
+        artifact_filename, _ = self._kinds[label]
+        label_dir = self._label_dir(label)
+        version = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime()) + "-" + uuid.uuid4().hex[:8]
+        staging_dir = os.path.join(label_dir, f".{version}.tmp")
+        os.makedirs(staging_dir)
+        try:
+            model.save_model(os.path.join(staging_dir, artifact_filename))
+            manifest = {
+                "label": label,
+                "version": version,
+                "artifact": artifact_filename,
+                "created_at": time.time(),
+                "source": source,
+                "metrics": getattr(model, 'metrics', None)
+            }
+            with open(os.path.join(staging_dir, MANIFEST_FILENAME), 'w') as f:
+                json.dump(manifest, f, default=float)
+            os.rename(staging_dir, os.path.join(label_dir, version))
+        except Exception:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+
+        with self._lock:
+            self._seen.setdefault(label, set()).add(version)
+        print(f"Published {label} version {version}")
+        if activate:
+            self._swap(ModelVersion(label, version, model, manifest), source)
+        return version
+
+    def activate(self, label, version=None, source="load"):
+        """Load a stored version, warm it up and make it active
+
+        Args:
+            label: Registered model label
+            version: Version to activate, defaults to the latest one
+
+        Returns:
+            The activated version name
+        """
+        version = version or self.latest_version(label)
+        if version is None:
+            raise FileNotFoundError(f"No published versions for {label}")
+        with self._lock:
+            self._seen.setdefault(label, set()).add(version)
+            active = self._active.get(label)
+        if active is not None and active.version == version:
+            return version
+
+        model, manifest = self.load(label, version)
+        self._swap(ModelVersion(label, version, model, manifest), source)
+        return version
+
+    def load(self, label, version):
+        """Load a stored version without activating it
+
+        Returns:
+            Tuple of (model, manifest)
+        """
+        artifact_filename, loader = self._kinds[label]
+        version_dir = os.path.join(self._label_dir(label), version)
+        with open(os.path.join(version_dir, MANIFEST_FILENAME), 'r') as f:
+            manifest = json.load(f)
+        return loader(os.path.join(version_dir, manifest.get("artifact", artifact_filename))), manifest
+
+    def rollback(self, label):
+        """Re-activate the version that was active before the current one"""
+        with self._lock:
+            previous = self._previous.get(label)
+        if previous is None:
+            raise ValueError(f"No previous version of {label} to roll back to")
+        return self.activate(label, previous, source="rollback")
+
+    def load_active(self, labels=None):
+        """Activate the latest stored version of models with no active version
+
+        Independent models are loaded and warmed up concurrently.
+
+        Args:
+            labels: Models to load, defaults to all registered models
+        """
+        labels = [
+            label for label in (labels or list(self._kinds))
+            if label in self._kinds and self.get(label) is None and self.latest_version(label) is not None
+        ]
+        if not labels:
+            return
+
+        def load(label):
+            try:
+                self.activate(label)
+            except Exception as e:
+                print(f"Error loading {label} from the model registry: {str(e)}")
+
+        with ThreadPoolExecutor(max_workers=len(labels), thread_name_prefix="model-load") as pool:
+            list(pool.map(load, labels))
+
+    def scan(self):
+        """Activate versions that appeared on disk since the last scan
+
+        Versions the registry has already seen are ignored, so a rollback or
+        an explicit activation stays in place until a new version arrives.
+        """
+        for label in list(self._kinds):
+            versions = self.versions(label)
+            with self._lock:
+                seen = self._seen.setdefault(label, set())
+                new_versions = [v for v in versions if v not in seen]
+                active = self.active_version(label)
+            if not new_versions:
+                continue
+            newest = new_versions[-1]
+            with self._lock:
+                seen.update(new_versions)
+            if active is not None and newest <= active:
+                continue
+            try:
+                self.activate(label, newest, source="watch")
+            except Exception as e:
+                log_event("model_activation_failed", sampled=False, model=label, version=newest, error=str(e))
+                print(f"Error activating {label} version {newest}: {str(e)}")
+
+    def start_watching(self, interval=MODEL_WATCH_INTERVAL_SECONDS):
+        """Scan for new versions every interval seconds in a background thread"""
+        if interval <= 0 or (self._watcher is not None and self._watcher.is_alive()):
+            return
+        # Versions already on disk are not new
+        for label in list(self._kinds):
+            with self._lock:
+                self._seen.setdefault(label, set()).update(self.versions(label))
+        self._stop_watching.clear()
+
+        def watch():
+            while not self._stop_watching.wait(interval):
+                try:
+                    self.scan()
+                except Exception as e:
+                    print(f"Error scanning the model registry: {str(e)}")
+
+        self._watcher = threading.Thread(target=watch, name="model-registry-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        self._stop_watching.set()
+
+    def describe(self):
+        """Active and stored versions of every registered model"""
+        result = {}
+        for label in self._kinds:
+            active = self._active.get(label)
+            with self._lock:
+                previous = self._previous.get(label)
+            result[label] = {
+                "active": active.describe() if active is not None else None,
+                "previous_version": previous,
+                "versions": self.versions(label)
+            }
+        return result
+
+    def _swap(self, model_version, source):
+        warm_up = getattr(model_version.model, 'warm_up', None)
+        if warm_up is not None:
+            warm_up()
+        with self._lock:
+            current = self._active.get(model_version.label)
+            if current is not None and current.version != model_version.version:
+                self._previous[model_version.label] = current.version
+            # Single reference assignment; readers see the old or the new model
+            self._active[model_version.label] = model_version
+        record_model_load(model_version.label, source)
+        prediction_cache.invalidate(model_version.label)
+        log_event("model_activated", sampled=False, model=model_version.label,
+                  version=model_version.version, source=source)
+        self._prune(model_version.label)
+
+    def _prune(self, label):
+        if self.keep_versions <= 0:
+            return
+        with self._lock:
+            protected = {self.active_version(label), self._previous.get(label)}
+        versions = self.versions(label)
+        for version in versions[:-self.keep_versions]:
+            if version not in protected:
+                shutil.rmtree(os.path.join(self._label_dir(label), version), ignore_errors=True)
+
+    def _label_dir(self, label):
+        dataset_type, model_type = label.split(":", 1)
+        return os.path.join(self.root_dir, dataset_type, model_type)
+
+model_registry = ModelRegistry()
@@ -0,0 +1,117 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .telemetry import registry
+
+# Cache sizing, configurable per deployment; a size of 0 disables the cache
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "10000"))
+PREDICTION_CACHE_TTL_SECONDS = float(os.getenv("PREDICTION_CACHE_TTL_SECONDS", "300"))
+
+CACHE_EVENTS = registry.counter(
+    "leadgen_prediction_cache_events_total", "Prediction cache hits, misses and evictions", ["event"])
+
+class PredictionCache:
+    """LRU cache with a TTL for prediction results
+
+    Keys combine the model label, the identity of the model instance and a
+    hash of the canonicalized feature vector, so fields the model ignores
+    (name, email, ...) do not split the cache and a replaced model never
+    serves results computed by its predecessor.
+    """
+
+    def __init__(self, max_size=PREDICTION_CACHE_SIZE, ttl_seconds=PREDICTION_CACHE_TTL_SECONDS):
+        """Initialize the cache
+
+        Args:
+            max_size: Maximum number of cached results, 0 disables the cache
+            ttl_seconds: Time after which a cached result expires
+        """
+        self.max_size = max(0, int(max_size))
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def key(self, model_label, model, lead_data):
+        """Build the cache key for a lead, or None if the model can't be keyed"""
+        if not self.enabled or not hasattr(model, 'canonical_features'):
+            return None
+        features = model.canonical_features(lead_data)
+        if features is None:
+            return None
+        digest = hashlib.blake2b(repr(features).encode('utf-8'), digest_size=16).digest()
+        return (model_label, id(model), digest)
+
+    def get(self, key):
+        """Return a copy of the cached result, or None on a miss"""
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                self._count_eviction("expired")
+                entry = None
+            if entry is None:
+                self.misses += 1
+                CACHE_EVENTS.inc(event="miss")
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        CACHE_EVENTS.inc(event="hit")
+        return dict(entry[1])
+
+    def put(self, key, result):
+        if key is None:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, dict(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._count_eviction("capacity")
+
+    def invalidate(self, model_label=None):
+        """Drop cached results for one model label, or everything"""
+        with self._lock:
+            if model_label is None:
+                removed = len(self._entries)
+                self._entries.clear()
+            else:
+                stale = [key for key in self._entries if key[0] == model_label]
+                for key in stale:
+                    del self._entries[key]
+                removed = len(stale)
+            if removed:
+                self._count_eviction("invalidated", removed)
+
+    def _count_eviction(self, reason, count=1):
+        self.evictions += count
+        CACHE_EVENTS.inc(count, event=f"eviction_{reason}")
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        return {
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "size": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+prediction_cache = PredictionCache()
+
+registry.gauge_callback(
+    "leadgen_prediction_cache_size", "Results held in the prediction cache",
+    lambda: [({}, prediction_cache.stats()["size"])])
@@ -0,0 +1,349 @@
+import contextvars
+import heapq
+import itertools
+import os
+import secrets
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from urllib.parse import parse_qs
+
+# Slowest requests kept with their stage breakdown; 0 turns the sampler off
+PROFILE_SLOW_REQUESTS = int(os.getenv("PROFILE_SLOW_REQUESTS", "20"))
+# Time after which an in-flight request gets stack samples
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "100"))
+# Interval between stack samples of slow and explicitly profiled requests
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+# Allow profiling a single request with the X-Profile header or ?profile=1
+PROFILE_ON_DEMAND = os.getenv("PROFILE_ON_DEMAND", "0") != "0"
+# Token the /debug endpoints and on-demand profiling require in the
+# X-Debug-Token header; unset, the /debug endpoints are disabled
+PROFILE_DEBUG_TOKEN = os.getenv("PROFILE_DEBUG_TOKEN", "")
+
+# Distinct stacks kept per request, most frequent first
+MAX_STACKS = 50
+# Innermost frames kept per stack
+MAX_STACK_DEPTH = 40
+
+# (file name, function) of frames that mean a thread is idle, not working for a request
+_IDLE_FRAMES = {
+    ("threading.py", "wait"), ("selectors.py", "select"), ("queue.py", "get"),
+    ("thread.py", "_worker"), ("base_events.py", "_run_once")
+}
+
+_current = contextvars.ContextVar("request_profile", default=None)
+
+class RequestProfile:
+    """Stage timings and stack samples of one request"""
+
+    __slots__ = ("id", "method", "path", "on_demand", "started_at", "timestamp", "duration",
+                 "status", "stages", "notes", "samples")
+
+    def __init__(self, method, path, on_demand):
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.on_demand = on_demand
+        self.started_at = time.perf_counter()
+        self.timestamp = time.time()
+        self.duration = None
+        self.status = None
+        self.stages = {}
+        self.notes = {}
+        self.samples = Counter()
+
+    def add(self, stage, seconds):
+        """Add seconds to a stage; stages run more than once add up"""
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def server_timing(self):
+        """Stage timings as a Server-Timing header value, in milliseconds"""
+        timings = [f"{stage};dur={seconds * 1000:.3f}" for stage, seconds in self.stages.items()]
+        timings.append(f"total;dur={(time.perf_counter() - self.started_at) * 1000:.3f}")
+        return ", ".join(timings)
+
+    def to_dict(self):
+        # The sampler thread may still be adding to a just-finished request
+        samples = dict(self.samples)
+        stacks = sorted(samples.items(), key=lambda item: item[1], reverse=True)[:MAX_STACKS]
+        stages_ms = {stage: seconds * 1000 for stage, seconds in self.stages.items()}
+        if self.duration is not None:
+            # Time in the handler and framework not covered by a named stage
+            stages_ms["other"] = max(0.0, self.duration * 1000 - sum(stages_ms.values()))
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.timestamp)),
+            "duration_ms": self.duration * 1000 if self.duration is not None else None,
+            "on_demand": self.on_demand,
+            "stages_ms": stages_ms,
+            **self.notes,
+            "stack_samples": sum(samples.values()),
+            # Folded stacks, root first, as read by flame graph tools
+            "stacks": [{"stack": stack, "count": count} for stack, count in stacks]
+        }
+
+def current_profile():
+    """The profile of the request being handled, or None"""
+    return _current.get()
+
+def record_stage(stage, seconds):
+    """Add a stage timing to the current request's profile, if it has one"""
+    profile = _current.get()
+    if profile is not None:
+        profile.add(stage, seconds)
+
+def debug_token_valid(token, expected):
+    """Whether token matches the expected debug token; always False without one"""
+    return bool(expected) and token is not None and secrets.compare_digest(token.encode("latin-1"), expected.encode("latin-1"))
+
+def record_stages(timings):
+    """Add a dict of stage name -> seconds to the current request's profile"""
+    profile = _current.get()
+    if profile is not None:
+        for stage, seconds in timings.items():
+            profile.add(stage, seconds)
+
+class RequestProfiler:
+    """Keeps the slowest requests with a stage breakdown and stack samples
+
+    Every request gets a RequestProfile that endpoints fill in with
+    record_stage(); at the end it only costs a heap comparison unless the
+    request is among the slowest. A sampler thread takes stack samples of
+    all busy threads while a request has been in flight longer than
+    slow_ms, or while a request asked for a profile, and adds them to those
+    requests. Samples are process-wide: they show what the server was doing
+    while the request waited, including work for other requests in the
+    same micro-batch. The sampler sleeps until the oldest request in flight
+    would turn slow, so an idle or fast server doesn't wake it.
+    """
+
+    def __init__(self, keep=PROFILE_SLOW_REQUESTS, slow_ms=PROFILE_SLOW_MS,
+                 interval_ms=PROFILE_SAMPLE_INTERVAL_MS, on_demand=PROFILE_ON_DEMAND,
+                 debug_token=PROFILE_DEBUG_TOKEN):
+        """Initialize the profiler; the sampler thread starts with the first request
+
+        Args:
+            keep: Number of slowest requests kept, 0 to keep none
+            slow_ms: Time in flight after which a request gets stack samples
+            interval_ms: Interval between stack samples
+            on_demand: Whether a request can ask for its own profile
+            debug_token: Token a request asking for its own profile must send
+                in X-Debug-Token, empty to not require one
+        """
+        self.keep = max(0, int(keep))
+        self.slow_seconds = slow_ms / 1000.0
+        self.interval = max(0.001, interval_ms / 1000.0)
+        self.on_demand = on_demand
+        self.debug_token = debug_token
+        self._slowest = []
+        self._recent = deque(maxlen=max(1, self.keep))
+        self._in_flight = {}
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self._sampler = None
+        self._stop = threading.Event()
+        # Set when the sampler has to look at the requests in flight again
+        self._wake = threading.Event()
+
+    def begin(self, scope):
+        """Start profiling a request
+
+        Returns:
+            The RequestProfile, or None when the request isn't profiled
+        """
+        requested = self.on_demand and self._requested(scope)
+        if not (self.keep or requested):
+            return None
+        profile = RequestProfile(scope["method"], scope["path"], requested)
+        self._in_flight[profile.id] = profile
+        self._ensure_sampler()
+        # A later request turns slow after the ones already in flight, so the
+        # sampler only needs waking when it's sleeping without a deadline
+        if requested or len(self._in_flight) == 1:
+            self._wake.set()
+        return profile
+
+    def activate(self, profile):
+        """Make profile the current request's profile; returns a token for deactivate"""
+        return _current.set(profile)
+
+    def deactivate(self, token):
+        _current.reset(token)
+
+    def end(self, profile, status):
+        """Finish a request's profile and keep it if it's among the slowest"""
+        profile.duration = time.perf_counter() - profile.started_at
+        profile.status = status
+        self._in_flight.pop(profile.id, None)
+        with self._lock:
+            if profile.on_demand:
+                self._recent.append(profile)
+            if not self.keep:
+                return
+            entry = (profile.duration, next(self._order), profile)
+            if len(self._slowest) < self.keep:
+                heapq.heappush(self._slowest, entry)
+            elif profile.duration > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def slowest(self):
+        """The kept requests, slowest first"""
+        with self._lock:
+            profiles = [profile for _, _, profile in sorted(self._slowest, key=lambda entry: entry[:2], reverse=True)]
+        return [profile.to_dict() for profile in profiles]
+
+    def get(self, profile_id):
+        """A kept or on-demand profile by id, or None"""
+        with self._lock:
+            for profile in itertools.chain(self._recent, (entry[2] for entry in self._slowest)):
+                if profile.id == profile_id:
+                    return profile.to_dict()
+        return None
+
+    def reset(self):
+        """Forget the kept requests"""
+        with self._lock:
+            self._slowest.clear()
+            self._recent.clear()
+
+    def stats(self):
+        return {
+            "keep": self.keep,
+            "slow_ms": self.slow_seconds * 1000,
+            "sample_interval_ms": self.interval * 1000,
+            "on_demand": self.on_demand,
+            "debug_token": bool(self.debug_token),
+            "in_flight": len(self._in_flight),
+            "kept": len(self._slowest)
+        }
+
+    def shutdown(self):
+        self._stop.set()
+        self._wake.set()
+        if self._sampler is not None:
+            self._sampler.join(timeout=1)
+        self._sampler = None
+
+    def _requested(self, scope):
+        requested = None
+        token = None
+        for name, value in scope.get("headers", ()):
+            if name == b"x-profile":
+                requested = value.lower() in (b"1", b"true", b"yes")
+            elif name == b"x-debug-token":
+                token = value.decode("latin-1")
+        if requested is None:
+            query = scope.get("query_string", b"")
+            requested = b"profile" in query and \
+                parse_qs(query.decode("latin-1")).get("profile", ["0"])[-1].lower() in ("1", "true", "yes")
+        if requested and self.debug_token:
+            return debug_token_valid(token, self.debug_token)
+        return requested
+
+    def _ensure_sampler(self):
+        if self._sampler is not None:
+            return
+        with self._lock:
+            if self._sampler is None:
+                self._stop.clear()
+                self._sampler = threading.Thread(target=self._sample_loop, name="request-profiler", daemon=True)
+                self._sampler.start()
+
+    def _sample_loop(self):
+        own_ident = threading.get_ident()
+        while not self._stop.is_set():
+            # Cleared before looking, so a request arriving meanwhile wakes the wait below
+            self._wake.clear()
+            now = time.perf_counter()
+            watched = []
+            next_slow = None
+            for profile in list(self._in_flight.values()):
+                slow_at = profile.started_at + self.slow_seconds
+                if profile.on_demand or now >= slow_at:
+                    watched.append(profile)
+                elif next_slow is None or slow_at < next_slow:
+                    next_slow = slow_at
+            if not watched:
+                # Nothing to sample until the oldest request turns slow or a
+                # new one arrives
+                self._wake.wait(None if next_slow is None else next_slow - now)
+                continue
+            stacks = self._sample_stacks(own_ident)
+            for profile in watched:
+                profile.samples.update(stacks)
+            self._stop.wait(self.interval)
+
+    @staticmethod
+    def _sample_stacks(own_ident):
+        """Folded stacks of the threads that are not idle"""
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            code = frame.f_code
+            if (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+                continue
+            frames = []
+            while frame is not None and len(frames) < MAX_STACK_DEPTH:
+                code = frame.f_code
+                directory, filename = os.path.split(code.co_filename)
+                frames.append(f"{code.co_name} ({os.path.basename(directory)}/{filename}:{frame.f_lineno})")
+                frame = frame.f_back
+            frames.append(names.get(ident, f"thread-{ident}"))
+            stacks.append(";".join(reversed(frames)))
+        return stacks
+
+request_profiler = RequestProfiler()
+
+class ProfilingMiddleware:
+    """ASGI middleware giving requests a profile for the request profiler
+
+    Requests that asked for a profile get it back as a Server-Timing header
+    with their stage timings, and an X-Profile-Id header naming the full
+    profile with stack samples under /debug/profiles/{id}.
+    """
+
+    def __init__(self, app, profiler=request_profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        profile = self.profiler.begin(scope)
+        if profile is None:
+            await self.app(scope, receive, send)
+            return
+
+        state = scope.setdefault("state", {})
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                # Same stage boundaries as TelemetryMiddleware records
+                if "handler_started_at" in state:
+                    profile.add("validation", state["handler_started_at"] - profile.started_at)
+                if "handler_finished_at" in state:
+                    profile.add("serialization", time.perf_counter() - state["handler_finished_at"])
+                if profile.on_demand:
+                    message = dict(message)
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"server-timing", profile.server_timing().encode()),
+                        (b"x-profile-id", profile.id.encode())
+                    ]
+            await send(message)
+
+        token = self.profiler.activate(profile)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.profiler.deactivate(token)
+            self.profiler.end(profile, status["code"])
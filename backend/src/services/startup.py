@@ -0,0 +1,54 @@
+import threading
+import time
+
+from .telemetry import log_event, registry
+
+class StartupTracker:
+    """Startup phases and readiness of the server
+
+    Phases are recorded as seconds since the tracker was created, which
+    happens when main imports the services. The server is ready once the
+    startup models are loaded and warmed up; until then, or for good if
+    loading them failed, /ready returns 503 while /health already answers.
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.phases = {}
+        self.error = None
+        self._ready = threading.Event()
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def mark(self, phase):
+        """Record that a startup phase finished"""
+        self.phases[phase] = round(time.perf_counter() - self.started_at, 4)
+        return self.phases[phase]
+
+    def set_ready(self, error=None):
+        """Mark startup as finished and log the phase timings
+
+        Args:
+            error: Optional error of the model loading; the server then
+                serves the models that did load but never reports ready
+        """
+        self.error = error
+        if error is None:
+            self.mark("ready")
+            self._ready.set()
+            print(f"Server ready after {self.phases['ready']:.2f}s: {self.phases}")
+        else:
+            self.mark("failed")
+            print(f"Server startup failed after {self.phases['failed']:.2f}s: {error}")
+        log_event("startup_complete", sampled=False, phases=self.phases, error=error)
+
+    def describe(self):
+        return {"ready": self.ready, "startup_seconds": dict(self.phases), "error": self.error}
+
+startup_tracker = StartupTracker()
+
+registry.gauge_callback(
+    "leadgen_startup_seconds", "Seconds from server import to the end of each startup phase",
+    lambda: [({"phase": phase}, seconds) for phase, seconds in list(startup_tracker.phases.items())])
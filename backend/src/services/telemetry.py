@@ -0,0 +1,258 @@
+import bisect
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+# Fraction of successful requests logged; errors and fallbacks are always logged
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))
+
+LATENCY_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+logger = logging.getLogger("leadgen.scoring")
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = [
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    ]
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+class Histogram:
+    """Bucketed histogram with cumulative counts, Prometheus style"""
+
+    def __init__(self, buckets):
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self):
+        with self._lock:
+            counts, count, total = list(self.counts), self.count, self.sum
+        cumulative = {}
+        running = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            running += bucket_count
+            cumulative[str(bound)] = running
+        cumulative["+Inf"] = count
+        return {"buckets": cumulative, "count": count, "sum": total}
+
+class _LabelledMetric:
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+class Counter(_LabelledMetric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = self._children.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = list(self._children.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+class LabelledHistogram(_LabelledMetric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames, buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.bucket_bounds = buckets
+
+    def labels(self, **labels):
+        """Get the histogram for one label combination"""
+        key = self._key(labels)
+        with self._lock:
+            if key not in self._children:
+                self._children[key] = Histogram(self.bucket_bounds)
+            return self._children[key]
+
+    def observe(self, value, **labels):
+        self.labels(**labels).observe(value)
+
+    def render(self):
+        with self._lock:
+            items = list(self._children.items())
+        lines = []
+        for key, histogram in items:
+            snapshot = histogram.snapshot()
+            for bound, count in snapshot["buckets"].items():
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', bound))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {snapshot['sum']}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {snapshot['count']}")
+        return lines
+
+class CallbackGauge:
+    """Gauge whose values are read from a callback at scrape time
+
+    The callback returns a list of (labels dict, value) pairs.
+    """
+    kind = "gauge"
+
+    def __init__(self, name, documentation, callback):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+
+    def render(self):
+        lines = []
+        for labels, value in self.callback():
+            names = tuple(labels.keys())
+            lines.append(f"{self.name}{_format_labels(names, tuple(labels.values()))} {value}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(LabelledHistogram(name, documentation, labelnames, buckets))
+
+    def gauge_callback(self, name, documentation, callback):
+        return self._register(CallbackGauge(name, documentation, callback))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+REQUESTS = registry.counter(
+    "leadgen_requests_total", "HTTP requests handled", ["endpoint", "method", "status"])
+REQUEST_LATENCY = registry.histogram(
+    "leadgen_request_duration_seconds", "End-to-end HTTP request latency", ["endpoint", "method"])
+STAGE_LATENCY = registry.histogram(
+    "leadgen_stage_duration_seconds", "Latency of individual request stages", ["endpoint", "model", "stage"])
+ERRORS = registry.counter(
+    "leadgen_errors_total", "Scoring errors", ["endpoint", "model"])
+FALLBACKS = registry.counter(
+    "leadgen_fallbacks_total", "Default 50/0.5 warm responses returned instead of a prediction", ["endpoint", "reason"])
+MODEL_LOADS = registry.counter(
+    "leadgen_model_loads_total", "Model loads and (re)trainings", ["model", "source"])
+
+def observe_stages(endpoint, model, timings):
+    """Record a dict of stage name -> seconds"""
+    for stage, seconds in timings.items():
+        STAGE_LATENCY.observe(seconds, endpoint=endpoint, model=model, stage=stage)
+
+def record_fallback(endpoint, reason):
+    FALLBACKS.inc(endpoint=endpoint, reason=reason)
+
+def record_error(endpoint, model):
+    ERRORS.inc(endpoint=endpoint, model=model)
+
+def record_model_load(model, source):
+    """Count a model becoming available; source is 'load', 'train' or 'update'"""
+    MODEL_LOADS.inc(model=model, source=source)
+
+def log_event(event, sampled=True, **fields):
+    """Log one structured event as a JSON line
+
+    Sampled events are only logged for LOG_SAMPLE_RATE of calls.
+    """
+    if sampled and random.random() >= LOG_SAMPLE_RATE:
+        return
+    level = logging.INFO if sampled else logging.WARNING
+    if logger.isEnabledFor(level):
+        logger.log(level, json.dumps({"event": event, **fields}, default=str))
+
+def mark_handler_start(request):
+    """Record the time validation finished and the endpoint started running"""
+    state = request.scope.get("state")
+    if state is not None:
+        state["handler_started_at"] = time.perf_counter()
+
+def mark_handler_end(request):
+    """Record the time the endpoint returned, before response serialization"""
+    state = request.scope.get("state")
+    if state is not None:
+        state["handler_finished_at"] = time.perf_counter()
+
+class TelemetryMiddleware:
+    """ASGI middleware recording request counts and latency per endpoint
+
+    For endpoints that call mark_handler_start/mark_handler_end it also
+    records the validation stage (request arrival until the handler starts,
+    i.e. body parsing and pydantic validation) and the serialization stage
+    (handler return until the response starts).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started_at = time.perf_counter()
+        state = scope.setdefault("state", {})
+        state["received_at"] = started_at
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                endpoint = self._endpoint(scope)
+                if "handler_started_at" in state:
+                    STAGE_LATENCY.observe(state["handler_started_at"] - started_at,
+                                          endpoint=endpoint, model="", stage="validation")
+                if "handler_finished_at" in state:
+                    STAGE_LATENCY.observe(time.perf_counter() - state["handler_finished_at"],
+                                          endpoint=endpoint, model="", stage="serialization")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            endpoint = self._endpoint(scope)
+            REQUESTS.inc(endpoint=endpoint, method=scope["method"], status=status["code"])
+            REQUEST_LATENCY.observe(time.perf_counter() - started_at, endpoint=endpoint, method=scope["method"])
+
+    @staticmethod
+    def _endpoint(scope):
+        # Route templates rather than raw paths keep label cardinality bounded.
+        # Newer FastAPI versions keep the router prefix only on the effective
+        # route context; older ones store prefixed paths on the route itself.
+        context = scope.get("fastapi", {}).get("effective_route_context")
+        path = getattr(context, "path", None) or getattr(scope.get("route"), "path", None)
+        return path or "unmatched"
+
+def render_metrics():
+    return registry.render()
@@ -0,0 +1,305 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+from .telemetry import log_event, registry
+
+# Training jobs allowed to run at once; more are queued
+TRAINING_WORKERS = int(os.getenv("TRAINING_WORKERS", "1"))
+# Finished jobs kept for status queries
+TRAINING_JOBS_HISTORY = int(os.getenv("TRAINING_JOBS_HISTORY", "100"))
+
+JOBS_FINISHED = registry.counter(
+    "leadgen_training_jobs_total", "Finished training jobs", ["model", "status"])
+
+FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+
+def _write_json(path, data):
+    staging_path = f"{path}.tmp"
+    with open(staging_path, 'w') as f:
+        json.dump(data, f, default=float)
+    os.replace(staging_path, path)
+
+def _read_json(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _run_job(target, args, progress_path, result_path):
+    """Entry point of a job process
+
+    The target is called with a progress(**fields) keyword argument; each call
+    replaces the job's progress. Its return value must be JSON serializable.
+    """
+    def progress(**fields):
+        _write_json(progress_path, fields)
+
+    try:
+        result = target(*args, progress=progress)
+    except BaseException as e:
+        _write_json(result_path, {"error": f"{type(e).__name__}: {str(e)}", "traceback": traceback.format_exc()})
+        raise SystemExit(1)
+    _write_json(result_path, {"result": result})
+
+class TrainingJob:
+    """One training run and its status"""
+
+    def __init__(self, name, target, args, on_success, work_dir):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.target = target
+        self.args = args
+        self.on_success = on_success
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_requested = False
+        self.process = None
+        self.progress_path = os.path.join(work_dir, f"{self.id}.progress.json")
+        self.result_path = os.path.join(work_dir, f"{self.id}.result.json")
+        self.final_progress = None
+        self.future = Future()
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATUSES
+
+    def progress(self):
+        if self.final_progress is not None:
+            return self.final_progress
+        return _read_json(self.progress_path) or {}
+
+    async def wait(self):
+        """Wait for the job to finish; returns its result or raises its error"""
+        return await asyncio.wrap_future(self.future)
+
+    def describe(self):
+        return {
+            "job_id": self.id,
+            "model": self.name,
+            "status": self.status,
+            "progress": self.progress(),
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+class TrainingJobManager:
+    """Runs training jobs in separate processes, at most max_concurrent at once
+
+    Every job gets its own spawned process, so training never competes with
+    scoring for the GIL and a running job can be cancelled by terminating its
+    process. A monitor thread per running job waits for the process, then
+    calls the job's on_success callback in the server process, e.g. to
+    activate the model version the job published.
+    """
+
+    def __init__(self, max_concurrent=TRAINING_WORKERS, history=TRAINING_JOBS_HISTORY):
+        """Initialize the manager
+
+        Args:
+            max_concurrent: Jobs allowed to run at once
+            history: Finished jobs kept for status queries
+        """
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.history = history
+        self.completed = 0
+        self.failed = 0
+        self._jobs = OrderedDict()
+        self._queue = deque()
+        self._running = set()
+        self._lock = threading.Lock()
+        self._work_dir = None
+
+    def submit(self, name, target, args=(), on_success=None):
+        """Queue a job
+
+        Args:
+            name: Name reported for the job, e.g. the model label
+            target: Picklable top-level function run in the job process. It
+                receives a progress keyword argument and returns a JSON
+                serializable result.
+            args: Positional arguments for target
+            on_success: Optional function called in this process with the
+                target's result; its return value becomes the job's result
+
+        Returns:
+            The TrainingJob
+        """
+        with self._lock:
+            if self._work_dir is None:
+                self._work_dir = tempfile.mkdtemp(prefix="leadgen-training-")
+            job = TrainingJob(name, target, args, on_success, self._work_dir)
+            self._jobs[job.id] = job
+            self._queue.append(job)
+        log_event("training_job_submitted", sampled=False, job_id=job.id, model=name)
+        self._dispatch()
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def active_job(self, name):
+        """The queued or running job with this name, if any"""
+        with self._lock:
+            for job in self._jobs.values():
+                if job.name == name and not job.finished:
+                    return job
+        return None
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job
+
+        Returns:
+            False if the job had already finished
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                raise KeyError(job_id)
+            if job.finished:
+                return False
+            job.cancel_requested = True
+            if job.status == "queued":
+                self._queue.remove(job)
+                self._finish(job, "cancelled")
+                return True
+            process = job.process
+        # The monitor thread records the cancellation once the process exits;
+        # a process still being started is cancelled by _dispatch
+        if process is not None and process.is_alive():
+            process.terminate()
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "kind": "process",
+                "max_workers": self.max_concurrent,
+                "active": len(self._running),
+                "queue_depth": len(self._queue),
+                "completed": self.completed,
+                "failed": self.failed
+            }
+
+    def shutdown(self):
+        """Cancel queued jobs and terminate running ones"""
+        for job in self.jobs():
+            if not job.finished:
+                self.cancel(job.id)
+        for job in self.jobs():
+            # pid is None for a process that was never started
+            if job.process is not None and job.process.pid is not None:
+                job.process.join(timeout=5)
+        if self._work_dir is not None:
+            shutil.rmtree(self._work_dir, ignore_errors=True)
+            self._work_dir = None
+
+    def _dispatch(self):
+        while True:
+            with self._lock:
+                if not self._queue or len(self._running) >= self.max_concurrent:
+                    return
+                job = self._queue.popleft()
+                # spawn rather than fork: forking a process that has torch and
+                # its thread pools loaded is unsafe
+                context = multiprocessing.get_context("spawn")
+                job.process = context.Process(
+                    target=_run_job,
+                    args=(job.target, job.args, job.progress_path, job.result_path),
+                    name=f"training-{job.name}"
+                )
+                job.status = "running"
+                job.started_at = time.time()
+                self._running.add(job)
+
+            # Spawning pickles the arguments and starts an interpreter, so it
+            # runs outside the lock; a job that can't start fails and frees its slot
+            try:
+                if job.cancel_requested:
+                    raise RuntimeError("Cancelled before it started")
+                job.process.start()
+            except Exception as e:
+                with self._lock:
+                    self._running.discard(job)
+                    job.process = None
+                    if job.cancel_requested:
+                        self._finish(job, "cancelled")
+                    else:
+                        job.error = f"Could not start the training process: {type(e).__name__}: {str(e)}"
+                        self._finish(job, "failed")
+                continue
+            if job.cancel_requested:
+                # Cancelled while starting, before cancel() could terminate it
+                job.process.terminate()
+            threading.Thread(target=self._monitor, args=(job,), name=f"training-monitor-{job.id[:8]}",
+                             daemon=True).start()
+
+    def _monitor(self, job):
+        job.process.join()
+        outcome = _read_json(job.result_path) or {}
+        try:
+            if job.cancel_requested:
+                status, result, error = "cancelled", None, None
+            elif "result" in outcome:
+                result = outcome["result"]
+                if job.on_success is not None:
+                    result = job.on_success(result)
+                status, error = "succeeded", None
+            else:
+                status, result = "failed", None
+                error = outcome.get("error") or f"Training process exited with code {job.process.exitcode}"
+        except Exception as e:
+            status, result, error = "failed", None, f"{type(e).__name__}: {str(e)}"
+
+        with self._lock:
+            job.result = result
+            job.error = error
+            self._running.discard(job)
+            self._finish(job, status)
+        self._dispatch()
+
+    def _finish(self, job, status):
+        """Record a job's final status; called with the lock held"""
+        job.final_progress = _read_json(job.progress_path) or {}
+        for path in (job.progress_path, job.result_path):
+            if os.path.exists(path):
+                os.remove(path)
+        job.status = status
+        job.finished_at = time.time()
+        if status == "succeeded":
+            self.completed += 1
+            job.future.set_result(job.result)
+        else:
+            if status == "failed":
+                self.failed += 1
+            job.future.set_exception(RuntimeError(job.error or f"Training job {status}"))
+        JOBS_FINISHED.inc(model=job.name, status=status)
+        log_event("training_job_finished", sampled=False, job_id=job.id, model=job.name,
+                  status=status, error=job.error)
+
+        finished = [j for j in self._jobs.values() if j.finished]
+        for old in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[old.id]
+
+training_jobs = TrainingJobManager()
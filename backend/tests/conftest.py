@@ -0,0 +1,91 @@
+import os
+import sys
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(BACKEND_DIR, 'src')
+sys.path.insert(0, SRC_DIR)
+
+# Tests parse the CSV themselves rather than reading or writing the dataset cache
+os.environ.setdefault("DATASET_CACHE", "0")
+
+LEAD_CSV = os.path.join(BACKEND_DIR, 'data', 'Lead Scoring.csv')
+
+@pytest.fixture(scope="session")
+def lead_data():
+    """Cleaned lead scoring train/test frames and a feature transformer fitted on the train frame
+
+    Returns:
+        Dict with train_df, test_df, cat_cols, num_cols, transformer and the
+        fitted cleaning step (preprocessor)
+    """
+    if not os.path.exists(LEAD_CSV):
+        pytest.skip(f"{LEAD_CSV} is not available")
+    from ml.data_processor import DataProcessor
+    from ml.lead_model import build_feature_transformer
+
+    processor = DataProcessor(LEAD_CSV, 'lead_scoring')
+    train_df, test_df, cat_cols, num_cols = processor.load_and_prepare_data()
+    transformer = build_feature_transformer(num_cols, cat_cols)
+    transformer.fit(train_df[num_cols + cat_cols])
+    return {"train_df": train_df, "test_df": test_df, "cat_cols": cat_cols, "num_cols": num_cols,
+            "transformer": transformer, "preprocessor": processor.preprocessor}
+
+@pytest.fixture(scope="session")
+def encoded_leads(lead_data):
+    """Dense encoded train and test rows and the train labels"""
+    columns = lead_data["num_cols"] + lead_data["cat_cols"]
+
+    def encode(df):
+        X = lead_data["transformer"].transform(df[columns])
+        return X.toarray() if hasattr(X, 'toarray') else X
+
+    return {"X_train": encode(lead_data["train_df"]), "X_test": encode(lead_data["test_df"]),
+            "y_train": lead_data["train_df"]["target"].to_numpy()}
+
+@pytest.fixture(scope="session")
+def lead_model(lead_data):
+    """A small lead scoring random forest model, built like LeadScoringModel.train does
+
+    It isn't evaluated, since evaluate() writes the metrics file in the data directory.
+    """
+    from sklearn.base import clone
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.pipeline import Pipeline
+    from ml.lead_model import LeadScoringModel
+
+    model = LeadScoringModel('lead_scoring')
+    model.cat_cols, model.num_cols = lead_data["cat_cols"], lead_data["num_cols"]
+    model.preprocessor = lead_data["preprocessor"]
+    model.model = Pipeline(steps=[
+        ('preprocessor', clone(lead_data["transformer"])),
+        ('classifier', RandomForestClassifier(n_estimators=20, max_depth=12, random_state=0, n_jobs=1))
+    ])
+    train_df = lead_data["train_df"]
+    model.model.fit(train_df.drop('target', axis=1), train_df['target'])
+    model.classes_ = model.model.classes_
+    model.compile_encoder()
+    model.compile_engine()
+    return model
+
+@pytest.fixture(scope="session")
+def scoring_client(lead_model, tmp_path_factory):
+    """Test client of the scoring routes, serving lead_model from a temporary model registry
+
+    Scored leads aren't stored.
+    """
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from initialize_models import register_models, LEAD_MODEL_LABEL
+    from routes import ml_scoring
+    from services.model_registry import model_registry
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(model_registry, "root_dir", str(tmp_path_factory.mktemp("models")))
+        monkeypatch.setattr(ml_scoring, "LEAD_STORE_ENABLED", False)
+        register_models()
+        model_registry.publish(LEAD_MODEL_LABEL, lead_model)
+        app = FastAPI()
+        app.include_router(ml_scoring.router, prefix="/api/ml-scoring")
+        with TestClient(app) as client:
+            yield client
@@ -0,0 +1,35 @@
+import asyncio
+
+from services.batching import MicroBatcher
+
+class DoublingModel:
+    """predict_batch doubles numbers and fails the whole batch on a negative one"""
+
+    def __init__(self):
+        self.batches = []
+
+    def predict_batch(self, items, timings=None):
+        self.batches.append(list(items))
+        if any(item < 0 for item in items):
+            raise ValueError(f"negative item in {items}")
+        return [item * 2 for item in items]
+
+def _submit_all(items):
+    model = DoublingModel()
+
+    async def submit():
+        batcher = MicroBatcher("test", max_batch_size=len(items), max_wait_ms=50)
+        return await asyncio.gather(*(batcher.submit(model, item) for item in items), return_exceptions=True)
+
+    return asyncio.run(submit()), model
+
+def test_concurrent_items_share_one_batch():
+    results, model = _submit_all([1, 2, 3])
+    assert results == [2, 4, 6]
+    assert model.batches == [[1, 2, 3]]
+
+def test_failing_item_only_fails_its_own_request():
+    results, model = _submit_all([1, -2, 3])
+    assert results[0] == 2 and results[2] == 6
+    assert isinstance(results[1], ValueError)
+    assert model.batches == [[1, -2, 3], [1], [-2], [3]]
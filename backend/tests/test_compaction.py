@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from ml.forest_compaction import compaction_report, prune_forest, select_trees
+
+@pytest.fixture(scope="module")
+def compacted(lead_model, encoded_leads):
+    return lead_model.compact(encoded_leads["X_train"][:2000], max_depth=6, drop_tolerance=0.01, min_trees=5)
+
+def test_pruned_tree_predicts_its_ancestor_at_max_depth(lead_model, encoded_leads):
+    forest = lead_model.model.named_steps['classifier']
+    pruned = prune_forest(forest, max_depth=4)
+    X = encoded_leads["X_test"][:200].astype(np.float32)
+    for estimator, pruned_estimator in zip(forest.estimators_[:5], pruned.estimators_[:5]):
+        assert pruned_estimator.tree_.max_depth <= 4
+        paths = estimator.decision_path(X)
+        value = estimator.tree_.value[:, 0, :]
+        # decision_path lists a row's nodes root first, so the 5th is its node at depth 4
+        ancestors = [paths.indices[start:end][min(4, end - start - 1)]
+                     for start, end in zip(paths.indptr[:-1], paths.indptr[1:])]
+        expected = value[ancestors] / value[ancestors].sum(axis=1, keepdims=True)
+        np.testing.assert_allclose(pruned_estimator.predict_proba(X), expected, rtol=0, atol=1e-12)
+    assert forest.estimators_[0].tree_.max_depth > 4
+
+def test_leaf_budget(lead_model):
+    pruned = prune_forest(lead_model.model.named_steps['classifier'], max_leaves=16)
+    assert all(estimator.tree_.n_leaves <= 16 for estimator in pruned.estimators_)
+
+def test_select_trees_stays_within_tolerance():
+    rng = np.random.default_rng(0)
+    tree_proba = rng.uniform(size=(30, 500))
+    reference = tree_proba.mean(axis=0)
+    kept, deviation = select_trees(tree_proba, reference, tolerance=0.02, min_trees=5)
+    assert 5 <= len(kept) < 30
+    assert deviation == pytest.approx(np.abs(tree_proba[kept].mean(axis=0) - reference).mean())
+    assert deviation <= 0.02
+
+def test_compacted_model_is_smaller_and_narrow(lead_model, compacted):
+    info = compacted.compaction
+    assert info["trees_after"] <= info["trees_before"] == len(lead_model.model.named_steps['classifier'].estimators_)
+    assert info["nodes_after"] < info["nodes_before"]
+    assert compacted.engine.threshold.dtype == np.float32
+    assert lead_model.engine.threshold.dtype == np.float64
+
+def test_compacted_model_round_trips(compacted, lead_data, tmp_path):
+    from ml.lead_model import LeadScoringModel
+    leads = lead_data["test_df"].drop('target', axis=1).head(100).to_dict('records')
+    path = str(tmp_path / "model.pkl")
+    compacted.save_model(path)
+    loaded = LeadScoringModel('lead_scoring').load_model(path)
+    assert loaded.compaction["trees_after"] == compacted.compaction["trees_after"]
+    assert loaded.predict_batch(leads) == compacted.predict_batch(leads)
+
+def test_report_compares_with_the_original(lead_model, compacted, encoded_leads, lead_data):
+    X_test, y_test = encoded_leads["X_test"], lead_data["test_df"]["target"]
+    report = compaction_report(lead_model, compacted, X_test, y_test)
+    before, after = report["original"], report["compacted"]
+    assert report["change"]["roc_auc"] == pytest.approx(after["metrics"]["roc_auc"] - before["metrics"]["roc_auc"])
+    assert report["change"]["artifact_size_ratio"] < 1
+    assert after["max_depth"] <= 6
+    assert (before["n_trees"], after["n_trees"]) == \
+        (compacted.compaction["trees_before"], compacted.compaction["trees_after"])
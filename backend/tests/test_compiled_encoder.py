@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ml.compiled_encoder import CompiledEncoder
+
+def _expected(transformer, records, columns):
+    expected = transformer.transform(pd.DataFrame(records, columns=columns))
+    return expected.toarray() if hasattr(expected, 'toarray') else expected
+
+@pytest.fixture(scope="module")
+def encoder(lead_data):
+    return CompiledEncoder(lead_data["transformer"])
+
+@pytest.fixture(scope="module")
+def records(lead_data):
+    columns = lead_data["num_cols"] + lead_data["cat_cols"]
+    # Category dtype columns from the cleaning step turn into plain values
+    return lead_data["test_df"][columns].astype(object).to_dict('records')
+
+def test_transform_equals_transformer_on_real_rows(encoder, records, lead_data):
+    expected = _expected(lead_data["transformer"], records, encoder.columns)
+    assert np.array_equal(encoder.transform(records), expected)
+
+def test_transform_equals_transformer_on_unseen_categories(encoder, records, lead_data):
+    unseen = []
+    for i, record in enumerate(records[:50]):
+        record = dict(record)
+        for column in lead_data["cat_cols"][i % 3::3]:
+            record[column] = f"never seen {i}"
+        unseen.append(record)
+    expected = _expected(lead_data["transformer"], unseen, encoder.columns)
+    assert np.array_equal(encoder.transform(unseen), expected)
+
+def test_transform_equals_transformer_on_missing_values(encoder, records, lead_data):
+    missing = []
+    for i, record in enumerate(records[:50]):
+        record = dict(record)
+        # None and NaN for numbers, None for categories
+        for column in lead_data["num_cols"][i % 2::2]:
+            record[column] = None if i % 4 < 2 else float('nan')
+        for column in lead_data["cat_cols"][i % 2::2]:
+            record[column] = None
+        missing.append(record)
+    expected = _expected(lead_data["transformer"], missing, encoder.columns)
+    assert np.array_equal(encoder.transform(missing), expected, equal_nan=True)
+
+def test_save_load_round_trip(encoder, records, lead_data, tmp_path):
+    encoder.save(str(tmp_path))
+    loaded = CompiledEncoder.load(str(tmp_path))
+    assert loaded.required_columns == encoder.required_columns
+    expected = _expected(lead_data["transformer"], records, encoder.columns)
+    assert np.array_equal(loaded.transform(records), expected)
+
+def test_missing_column_raises(encoder, records):
+    record = dict(records[0])
+    del record[next(iter(encoder.required_columns))]
+    with pytest.raises(ValueError, match="columns are missing"):
+        encoder.transform([record])
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from ml.compiled_forest import CompiledForest
+
+@pytest.fixture(scope="module")
+def forest(encoded_leads):
+    forest = RandomForestClassifier(n_estimators=20, max_depth=12, random_state=0, n_jobs=1)
+    return forest.fit(encoded_leads["X_train"], encoded_leads["y_train"])
+
+def _tie_rows(forest, X, random_state=0):
+    """Real rows with every split feature set to one of its thresholds, or one float32 step off"""
+    rng = np.random.default_rng(random_state)
+    rows = X[rng.choice(len(X), size=256)].astype(np.float64)
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        split = tree.children_left != -1
+        for feature in np.unique(tree.feature[split]):
+            thresholds = tree.threshold[split & (tree.feature == feature)]
+            picked = rng.choice(thresholds, size=len(rows)).astype(np.float32)
+            step = rng.choice([-np.inf, 0.0, np.inf], size=len(rows)).astype(np.float32)
+            rows[:, feature] = np.where(step == 0.0, picked, np.nextafter(picked, step))
+    return rows
+
+def test_predict_proba_equals_forest_on_real_rows(forest, encoded_leads):
+    X = encoded_leads["X_test"]
+    assert np.array_equal(CompiledForest(forest).predict_proba(X), forest.predict_proba(X))
+
+def test_predict_proba_equals_forest_on_threshold_ties(forest, encoded_leads):
+    X = _tie_rows(forest, encoded_leads["X_test"])
+    assert np.array_equal(CompiledForest(forest).predict_proba(X), forest.predict_proba(X))
+
+def test_float32_compaction_keeps_predictions(forest, encoded_leads):
+    engine = CompiledForest(forest).compact('float32', 'float64')
+    assert engine.threshold.dtype == np.float32
+    for X in (encoded_leads["X_test"], _tie_rows(forest, encoded_leads["X_test"], random_state=1)):
+        assert np.array_equal(engine.predict_proba(X), forest.predict_proba(X))
+
+def test_float32_leaf_values_stay_close(forest, encoded_leads):
+    X = encoded_leads["X_test"]
+    engine = CompiledForest(forest).compact('float32', 'float32')
+    np.testing.assert_allclose(engine.predict_proba(X), forest.predict_proba(X), rtol=0, atol=1e-6)
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_save_load_round_trip(forest, encoded_leads, tmp_path, compact):
+    engine = CompiledForest(forest)
+    if compact:
+        engine = engine.compact('float32', 'float64')
+    engine.save(str(tmp_path))
+    loaded = CompiledForest.load(str(tmp_path))
+
+    for name in CompiledForest.ARRAYS:
+        original, restored = np.asarray(getattr(engine, name)), getattr(loaded, name)
+        assert restored.dtype == original.dtype
+        assert np.array_equal(restored, original)
+    X = encoded_leads["X_test"]
+    assert np.array_equal(loaded.predict_proba(X), forest.predict_proba(X))
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import LEAD_CSV
+from ml.lead_preprocessor import LeadPreprocessor
+
+@pytest.fixture(scope="module")
+def raw_leads(lead_data):
+    """The raw lead scoring CSV, target column included"""
+    return pd.read_csv(LEAD_CSV)
+
+def _records(frame):
+    return [{column: (None if pd.isna(value) else value) for column, value in row.items()}
+            for row in frame.to_dict("records")]
+
+def test_partial_fit_matches_fit_on_all_rows(lead_data, raw_leads):
+    state = lead_data["preprocessor"].to_dict()
+    options = dict(drop_cols=state["drop_cols"], zero_fill_cols=state["zero_fill_cols"],
+                   target_col=state["target_col"])
+    first, second = raw_leads.iloc[:6000], raw_leads.iloc[6000:]
+
+    updated = LeadPreprocessor(**options).fit(first).partial_fit(_records(second))
+    refitted = LeadPreprocessor(**options).fit(raw_leads)
+
+    # Zero-filled columns always impute 0, so partial_fit doesn't count them
+    imputed = [column for column in refitted.num_cols if column not in options["zero_fill_cols"]]
+    assert imputed
+    assert {column: updated.counts[column] for column in imputed} == \
+        {column: refitted.counts[column] for column in imputed}
+    for column, value in refitted.fill_values.items():
+        if isinstance(value, float):
+            assert updated.fill_values[column] == pytest.approx(value, rel=1e-12)
+        else:
+            assert updated.fill_values[column] == value
+
+def test_update_slides_the_forest(lead_model, raw_leads):
+    original = lead_model.model.named_steps['classifier']
+    original_trees = list(original.estimators_)
+    updated = lead_model.update(_records(raw_leads.sample(n=300, random_state=0)), n_trees=5)
+
+    trees = updated.model.named_steps['classifier'].estimators_
+    assert len(trees) == len(original_trees)
+    # The 5 oldest trees are retired and the kept ones are shared, not refitted
+    assert all(kept is tree for kept, tree in zip(trees[:-5], original_trees[5:]))
+    assert all(new not in original_trees for new in trees[-5:])
+    assert original.estimators_ == original_trees
+    assert updated.update_info["n_samples"] == 300
+    assert updated.update_info["trees_added"] == updated.update_info["trees_retired"] == 5
+
+def test_updated_model_serves_like_its_pipeline(lead_model, raw_leads):
+    updated = lead_model.update(_records(raw_leads.sample(n=300, random_state=1)), n_trees=5)
+    leads = _records(raw_leads.drop(columns=["Converted"]).head(50))
+    served = np.array([result["probability"] for result in updated.predict_batch(leads)])
+    columns = pd.DataFrame(updated.preprocessor.transform_columns(leads))
+    expected = updated.model.predict_proba(columns)[:, 1]
+    np.testing.assert_allclose(served, expected, rtol=0, atol=0.005)
+
+def test_update_needs_both_outcomes(lead_model, raw_leads):
+    converted = raw_leads[raw_leads["Converted"] == 1].head(20)
+    with pytest.raises(ValueError, match="converted and unconverted"):
+        lead_model.update(_records(converted))
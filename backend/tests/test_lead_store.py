@@ -0,0 +1,65 @@
+import pytest
+
+from services import lead_store as lead_store_module
+from services.lead_store import LeadStore
+
+STATUSES = ("hot", "warm", "cold")
+SOURCES = ("web", "referral")
+
+@pytest.fixture
+def store(tmp_path):
+    """A store holding 60 leads with varied scores, statuses and sources"""
+    store = LeadStore(str(tmp_path / "leads.db"), flush_ms=1)
+    for i in range(60):
+        score = (i * 37) % 101
+        store.record({"name": f"lead {i}", "source": SOURCES[i % 2]},
+                     {"score": score, "probability": score / 100, "status": STATUSES[i % 3]},
+                     "lead_scoring", "random_forest")
+    store.flush()
+    yield store
+    store.shutdown()
+
+def _all_pages(store, **filters):
+    leads, cursor = [], None
+    while True:
+        page = store.query(cursor=cursor, **filters)
+        leads.extend(page["leads"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return leads
+
+def test_pages_cover_every_lead_newest_first(store):
+    leads = _all_pages(store, limit=7)
+    ids = [lead["id"] for lead in leads]
+    assert len(ids) == 60
+    assert ids == sorted(ids, reverse=True)
+
+def test_last_page_has_no_cursor(store):
+    first = store.query(limit=60)
+    assert len(first["leads"]) == 60
+    assert first["next_cursor"] is None
+
+def test_filters_match_every_page(store):
+    everything = _all_pages(store, limit=500)
+    leads = _all_pages(store, status="hot", source="web", limit=3)
+    expected = [lead["id"] for lead in everything if lead["status"] == "hot" and lead["source"] == "web"]
+    assert [lead["id"] for lead in leads] == expected
+
+@pytest.mark.parametrize("by_score", [False, True])
+@pytest.mark.parametrize("min_score, max_score", [(90, None), (None, 10), (40, 60), (50, 50)])
+def test_score_range_by_index_or_walk(store, monkeypatch, by_score, min_score, max_score):
+    # Either every range is read through leads_score or every range walks by date
+    monkeypatch.setattr(lead_store_module, "SCORE_INDEX_MAX_ROWS", 5000 if by_score else 0)
+    monkeypatch.setattr(lead_store_module, "SCORE_INDEX_ROW_COST", 0)
+    assert store._narrow_score_range(min_score, max_score, 4) == by_score
+    everything = _all_pages(store, limit=500)
+    leads = _all_pages(store, min_score=min_score, max_score=max_score, limit=4)
+    expected = [lead["id"] for lead in everything
+                if (min_score is None or lead["score"] >= min_score)
+                and (max_score is None or lead["score"] <= max_score)]
+    assert expected
+    assert [lead["id"] for lead in leads] == expected
+
+def test_malformed_cursor_is_rejected(store):
+    with pytest.raises(ValueError):
+        store.query(cursor="not-a-cursor")
@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from services.model_registry import ModelRegistry
+from services.prediction_cache import PredictionCache, prediction_cache
+
+LABEL = "lead_scoring:random_forest"
+OTHER_LABEL = "bank:random_forest"
+LEAD = {"TotalVisits": 3, "name": "Ada"}
+
+class StoredModel:
+    """Stand-in model: its features are the lead's TotalVisits, its artifact a JSON file"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def save_model(self, path):
+        with open(path, 'w') as f:
+            json.dump({"name": self.name}, f)
+
+    def canonical_features(self, lead_data):
+        return (lead_data.get("TotalVisits"),)
+
+def _load(path):
+    with open(path) as f:
+        return StoredModel(json.load(f)["name"])
+
+@pytest.fixture
+def registry(tmp_path):
+    """A registry with two versions of LABEL, the second active, and nothing cached"""
+    registry = ModelRegistry(root_dir=str(tmp_path), keep_versions=5)
+    for label in (LABEL, OTHER_LABEL):
+        registry.register(label, "model.json", _load)
+    registry.publish(OTHER_LABEL, StoredModel("other"))
+    registry.publish(LABEL, StoredModel("v1"))
+    registry.publish(LABEL, StoredModel("v2"))
+    prediction_cache.invalidate()
+    yield registry
+    prediction_cache.invalidate()
+
+def _cache(registry, label, score):
+    key = prediction_cache.key(label, registry.get(label), LEAD)
+    prediction_cache.put(key, {"score": score})
+    return key
+
+def test_activating_a_version_drops_its_cached_results(registry):
+    stale = _cache(registry, LABEL, 10)
+    other = _cache(registry, OTHER_LABEL, 20)
+    registry.publish(LABEL, StoredModel("v3"))
+
+    assert prediction_cache.get(stale) is None
+    assert prediction_cache.get(prediction_cache.key(LABEL, registry.get(LABEL), LEAD)) is None
+    assert prediction_cache.get(other) == {"score": 20}
+
+def test_rollback_drops_cached_results(registry):
+    stale = _cache(registry, LABEL, 10)
+    registry.rollback(LABEL)
+
+    assert registry.get(LABEL).name == "v1"
+    assert prediction_cache.get(stale) is None
+    assert prediction_cache.get(prediction_cache.key(LABEL, registry.get(LABEL), LEAD)) is None
+
+def test_ignored_fields_share_an_entry():
+    cache = PredictionCache(max_size=10)
+    model = StoredModel("v1")
+    cache.put(cache.key(LABEL, model, LEAD), {"score": 10})
+    assert cache.get(cache.key(LABEL, model, {**LEAD, "name": "Grace"})) == {"score": 10}
+    assert cache.get(cache.key(LABEL, model, {**LEAD, "TotalVisits": 4})) is None
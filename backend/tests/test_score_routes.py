@@ -0,0 +1,69 @@
+import json
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from conftest import LEAD_CSV
+from routes import ml_scoring
+
+SCORE_URL = "/api/ml-scoring/score"
+LEAD_SCORING = {"dataset_type": "lead_scoring", "model_type": "random_forest"}
+
+@pytest.fixture(scope="module")
+def partial_leads():
+    """Raw CSV rows that each miss some fields, as sent by clients"""
+    raw = pd.read_csv(LEAD_CSV).drop(columns=["Converted"])
+    rows = raw[raw.isna().any(axis=1)].head(8)
+    return [{column: (None if pd.isna(value) else value) for column, value in row.items()}
+            for row in rows.to_dict("records")]
+
+def test_score_file_imputes_like_score(scoring_client, partial_leads):
+    scored = []
+    for lead in partial_leads:
+        response = scoring_client.post(SCORE_URL, json={**LEAD_SCORING, **lead})
+        assert response.status_code == 200
+        assert response.json().get("error") is None
+        scored.append(response.json())
+
+    body = "".join(json.dumps(lead) + "\n" for lead in partial_leads)
+    response = scoring_client.post(f"{SCORE_URL}-file", content=body,
+                                   headers={"content-type": "application/x-ndjson"})
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["Prospect ID"] for row in rows] == [lead["Prospect ID"] for lead in partial_leads]
+    for row, expected in zip(rows, scored):
+        assert row.get("error") is None
+        assert (row["score"], row["probability"], row["status"]) == \
+            (expected["score"], expected["probability"], expected["status"])
+
+def test_score_rejects_featureless_lead(scoring_client):
+    response = scoring_client.post(SCORE_URL, json={**LEAD_SCORING, "name": "Ada", "email": "ada@example.com"})
+    assert response.status_code == 422
+    assert "Lead Origin" in response.json()["detail"]
+
+def test_explain_rejects_featureless_lead(scoring_client):
+    response = scoring_client.post("/api/ml-scoring/explain", json={**LEAD_SCORING, "name": "Ada"})
+    assert response.status_code == 422
+
+def test_score_batch_gives_featureless_lead_an_error(scoring_client, partial_leads):
+    response = scoring_client.post(f"{SCORE_URL}-batch",
+                                   json=[{**LEAD_SCORING, **partial_leads[0]}, {**LEAD_SCORING, "name": "Ada"}])
+    assert response.status_code == 200
+    scored, featureless = response.json()
+    assert scored.get("error") is None
+    assert "no value for any feature" in featureless["error"]
+
+def test_score_doesnt_wait_for_on_demand_training(scoring_client, monkeypatch, partial_leads):
+    # The temporary registry has no transformer version, so one has to be trained
+    submitted = []
+    job = SimpleNamespace(id="job-1", status="running")
+    monkeypatch.setattr(ml_scoring, "import_legacy_artifact", lambda label: False)
+    monkeypatch.setattr(ml_scoring, "submit_training", lambda label: submitted.append(label) or job)
+
+    response = scoring_client.post(SCORE_URL, json={**partial_leads[0], "dataset_type": "lead_scoring",
+                                                    "model_type": "transformer"})
+    assert response.status_code == 503
+    assert response.json()["detail"]["job_id"] == "job-1"
+    assert int(response.headers["Retry-After"]) > 0
+    assert submitted == ["lead_scoring:transformer"]
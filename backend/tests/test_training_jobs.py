@@ -0,0 +1,18 @@
+import pytest
+
+from services.training_jobs import TrainingJobManager
+
+def test_job_that_cannot_start_fails_and_frees_its_slot():
+    manager = TrainingJobManager(max_concurrent=1)
+    try:
+        # Lambdas can't be pickled for the spawned process
+        job = manager.submit("unpicklable", lambda progress=None: None)
+        assert job.status == "failed"
+        assert "Could not start the training process" in job.error
+        assert job.process is None
+        assert manager.stats()["active"] == 0
+        with pytest.raises(RuntimeError):
+            job.future.result(timeout=1)
+        assert manager.cancel(job.id) is False
+    finally:
+        manager.shutdown()
@@ -0,0 +1,73 @@
+import itertools
+import math
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from ml.tree_shap import TreeExplainer
+
+@pytest.fixture(scope="module")
+def small_forest():
+    """A few shallow trees on 5 features, small enough for brute-force Shapley values"""
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(300, 5)).astype(np.float32)
+    y = (X[:, 0] + X[:, 1] * X[:, 2] > 0).astype(int)
+    forest = RandomForestClassifier(n_estimators=3, max_depth=6, random_state=0, n_jobs=1).fit(X, y)
+    return forest, X
+
+def _expected_value(tree, x, known):
+    """Path-dependent expectation of a tree's positive-class probability given the features in known"""
+    def walk(node):
+        if tree.children_left[node] == -1:
+            value = tree.value[node, 0]
+            return value[1] / value.sum()
+        left, right = tree.children_left[node], tree.children_right[node]
+        if tree.feature[node] in known:
+            return walk(left if x[tree.feature[node]] <= tree.threshold[node] else right)
+        weight = tree.weighted_n_node_samples
+        return (weight[left] * walk(left) + weight[right] * walk(right)) / weight[node]
+    return walk(0)
+
+def _brute_force_shap(forest, x):
+    """Shapley values by enumerating every coalition, averaged over the trees"""
+    n = len(x)
+    values = np.zeros(n)
+    for feature in range(n):
+        others = [other for other in range(n) if other != feature]
+        for size in range(n):
+            weight = math.factorial(size) * math.factorial(n - size - 1) / math.factorial(n)
+            for coalition in itertools.combinations(others, size):
+                for estimator in forest.estimators_:
+                    with_feature = _expected_value(estimator.tree_, x, set(coalition) | {feature})
+                    without = _expected_value(estimator.tree_, x, set(coalition))
+                    values[feature] += weight * (with_feature - without) / len(forest.estimators_)
+    return values
+
+def test_matches_brute_force_shapley_values(small_forest):
+    forest, X = small_forest
+    explained = TreeExplainer(forest).shap_values(X[:5])
+    for row, values in zip(X[:5], explained):
+        np.testing.assert_allclose(values, _brute_force_shap(forest, row), rtol=0, atol=1e-6)
+
+def test_values_add_up_to_probability(small_forest):
+    forest, X = small_forest
+    explainer = TreeExplainer(forest)
+    total = explainer.base_value + explainer.shap_values(X).sum(axis=1)
+    np.testing.assert_allclose(total, forest.predict_proba(X)[:, 1], rtol=0, atol=1e-6)
+
+def test_groups_sum_their_features(small_forest):
+    forest, X = small_forest
+    groups = [0, 0, 1, 1, 2]
+    grouped = TreeExplainer(forest, feature_groups=groups, group_names=["a", "b", "c"]).shap_values(X[:20])
+    ungrouped = TreeExplainer(forest).shap_values(X[:20])
+    expected = np.column_stack([ungrouped[:, :2].sum(axis=1), ungrouped[:, 2:4].sum(axis=1), ungrouped[:, 4]])
+    np.testing.assert_allclose(grouped, expected, rtol=0, atol=1e-6)
+
+def test_values_add_up_on_lead_forest(encoded_leads):
+    forest = RandomForestClassifier(n_estimators=10, max_depth=12, random_state=0, n_jobs=1)
+    forest.fit(encoded_leads["X_train"], encoded_leads["y_train"])
+    X = encoded_leads["X_test"][:200]
+    explainer = TreeExplainer(forest)
+    total = explainer.base_value + explainer.shap_values(X).sum(axis=1)
+    np.testing.assert_allclose(total, forest.predict_proba(X)[:, 1], rtol=0, atol=1e-5)